@@ -42,6 +42,7 @@ from pitivi.shortcuts import show_shortcuts
 from pitivi.undo.project import ProjectObserver
 from pitivi.undo.undo import UndoableActionLog
 from pitivi.utils import loggable
+from pitivi.utils.discovery_cache import DiscoveryCache
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import quote_uri
@@ -77,6 +78,7 @@ class Pitivi(Gtk.Application, Loggable):
         self.threads = None
         self.effects = None
         self.system = None
+        self.discovery_cache = None
         self.project_manager = ProjectManager(self)
 
         self.action_log = None
@@ -144,6 +146,8 @@ class Pitivi(Gtk.Application, Loggable):
         self.threads = ThreadMaster()
         self.effects = EffectsManager()
         self.proxy_manager = ProxyManager(self)
+        self.discovery_cache = DiscoveryCache()
+        self.discovery_cache.install()
         self.system = get_system()
         self.plugin_manager = PluginManager(self)
 
@@ -276,7 +280,10 @@ class Pitivi(Gtk.Application, Loggable):
         self._setScenarioFile(project.get_uri())
 
     def _newProjectLoaded(self, unused_project_manager, project):
-        self.action_log = UndoableActionLog()
+        self.action_log = UndoableActionLog(
+            max_depth=self.settings.undoMaxDepth,
+            max_memory=self.settings.undoMaxMemory * 1024 * 1024)
+        self.action_log.connect("begin", self._action_log_begin_cb)
         self.action_log.connect("pre-push", self._action_log_pre_push_cb)
         self.action_log.connect("commit", self._actionLogCommit)
         self.action_log.connect("move", self._action_log_move_cb)
@@ -284,6 +291,9 @@ class Pitivi(Gtk.Application, Loggable):
         self.project_observer = ProjectObserver(project, self.action_log)
 
     def _projectClosed(self, unused_project_manager, project):
+        if self.project_observer:
+            self.project_observer.release()
+            self.project_observer = None
         if project.loaded:
             self.action_log = None
             self._syncDoUndo()
@@ -350,14 +360,22 @@ class Pitivi(Gtk.Application, Loggable):
         self.shutdown()
 
     def _undoCb(self, unused_action, unused_param):
-        self.action_log.undo()
+        self.project_manager.wait_backup_serialized()
+        with self.project_manager.current_project.bulk_edit():
+            self.action_log.undo()
 
     def _redoCb(self, unused_action, unused_param):
-        self.action_log.redo()
+        self.project_manager.wait_backup_serialized()
+        with self.project_manager.current_project.bulk_edit():
+            self.action_log.redo()
 
     def _show_shortcuts_cb(self, unused_action, unused_param):
         show_shortcuts(self)
 
+    def _action_log_begin_cb(self, unused_action_log, unused_stack):
+        # The timeline cannot be edited while a backup thread reads it.
+        self.project_manager.wait_backup_serialized()
+
     def _action_log_pre_push_cb(self, unused_action_log, action):
         try:
             st = action.asScenarioAction()
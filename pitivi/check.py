@@ -324,11 +324,15 @@ def require_version(modulename, version):
         exit(1)
 
 
-def initialize_modules():
+def initialize_modules(headless=False):
     """Initializes the modules.
 
     This has to be done in a specific order otherwise the app
     crashes on some systems.
+
+    Args:
+        headless (Optional[bool]): Whether to skip the UI modules, for
+            example when rendering without a display.
     """
     try:
         import gi
@@ -337,15 +341,16 @@ def initialize_modules():
                 "Make sure you have pygobject available."))
         exit(1)
 
-    require_version("Gtk", GTK_API_VERSION)
-    require_version("Gdk", GTK_API_VERSION)
-    from gi.repository import Gdk
-    Gdk.init([])
-    from gi.repository import Gtk
+    if not headless:
+        require_version("Gtk", GTK_API_VERSION)
+        require_version("Gdk", GTK_API_VERSION)
+        from gi.repository import Gdk
+        Gdk.init([])
+        from gi.repository import Gtk
 
-    # Monkey patch deprecated methods to use the new variant by default
-    Gtk.Layout.get_vadjustment = Gtk.Scrollable.get_vadjustment
-    Gtk.Layout.get_hadjustment = Gtk.Scrollable.get_hadjustment
+        # Monkey patch deprecated methods to use the new variant by default
+        Gtk.Layout.get_vadjustment = Gtk.Scrollable.get_vadjustment
+        Gtk.Layout.get_hadjustment = Gtk.Scrollable.get_hadjustment
 
     if not gi.version_info >= (3, 11):
         from gi.repository import GObject
@@ -367,6 +372,10 @@ def initialize_modules():
     # Monkey patch deprecated methods to use the new variant by default
     GES.TrackElement.list_children_properties = GES.TimelineElement.list_children_properties
 
+    if headless:
+        # GstValidate relies on the UI modules.
+        return
+
     from pitivi.utils import validate
     if validate.init() and "--inspect-action-type" in sys.argv:
         try:
@@ -35,6 +35,8 @@ from pitivi.utils.custom_effect_widgets import setup_custom_effect_widgets
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import disconnectAllByFunc
 from pitivi.utils.pipeline import PipelineError
+from pitivi.utils.pipeline import SLOW_PLAYHEAD_INTERVAL
+from pitivi.utils.timeline import EditCoalescer
 from pitivi.utils.ui import disable_scroll
 from pitivi.utils.ui import EFFECT_TARGET_ENTRY
 from pitivi.utils.ui import fix_infobar
@@ -534,6 +536,8 @@ class TransformationProperties(Gtk.Expander, Loggable):
         self._selected_clip = None
         self.spin_buttons = {}
         self.spin_buttons_handler_ids = {}
+        # Applies the values of the spin buttons once per frame.
+        self.__edit_coalescer = EditCoalescer(self)
         self.set_label(_("Transformation"))
 
         self.builder = Gtk.Builder()
@@ -556,13 +560,14 @@ class TransformationProperties(Gtk.Expander, Loggable):
             self._selection.disconnect_by_func(self._selectionChangedCb)
             self._selection = None
         if self._project:
-            self._project.pipeline.disconnect_by_func(self._position_cb)
+            self._project.pipeline.playhead.unsubscribe(self._position_cb)
 
         self._project = project
         if project:
             self._selection = project.ges_timeline.ui.selection
             self._selection.connect('selection-changed', self._selectionChangedCb)
-            self._project.pipeline.connect("position", self._position_cb)
+            self._project.pipeline.playhead.subscribe(self, self._position_cb,
+                                                      interval=SLOW_PLAYHEAD_INTERVAL)
 
     def _initButtons(self):
         clear_button = self.builder.get_object("clear_button")
@@ -823,10 +828,15 @@ class TransformationProperties(Gtk.Expander, Loggable):
             return
 
         if value != cvalue:
-            self.__set_prop(prop, value)
-            self.app.gui.viewer.overlay_stack.update(self.source)
+            self.__edit_coalescer.push(self.__apply_prop, prop, value, key=prop)
+
+    def __apply_prop(self, prop, value):
+        self.__set_prop(prop, value)
+        self.app.gui.viewer.overlay_stack.update(self.source)
 
     def __set_source(self, source):
+        # The pending values are for the previous source.
+        self.__edit_coalescer.flush()
         if self.source:
             try:
                 self.source.disconnect_by_func(self.__source_property_changed_cb)
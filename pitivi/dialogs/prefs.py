@@ -59,6 +59,7 @@ class PreferencesDialog(Loggable):
     prefs = {}
     section_names = {
         "timeline": _("Timeline"),
+        "viewer": _("Viewer"),
         "_plugins": _("Plugins"),
         "_shortcuts": _("Shortcuts")
     }
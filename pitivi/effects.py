@@ -45,6 +45,7 @@ from pitivi.configure import get_pixmap_dir
 from pitivi.configure import get_ui_dir
 from pitivi.settings import GlobalSettings
 from pitivi.utils.loggable import Loggable
+from pitivi.utils.misc import SearchIndex
 from pitivi.utils.ui import EFFECT_TARGET_ENTRY
 from pitivi.utils.ui import SPACING
 from pitivi.utils.widgets import FractionWidget
@@ -336,6 +337,10 @@ class EffectListWidget(Gtk.Box, Loggable):
 
         self._draggedItems = None
         self._effectType = VIDEO_EFFECT
+        self._search_index = SearchIndex()
+        # The names of the effects matching the search entry, or None when
+        # all the effects match.
+        self._search_matches = None
 
         self.set_orientation(Gtk.Orientation.VERTICAL)
         builder = Gtk.Builder()
@@ -444,6 +449,9 @@ class EffectListWidget(Gtk.Box, Loggable):
             if name in HIDDEN_EFFECTS:
                 continue
             effect_info = self.app.effects.getInfo(name)
+            self._search_index.add(name,
+                                   effect_info.human_name,
+                                   effect_info.description)
             self.storemodel.append([effect_info.human_name,
                                     effect_info.description,
                                     effectType,
@@ -545,7 +553,11 @@ class EffectListWidget(Gtk.Box, Loggable):
     def _categoryChangedCb(self, unused_combobox):
         self.model_filter.refilter()
 
-    def _searchEntryChangedCb(self, unused_entry):
+    def _searchEntryChangedCb(self, entry):
+        matches = self._search_index.search(entry.get_text())
+        if matches == self._search_matches:
+            return
+        self._search_matches = matches
         self.model_filter.refilter()
 
     def _searchEntryIconClickedCb(self, entry, unused, unused1):
@@ -558,9 +570,9 @@ class EffectListWidget(Gtk.Box, Loggable):
             return False
         if self.categoriesWidget.get_active_text() not in model.get_value(iter, COL_EFFECT_CATEGORIES):
             return False
-        text = self.searchEntry.get_text().lower()
-        return text in model.get_value(iter, COL_DESC_TEXT).lower() or\
-            text in model.get_value(iter, COL_NAME_TEXT).lower()
+        if self._search_matches is None:
+            return True
+        return model.get_value(iter, COL_ELEMENT_NAME) in self._search_matches
 
 
 PROPS_TO_IGNORE = ['name', 'qos', 'silent', 'message', 'parent']
@@ -203,6 +203,14 @@ class MainWindow(Gtk.ApplicationWindow, Loggable):
     def _renderCb(self, unused_button):
         self.showRenderDialog()
 
+    def show_background_task(self, widget):
+        """Shows the widget of a task running in the background.
+
+        The widget is displayed in the header bar, until it is destroyed.
+        """
+        self._headerbar.pack_end(widget)
+        widget.show()
+
     def _createUi(self):
         """Creates the graphical interface.
 
@@ -869,6 +877,7 @@ class MainWindow(Gtk.ApplicationWindow, Loggable):
         # We must disconnect from the project pipeline before it is released:
         if project.pipeline is not None:
             project.pipeline.deactivatePositionListener()
+        self.viewer.release_trim_pipelines()
 
         self.info("Project closed")
         self.updateTitle()
@@ -1301,7 +1310,8 @@ class PreviewAssetWindow(Gtk.Window):
         self.set_type_hint(Gdk.WindowTypeHint.UTILITY)
         self.set_transient_for(main_window)
 
-        self._previewer = PreviewWidget(main_window.settings, minimal=True)
+        self._previewer = PreviewWidget(main_window.settings, minimal=True,
+                                        discovery_cache=main_window.app.discovery_cache)
         self.add(self._previewer)
         self._previewer.preview_uri(self._asset.get_id())
         self._previewer.show()
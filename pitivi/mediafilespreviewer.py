@@ -73,14 +73,18 @@ class PreviewWidget(Gtk.Grid, Loggable):
 
     Args:
         settings (GlobalSettings): The settings of the app.
+        discovery_cache (Optional[DiscoveryCache]): The cache used to
+            avoid discovering again the previewed files.
     """
 
-    def __init__(self, settings, minimal=False, discover_sync=False):
+    def __init__(self, settings, minimal=False, discover_sync=False,
+                 discovery_cache=None):
         Gtk.Grid.__init__(self)
         Loggable.__init__(self)
 
         self.log("Init PreviewWidget")
         self.settings = settings
+        self.discovery_cache = discovery_cache
         self.error_message = None
 
         # playbin for play pics
@@ -190,7 +194,12 @@ class PreviewWidget(Gtk.Grid, Loggable):
         self.clear_preview()
         self.current_selected_uri = uri
 
-        if not self._discover_sync:
+        info = None
+        if self.discovery_cache:
+            info = self.discovery_cache.lookup(uri)
+        if info:
+            self._show_discovered(uri, info)
+        elif not self._discover_sync:
             GES.UriClipAsset.new(uri, None, self.__asset_loaded_cb)
         else:
             self._handle_new_asset(uri=uri)
@@ -208,7 +217,13 @@ class PreviewWidget(Gtk.Grid, Loggable):
             return
 
         self.log("Discovered %s", uri)
-        if not self._show_preview(uri, asset.get_info()):
+        info = asset.get_info()
+        if self.discovery_cache:
+            self.discovery_cache.store(info)
+        self._show_discovered(uri, info)
+
+    def _show_discovered(self, uri, info):
+        if not self._show_preview(uri, info):
             return
         if self.play_on_discover:
             self.play_on_discover = False
@@ -349,12 +364,13 @@ class PreviewWidget(Gtk.Grid, Loggable):
         self.slider_being_used = True
         if event.type == Gdk.EventType.BUTTON_PRESS:
             self.countinuous_seek = True
+            self.player.begin_scrub()
             if self.is_playing:
                 self.player.setState(Gst.State.PAUSED)
         elif event.type == Gdk.EventType.BUTTON_RELEASE:
             self.countinuous_seek = False
             value = int(widget.get_value())
-            self.player.simple_seek(value)
+            self.player.end_scrub(value)
             self.at_eos = False
             if self.is_playing:
                 self.player.setState(Gst.State.PLAYING)
@@ -44,11 +44,13 @@ from pitivi.dialogs.filelisterrordialog import FileListErrorDialog
 from pitivi.mediafilespreviewer import PreviewWidget
 from pitivi.settings import GlobalSettings
 from pitivi.timeline.previewers import ThumbnailCache
+from pitivi.utils.discovery_scheduler import PRIORITY_LIBRARY
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import disconnectAllByFunc
 from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import PathWalker
 from pitivi.utils.misc import quote_uri
+from pitivi.utils.misc import SearchIndex
 from pitivi.utils.proxy import get_proxy_target
 from pitivi.utils.proxy import ProxyingStrategy
 from pitivi.utils.proxy import ProxyManager
@@ -109,6 +111,17 @@ SUPPORTED_FILE_FORMATS = {
     # ...and image formats
     "image": ("jp2", "jpeg", "png", "svg+xml")}
 
+# The tags which are indexed so the user can search by them.
+SEARCHABLE_TAGS = (
+    Gst.TAG_TITLE,
+    Gst.TAG_ARTIST,
+    Gst.TAG_ALBUM,
+    Gst.TAG_GENRE,
+    Gst.TAG_COMMENT,
+    Gst.TAG_CONTAINER_FORMAT,
+    Gst.TAG_VIDEO_CODEC,
+    Gst.TAG_AUDIO_CODEC)
+
 SUPPORTED_MIMETYPES = []
 for category, mime_types in SUPPORTED_FILE_FORMATS.items():
     for mime in mime_types:
@@ -367,6 +380,11 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         Loggable.__init__(self)
 
         self._pending_assets = []
+        self._search_index = SearchIndex()
+        # The URIs of the rows matching the search entry, or None when
+        # all the rows are visible.
+        self._search_matches = None
+        self._search_entry = None
 
         self.app = app
         self._errors = []
@@ -378,6 +396,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             self.clip_view = SHOW_ICONVIEW
         self.import_start_time = time.time()
         self._last_imported_uris = set()
+        self._path_walkers = []
         self.__last_proxying_estimate_time = _("Unknown")
 
         self.set_orientation(Gtk.Orientation.VERTICAL)
@@ -411,6 +430,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self._clipprops_button = builder.get_object("media_props_button")
         self._listview_button = builder.get_object("media_listview_button")
         searchEntry = builder.get_object("media_search_entry")
+        self._search_entry = searchEntry
 
         # Store
         self.storemodel = Gtk.ListStore(*STORE_MODEL_STRUCTURE)
@@ -669,12 +689,17 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self.app.gui.timeline_ui.insertAssets(self.getSelectedAssets(), -1)
 
     def _searchEntryChangedCb(self, entry):
+        self.__update_search_matches(entry.get_text())
+
+    def __update_search_matches(self, text, force=False):
+        matches = self._search_index.search(text)
         # With many hundred clips in an iconview with dynamic columns and
-        # ellipsizing, doing needless searches is very expensive.
-        # Realistically, nobody expects to search for only one character,
-        # and skipping that makes a huge difference in responsiveness.
-        if len(entry.get_text()) != 1:
-            self.modelFilter.refilter()
+        # ellipsizing, refiltering is very expensive, so do it only
+        # when the visible rows actually change.
+        if not force and matches == self._search_matches:
+            return
+        self._search_matches = matches
+        self.modelFilter.refilter()
 
     def _searchEntryIconClickedCb(self, entry, icon_pos, unused_event):
         if icon_pos == Gtk.EntryIconPosition.SECONDARY:
@@ -687,20 +712,48 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             elif self.clip_view == SHOW_ICONVIEW:
                 self.iconview.grab_focus()
 
-    def _setRowVisible(self, model, iter, data):
+    def _setRowVisible(self, model, iter, unused_data):
         """Toggles the visibility of a liststore row."""
-        text = data.get_text().lower()
-        if not text:
-            # Avoid silly warnings.
+        if self._search_matches is None:
             return True
-        # We must convert to markup form to be able to search for &, ', etc.
-        text = GLib.markup_escape_text(text)
-        return text in model.get_value(iter, COL_INFOTEXT).lower()
+        return model.get_value(iter, COL_URI) in self._search_matches
+
+    @staticmethod
+    def _get_search_texts(asset):
+        """Gets the plain texts by which the specified asset can be found."""
+        uri = get_proxy_target(asset).props.id
+        texts = [path_from_uri(uri)]
+
+        duration = asset.get_duration()
+        if duration != Gst.CLOCK_TIME_NONE:
+            texts.append(beautify_length(duration))
+
+        info = asset.get_info()
+        if not info:
+            return texts
+
+        for stream in info.get_stream_list():
+            caps = stream.get_caps()
+            if caps and not caps.is_empty():
+                texts.append(caps.get_structure(0).get_name())
+
+        tags = info.get_tags()
+        if tags:
+            for tag in SEARCHABLE_TAGS:
+                res, value = tags.get_string(tag)
+                if res:
+                    texts.append(value)
+
+        return texts
+
+    def __index_asset(self, asset):
+        self._search_index.add(asset.props.id, *self._get_search_texts(asset))
 
     def _connectToProject(self, project):
         """Connects signal handlers to the specified project."""
         project.connect("asset-added", self._assetAddedCb)
         project.connect("asset-loading-progress", self._assetLoadingProgressCb)
+        project.connect("discovery-progress", self._discoveryProgressCb)
         project.connect("asset-removed", self._assetRemovedCb)
         project.connect("error-loading-asset", self._errorCreatingAssetCb)
         project.connect("proxying-error", self._proxyingErrorCb)
@@ -755,7 +808,8 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         dialog.set_transient_for(self.app.gui)
         dialog.set_current_folder(self.app.settings.lastImportFolder)
         dialog.connect('response', self._importDialogBoxResponseCb)
-        previewer = PreviewWidget(self.app.settings)
+        previewer = PreviewWidget(self.app.settings,
+                                  discovery_cache=self.app.discovery_cache)
         dialog.set_preview_widget(previewer)
         dialog.set_use_preview_label(False)
         dialog.connect('update-preview', previewer.update_preview_cb)
@@ -798,6 +852,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             thumbs_decorator = AssetThumbnail(asset, self.app.proxy_manager)
             name = info_name(asset)
 
+            self.__index_asset(asset)
             self.storemodel.append((thumbs_decorator.small_thumb,
                                     thumbs_decorator.large_thumb,
                                     beautify_asset(asset),
@@ -808,6 +863,11 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
 
         del self._pending_assets[:]
 
+        if self._search_matches is not None:
+            # The new rows have been filtered with the old matches.
+            self.__update_search_matches(self._search_entry.get_text(),
+                                         force=True)
+
     # medialibrary callbacks
 
     def _assetLoadingProgressCb(self, project, progress, estimated_time):
@@ -830,7 +890,11 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             self._startImporting(project)
             return
 
-        if project.loaded:
+        if project.loaded and project.discovery_scheduler.pending:
+            # The discovery progress is displayed instead.
+            self._last_imported_uris.update([asset.props.id for asset in
+                                             project.loading_assets])
+        elif project.loaded:
             if estimated_time:
                 self.__last_proxying_estimate_time = beautify_ETA(int(
                     estimated_time * Gst.SECOND))
@@ -854,6 +918,16 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         if progress == 100:
             self._doneImporting()
 
+    def _discoveryProgressCb(self, unused_project, discovered, total):
+        if discovered >= total:
+            return
+        # Translators: The first %d is the number of files whose info has
+        # been read, the second one the number of files being imported.
+        template = ngettext("Discovering %d of %d file",
+                            "Discovering %d of %d files",
+                            total)
+        self._progressbar.set_text(template % (discovered, total))
+
     def __assetProxyingCb(self, proxy, unused_pspec):
         if not self.app.proxy_manager.is_proxy_asset(proxy):
             self.info("Proxy is not a proxy in our terms (handling deleted proxy"
@@ -911,6 +985,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         found = False
         for row in self.storemodel:
             if uri == row[COL_URI]:
+                self._search_index.remove(uri)
                 self.storemodel.remove(row.iter)
                 found = True
                 break
@@ -995,7 +1070,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             self.app.settings.lastImportFolder = lastfolder
             dialogbox.props.extra_widget.saveValues()
             filenames = dialogbox.get_uris()
-            self._project.addUris(filenames)
+            self._project.addUris(filenames, priority=PRIORITY_LIBRARY)
             if self.app.settings.closeImportDialog:
                 dialogbox.destroy()
         else:
@@ -1372,6 +1447,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
     def __disconnectFromProject(self):
         self._project.disconnect_by_func(self._assetAddedCb)
         self._project.disconnect_by_func(self._assetLoadingProgressCb)
+        self._project.disconnect_by_func(self._discoveryProgressCb)
         self._project.disconnect_by_func(self._assetRemovedCb)
         self._project.disconnect_by_func(self._proxyingErrorCb)
         self._project.disconnect_by_func(self._errorCreatingAssetCb)
@@ -1383,6 +1459,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self._project = project
         self._resetErrorList()
         self.storemodel.clear()
+        self._search_index.clear()
         self._welcome_infobar.show_all()
         self._connectToProject(project)
 
@@ -1392,27 +1469,31 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
 
     def _newProjectFailedCb(self, unused_project_manager, unused_uri, unused_reason):
         self.storemodel.clear()
+        self._search_index.clear()
         self._project = None
 
     def _projectClosedCb(self, unused_project_manager, unused_project):
+        self.__abort_path_walkers()
         self.__disconnectFromProject()
         self._project_settings_infobar.hide()
         self.storemodel.clear()
+        self._search_index.clear()
         self._project = None
 
     def __paths_walked_cb(self, uris):
-        """Handles the end of the path walking when importing files and dirs."""
+        """Handles a batch of files found when importing files and dirs."""
         if not uris:
             return
         if not self._project:
             self.warning("Cannot add URIs, project missing")
-        self._last_imported_uris = set(uris)
+            return
+        self._last_imported_uris.update(uris)
         assets = self._project.assetsForUris(uris)
         if assets:
             # All the files have already been added.
             self._selectLastImportedUris()
         else:
-            self._project.addUris(uris)
+            self._project.addUris(uris, priority=PRIORITY_LIBRARY)
 
     def _drag_data_received_cb(self, unused_widget, unused_context, unused_x,
                                unused_y, selection, targettype, unused_time):
@@ -1422,7 +1503,24 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         uris = selection.get_uris()
         # Scan in the background what was dragged and
         # import whatever can be imported.
-        self.app.threads.addThread(PathWalker, uris, self.__paths_walked_cb)
+        walker = self.app.threads.addThread(PathWalker, uris,
+                                            self.__paths_walked_cb)
+        walker.connect("done", self.__path_walker_done_cb)
+        self._path_walkers.append(walker)
+
+    def __path_walker_done_cb(self, walker):
+        # The signal is emitted in the walker's thread.
+        GLib.idle_add(self.__forget_path_walker, walker)
+
+    def __forget_path_walker(self, walker):
+        if walker in self._path_walkers:
+            self._path_walkers.remove(walker)
+        return False
+
+    def __abort_path_walkers(self):
+        for walker in self._path_walkers:
+            walker.abort()
+        self._path_walkers = []
 
     # Used with TreeView and IconView
     def _dndDragDataGetCb(self, unused_view, unused_context, data, unused_info, unused_timestamp):
@@ -18,10 +18,12 @@
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
 """Project related classes."""
+import contextlib
 import datetime
 import os
 import pwd
 import tarfile
+import threading
 import time
 import uuid
 from gettext import gettext as _
@@ -38,8 +40,15 @@ from pitivi.configure import get_ui_dir
 from pitivi.preset import AudioPresetManager
 from pitivi.preset import VideoPresetManager
 from pitivi.render import Encoders
+from pitivi.undo.journal import EditJournal
+from pitivi.undo.journal import load_journal
+from pitivi.undo.journal import replay_journal
 from pitivi.undo.project import AssetAddedIntention
 from pitivi.undo.project import AssetProxiedIntention
+from pitivi.utils.discovery_scheduler import DiscoveryScheduler
+from pitivi.utils.discovery_scheduler import PRIORITY_DEFAULT
+from pitivi.utils.fileio import create_temp_file
+from pitivi.utils.fileio import replace_file_atomically
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import fixate_caps_with_default_values
 from pitivi.utils.misc import isWritable
@@ -47,7 +56,9 @@ from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import quote_uri
 from pitivi.utils.misc import unicode_error_dialog
 from pitivi.utils.pipeline import Pipeline
+from pitivi.utils.preview_cache import PreviewCache
 from pitivi.utils.ripple_update_group import RippleUpdateGroup
+from pitivi.utils.threads import Thread
 from pitivi.utils.ui import audio_channels
 from pitivi.utils.ui import audio_rates
 from pitivi.utils.ui import beautify_time_delta
@@ -126,15 +137,29 @@ class ProjectManager(GObject.Object, Loggable):
         self.current_project = None
         self.disable_save = False
         self._backup_lock = 0
+        self.__backup_writer = None
+        self.__journal = None
+        self.__journal_to_replay = None
+        self.__exporting = False
         self.exitcode = 0
         self.__start_loading_time = 0
 
     def _tryUsingBackupFile(self, uri):
         backup_path = self._makeBackupURI(path_from_uri(uri))
         use_backup = False
+        journal = None
+        self.__journal_to_replay = None
         try:
             path = path_from_uri(uri)
-            time_diff = os.path.getmtime(backup_path) - os.path.getmtime(path)
+            journal_path = self._makeJournalPath(path)
+            journal = load_journal(journal_path)
+            if journal:
+                # The journaled edits are newer than the full save they
+                # apply to, which can be the project or its backup.
+                backup_path, unused_structures = journal
+                time_diff = os.path.getmtime(journal_path) - os.path.getmtime(path)
+            else:
+                time_diff = os.path.getmtime(backup_path) - os.path.getmtime(path)
             self.debug(
                 'Backup file is %d secs newer: %s', time_diff, backup_path)
         except OSError:
@@ -146,7 +171,9 @@ class ProjectManager(GObject.Object, Loggable):
                 use_backup = self._restoreFromBackupDialog(time_diff)
 
                 if use_backup:
-                    uri = self._makeBackupURI(uri)
+                    if backup_path != path:
+                        uri = self._makeBackupURI(uri)
+                    self.__journal_to_replay = journal
             self.debug('Loading project from backup: %s', uri)
 
         # For backup files and legacy formats, force the user to use "Save as"
@@ -399,6 +426,8 @@ class ProjectManager(GObject.Object, Loggable):
                 self.info("Setting the project instance's URI to: %s", uri)
                 self.current_project.uri = uri
                 self.disable_save = False
+                if not self.__exporting:
+                    self.__start_journal(self.current_project)
             else:
                 self.debug('Saved backup: %s', uri)
 
@@ -417,7 +446,13 @@ class ProjectManager(GObject.Object, Loggable):
         try:
             # saveProject updates the project URI... so we better back it up:
             _old_uri = self.current_project.uri
-            self.saveProject(tmp_uri)
+            # The journal keeps following the project file, not the
+            # temporary one.
+            self.__exporting = True
+            try:
+                self.saveProject(tmp_uri)
+            finally:
+                self.__exporting = False
             self.current_project.uri = _old_uri
 
             # create tar file
@@ -584,17 +619,103 @@ class ProjectManager(GObject.Object, Loggable):
             self._backup_lock -= 5
             return True
         else:
-            self.saveProject(backup=True)
+            self.saveBackupInBackground()
             self._backup_lock = 0
         return False
 
+    def saveBackupInBackground(self):
+        """Saves a backup of the current project without blocking the UI.
+
+        The timeline is serialized and written to the backup file by a
+        `BackupWriter` thread. Meanwhile the edits must wait, see
+        `wait_backup_serialized`.
+
+        Returns:
+            bool: Whether a backup is being written.
+        """
+        if self.__backup_writer and self.__backup_writer.is_alive():
+            self.info("The previous backup is still being written, skipping")
+            return False
+
+        project = self.current_project
+        if self.disable_save or project is None or project.uri is None:
+            return False
+        backup_uri = self._makeBackupURI(project.uri)
+
+        journal = self.__journal
+        if journal:
+            # The journal is compacted into the backup once written.
+            journal.checkpoint()
+        self.__backup_writer = self.app.threads.addThread(
+            BackupWriter, project.ges_timeline, path_from_uri(backup_uri),
+            lambda error: self.__backup_written_cb(journal, backup_uri, error))
+        return True
+
+    def wait_backup_serialized(self):
+        """Waits until the timeline is no longer read by the backup thread.
+
+        Must be called before editing the timeline.
+        """
+        writer = self.__backup_writer
+        if writer and not writer.serialized.is_set():
+            self.debug("Waiting for the backup to be serialized")
+            writer.serialized.wait()
+
+    def __backup_written_cb(self, journal, backup_uri, error):
+        if error:
+            self.emit("save-project-failed", backup_uri, error)
+            return False
+        if journal and journal is self.__journal:
+            if journal.rebase(path_from_uri(backup_uri)) and journal.broken:
+                # Operations which cannot be journaled have been made while
+                # the backup was being written.
+                self.__journal_broken_cb(journal)
+        return False
+
+    def __journal_broken_cb(self, journal):
+        # Without a full backup, the next operations would not be journaled.
+        GLib.idle_add(self.__save_broken_journal_cb, journal)
+
+    def __save_broken_journal_cb(self, journal):
+        if journal is self.__journal and journal.broken:
+            self.saveBackupInBackground()
+        return False
+
+    def __start_journal(self, project):
+        """Starts journaling the edits on top of the saved project."""
+        if self.__journal:
+            self.__journal.remove()
+            self.__journal = None
+        if project.uri is None or self.disable_save or not self.app.action_log:
+            return
+
+        path = path_from_uri(project.uri)
+        journal = EditJournal(self._makeJournalPath(path), self.app.action_log)
+        journal.checkpoint()
+        if journal.rebase(path):
+            journal.connect("broken", self.__journal_broken_cb)
+            self.__journal = journal
+        else:
+            journal.close()
+
     def _cleanBackup(self, uri):
         if uri is None:
             return
-        path = path_from_uri(self._makeBackupURI(uri))
-        if os.path.exists(path):
-            os.remove(path)
-            self.debug('Removed backup file: %s', path)
+        writer = self.__backup_writer
+        if writer:
+            # Make sure the backup is not written after being removed.
+            writer.abort()
+            writer.join()
+            self.__backup_writer = None
+        if self.__journal:
+            self.__journal.close()
+            self.__journal = None
+        backup_path = path_from_uri(self._makeBackupURI(uri))
+        journal_path = self._makeJournalPath(path_from_uri(uri))
+        for path in (backup_path, journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+                self.debug('Removed backup file: %s', path)
 
     def _makeBackupURI(self, uri):
         """Generates a corresponding backup URI or path.
@@ -611,6 +732,17 @@ class ProjectManager(GObject.Object, Loggable):
         name, ext = os.path.splitext(uri)
         return name + ext + "~"
 
+    def _makeJournalPath(self, path):
+        """Generates the path of the journal of the edits of a project.
+
+        Args:
+            path (str): The project file path.
+
+        Returns:
+            str: The path of the journal file.
+        """
+        return path + ".journal~"
+
     def _missingURICb(self, project, error, asset):
         new_uri = self.emit("missing-uri", project, error, asset)
         if not new_uri:
@@ -623,12 +755,81 @@ class ProjectManager(GObject.Object, Loggable):
         if not self.current_project == project:
             self.debug("Project is obsolete %s", project.props.uri)
             return
+        journal = self.__journal_to_replay
+        self.__journal_to_replay = None
+        if journal:
+            unused_base_path, structures = journal
+            replayed = replay_journal(project, structures)
+            self.info("Replayed %d of %d journaled edits", replayed, len(structures))
         self.emit("new-project-loaded", project)
         project.loaded = True
+        if journal:
+            project.setModificationState(True)
+        self.__start_journal(project)
         self.time_loaded = time.time()
         self.info("Loaded in %s", self.time_loaded - self.__start_loading_time)
 
 
+class BackupWriter(Thread):
+    """Thread serializing a timeline to the backup file.
+
+    The timeline must not be edited until `serialized` is set. The backup
+    file is replaced atomically, so a crash while writing it does not
+    leave a truncated backup behind.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline to be saved.
+        backup_path (str): The backup file to be replaced.
+        callback (Optional[function]): Called in the main thread when done,
+            with the error or None if the backup has been written.
+
+    Attributes:
+        serialized (threading.Event): Set when the timeline is no longer
+            read by the thread.
+    """
+
+    def __init__(self, ges_timeline, backup_path, callback=None):
+        Thread.__init__(self)
+        self.ges_timeline = ges_timeline
+        self.backup_path = backup_path
+        self.callback = callback
+        self.serialized = threading.Event()
+        self.__aborted = False
+
+    def process(self):
+        temp_path = None
+        error = None
+        try:
+            temp_path = create_temp_file(self.backup_path)
+            try:
+                # Not saving the project itself, which would also save
+                # the presets of the encoder settings.
+                self.ges_timeline.save_to_uri(Gst.filename_to_uri(temp_path),
+                                              None, True)
+            finally:
+                self.serialized.set()
+            if self.__aborted:
+                return
+            replace_file_atomically(temp_path, self.backup_path)
+            temp_path = None
+            self.debug("Saved backup: %s", self.backup_path)
+        except (GLib.Error, OSError) as e:
+            self.warning("Failed saving backup %s: %s", self.backup_path, e)
+            error = e
+        finally:
+            self.serialized.set()
+            if temp_path:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+        if self.callback and not self.__aborted:
+            GLib.idle_add(self.callback, error)
+
+    def abort(self):
+        self.__aborted = True
+
+
 class Project(Loggable, GES.Project):
     """A Pitivi project.
 
@@ -639,6 +840,8 @@ class Project(Loggable, GES.Project):
         ges_timeline (GES.Timeline): The timeline.
         pipeline (Pipeline): The timeline's pipeline.
         loaded (bool): Whether the project is fully loaded.
+        discovery_scheduler (DiscoveryScheduler): The scheduler of the
+            discovery of the files added with `addUris`.
 
     Args:
         name (Optional[str]): The name of the new empty project.
@@ -648,10 +851,14 @@ class Project(Loggable, GES.Project):
     Signals:
         project-changed: Modifications were made to the project.
         start-importing: Started to import files.
+        discovery-progress: The discovery of a file added with `addUris`
+            finished. The arguments are the numbers of discovered and of
+            scheduled files.
     """
 
     __gsignals__ = {
         "asset-loading-progress": (GObject.SignalFlags.RUN_LAST, None, (object, int)),
+        "discovery-progress": (GObject.SignalFlags.RUN_LAST, None, (int, int)),
         # Working around the fact that PyGObject does not let us emit error-loading-asset
         # and bugzilla does not let me file a bug right now :/
         "proxying-error": (GObject.SignalFlags.RUN_LAST, None,
@@ -671,12 +878,16 @@ class Project(Loggable, GES.Project):
         GES.Project.__init__(self, uri=uri, extractable_type=GES.Timeline)
         self.log("name:%s, uri:%s", name, uri)
         self.pipeline = None
+        self.preview_cache = None
         self.ges_timeline = None
         self.uri = uri
         self.loaded = False
         self.at_least_one_asset_missing = False
         self.app = app
         self.loading_assets = set()
+        self.discovery_scheduler = DiscoveryScheduler(
+            self, self.app.settings.numDiscoveryJobs)
+        self.discovery_scheduler.connect("progress", self.__discoveryProgressCb)
         self.app.proxy_manager.connect("progress", self.__assetTranscodingProgressCb)
         self.app.proxy_manager.connect("error-preparing-asset",
                                        self.__proxyErrorCb)
@@ -991,6 +1202,12 @@ class Project(Loggable, GES.Project):
     # ------------------------------#
     # Proxy creation implementation #
     # ------------------------------#
+    def __discoveryProgressCb(self, scheduler, discovered, total):
+        self.emit("discovery-progress", discovered, total)
+        if not scheduler.pending and self.loading_assets:
+            # The loading progress was kept below 100 while discovering.
+            self.__updateAssetLoadingProgress()
+
     def __assetTranscodingProgressCb(self, unused_proxy_manager, asset,
                                      creation_progress, estimated_time):
         self.__updateAssetLoadingProgress(estimated_time)
@@ -1064,6 +1281,11 @@ class Project(Loggable, GES.Project):
         else:
             progress = self.__get_loading_assets_progress()
 
+        scheduler = self.discovery_scheduler
+        if progress is not None and scheduler.pending:
+            # Some of the files are still waiting to be discovered.
+            progress = min(progress * scheduler.discovered / scheduler.total, 99)
+
         self.emit("asset-loading-progress", progress, estimated_time)
 
         if progress == 100:
@@ -1192,6 +1414,10 @@ class Project(Loggable, GES.Project):
             self.debug("Ignoring asset: %s", asset.props.id)
             return
 
+        info = asset.get_info()
+        if info:
+            self.app.discovery_cache.store(info)
+
         if asset not in self.loading_assets:
             self.debug("Asset %s is not in loading assets, "
                        " it must not be proxied", asset.get_id())
@@ -1255,6 +1481,9 @@ class Project(Loggable, GES.Project):
             self.set_container_profile(profiles[0], reset_all=True)
             self._load_encoder_settings(profiles)
 
+        # The preview is scaled down from the size of the project.
+        self.pipeline.set_video_size(*self.getVideoWidthAndHeight())
+
     def set_container_profile(self, container_profile, reset_all=False):
         """Sets @container_profile as new profile if usable.
 
@@ -1434,6 +1663,20 @@ class Project(Loggable, GES.Project):
     def hasDefaultName(self):
         return DEFAULT_NAME == self.name
 
+    @contextlib.contextmanager
+    def bulk_edit(self):
+        """Gathers the side effects of the edits done in the block.
+
+        The timeline is committed at most once and the timeline widgets,
+        if any, are updated once, when the outermost block is exited.
+        """
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self.pipeline.commits_batched())
+            timeline_ui = getattr(self.ges_timeline, "ui", None)
+            if timeline_ui:
+                stack.enter_context(timeline_ui.updates_frozen())
+            yield
+
     def _commit(self):
         """Logs the operation and commits.
 
@@ -1442,6 +1685,8 @@ class Project(Loggable, GES.Project):
         """
         self.app.write_action("commit")
         GES.Timeline.commit(self.ges_timeline)
+        if self.preview_cache:
+            self.preview_cache.invalidate()
 
     def createTimeline(self):
         """Loads the project's timeline."""
@@ -1461,6 +1706,8 @@ class Project(Loggable, GES.Project):
             self.warning("Failed to set the pipeline's timeline: %s", self.ges_timeline)
             return False
 
+        self.preview_cache = PreviewCache(self)
+        self.preview_cache.schedule_update()
         return True
 
     def update_restriction_caps(self):
@@ -1492,17 +1739,21 @@ class Project(Loggable, GES.Project):
                 caps=audiocaps.to_string(),
                 track_type=GES.TrackType.AUDIO.value_nicks[0])
 
+        self.pipeline.set_video_size(width, height)
         self.pipeline.commit_timeline()
 
-    def addUris(self, uris):
+    def addUris(self, uris, priority=PRIORITY_DEFAULT):
         """Adds assets asynchronously.
 
+        The assets are discovered by the `discovery_scheduler`.
+
         Args:
             uris (List[str]): The URIs of the assets.
+            priority (Optional[int]): How urgent the discovery is.
         """
         with self.app.action_log.started("Adding assets"):
             for uri in uris:
-                if self.create_asset(quote_uri(uri), GES.UriClip):
+                if self.discovery_scheduler.add(quote_uri(uri), priority):
                     # The asset was not already part of the project.
                     action = AssetAddedIntention(self, uri)
                     self.app.action_log.push(action)
@@ -1522,9 +1773,16 @@ class Project(Loggable, GES.Project):
     def release(self):
         res = 0
 
+        # The queued files are not added to the closed project.
+        self.discovery_scheduler.release()
+
         if self.pipeline:
             self.pipeline.release()
 
+        if self.preview_cache:
+            self.preview_cache.release()
+            self.preview_cache = None
+
         if self.runner:
             res = self.runner.printf()
 
@@ -31,19 +31,40 @@ from gi.repository import Gtk
 from pitivi import configure
 from pitivi.check import missing_soft_deps
 from pitivi.preset import EncodingTargetManager
+from pitivi.settings import get_dir
+from pitivi.settings import GlobalSettings
+from pitivi.settings import xdg_cache_home
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import show_user_manual
+from pitivi.utils.render_stats import MAX_RENDER_LOGS
+from pitivi.utils.render_stats import prune_render_logs
+from pitivi.utils.render_stats import RenderStats
 from pitivi.utils.ripple_update_group import RippleUpdateGroup
+from pitivi.utils.segmented_render import SegmentedRender
+from pitivi.utils.smart_render import can_copy_sources
 from pitivi.utils.ui import audio_channels
 from pitivi.utils.ui import audio_rates
 from pitivi.utils.ui import beautify_ETA
 from pitivi.utils.ui import frame_rates
 from pitivi.utils.ui import get_combo_value
 from pitivi.utils.ui import set_combo_value
+from pitivi.utils.ui import SPACING
 from pitivi.utils.widgets import GstElementSettingsDialog
 from pitivi.utils.widgets import TextWidget
 
+GlobalSettings.addConfigOption("smartRender",
+                               section="render",
+                               key="smart-render",
+                               default=False)
+GlobalSettings.addConfigOption("backgroundRender",
+                               section="render",
+                               key="background",
+                               default=False)
+
+# How much the priority of the background render processes is lowered.
+BACKGROUND_RENDER_NICENESS = 10
+
 
 class Encoders(Loggable):
     """Registry of avalaible Muxers, Audio encoders and Video encoders.
@@ -317,6 +338,9 @@ class RenderingProgressDialog(GObject.Object):
             "estimated_filesize_label")
         self._filesize_est_value_label = self.builder.get_object(
             "estimated_filesize_value_label")
+        self._throughput_label = self.builder.get_object("throughput_label")
+        self._throughput_value_label = self.builder.get_object(
+            "throughput_value_label")
         # Parent the dialog with mainwindow, since renderingdialog is hidden.
         # It allows this dialog to properly minimize together with mainwindow
         self.window.set_transient_for(self.app.gui)
@@ -352,6 +376,29 @@ class RenderingProgressDialog(GObject.Object):
             self._filesize_est_label.show()
             self._filesize_est_value_label.show()
 
+    def setThroughput(self, fps=None, realtime_factor=None, bitrate=None):
+        """Shows how fast the render is going.
+
+        Args:
+            fps (Optional[float]): The number of frames rendered per second.
+            realtime_factor (Optional[float]): The duration of the timeline
+                rendered per second.
+            bitrate (Optional[float]): The bitrate of the output, in bits per
+                second.
+        """
+        if fps is None or realtime_factor is None:
+            self._throughput_label.hide()
+            self._throughput_value_label.hide()
+            return
+
+        # Translators: the speed of the render, for example "24.0 fps, 0.96×".
+        text = _("%.1f fps, %.2f×") % (fps, realtime_factor)
+        if bitrate:
+            text += ", " + _("%.1f Mbit/s") % (bitrate / 1000000)
+        self._throughput_value_label.set_text(text)
+        self._throughput_label.show()
+        self._throughput_value_label.show()
+
     def _deleteEventCb(self, unused_dialog_widget, unused_event):
         """Stops the rendering."""
         # The user closed the window by pressing Escape.
@@ -373,6 +420,59 @@ class RenderingProgressDialog(GObject.Object):
         Gio.AppInfo.launch_default_for_uri(self.main_render_dialog.outfile, None)
 
 
+class BackgroundRenderIndicator(Gtk.Box):
+    """Widget showing the progress of a background render.
+
+    Args:
+        filename (str): The name of the file being rendered.
+
+    Signals:
+        cancel: The user wants to stop the render.
+    """
+
+    __gsignals__ = {
+        "cancel": (GObject.SIGNAL_RUN_LAST, None, ()),
+    }
+
+    def __init__(self, filename):
+        Gtk.Box.__init__(self)
+        self.set_spacing(SPACING)
+        self.filename = filename
+
+        self.progressbar = Gtk.ProgressBar()
+        self.progressbar.set_show_text(True)
+        self.progressbar.set_text(filename)
+        self.progressbar.props.valign = Gtk.Align.CENTER
+        self.pack_start(self.progressbar, False, False, 0)
+
+        cancel_button = Gtk.Button.new_from_icon_name(
+            "process-stop-symbolic", Gtk.IconSize.BUTTON)
+        cancel_button.set_tooltip_text(_("Stop rendering"))
+        cancel_button.connect("clicked", self._cancel_button_clicked_cb)
+        self.pack_start(cancel_button, False, False, 0)
+
+        self.update(0)
+        self.show_all()
+
+    def update(self, fraction, time_estimation=None):
+        """Shows the progress of the render.
+
+        Args:
+            fraction (float): How much has been rendered.
+            time_estimation (Optional[str]): The human-readable remaining
+                duration, if known.
+        """
+        self.progressbar.set_fraction(fraction)
+        tooltip = _("Rendering %s — %d%% complete") % (self.filename,
+                                                       int(100 * fraction))
+        if time_estimation:
+            tooltip += "\n" + _("About %s left") % time_estimation
+        self.progressbar.set_tooltip_text(tooltip)
+
+    def _cancel_button_clicked_cb(self, unused_button):
+        self.emit("cancel")
+
+
 class RenderDialog(Loggable):
     """Render dialog box.
 
@@ -405,6 +505,15 @@ class RenderDialog(Loggable):
         self.current_position = None
         self._time_started = 0
         self._time_spent_paused = 0  # Avoids the ETA being wrong on resume
+        self._render_stats = None
+        # The render done by parallel processes, if any.
+        self.__segmented_render = None
+        # Whether the render copies the unmodified clips.
+        self.__smart_render = False
+        # The render done in the background, if any.
+        self.__background_render = None
+        self.__background_indicator = None
+        self.__background_stats = None
 
         # Various gstreamer signal connection ID's
         # {object: sigId}
@@ -578,6 +687,12 @@ class RenderDialog(Loggable):
         self.filebutton = builder.get_object("filebutton")
         self.fileentry = builder.get_object("fileentry")
         self.resolution_label = builder.get_object("resolution_label")
+        self.render_workers_spinbutton = builder.get_object(
+            "render_workers_spinbutton")
+        self.smart_render_checkbutton = builder.get_object(
+            "smart_render_checkbutton")
+        self.background_render_checkbutton = builder.get_object(
+            "background_render_checkbutton")
         self.preset_menubutton = builder.get_object("preset_menubutton")
 
         text_widget = TextWidget(matches=r'^[a-z][a-z-0-9-]+$', combobox=True)
@@ -598,6 +713,13 @@ class RenderDialog(Loggable):
         self.__never_use_proxies = builder.get_object("never_use_proxies")
         self.__never_use_proxies.props.group = self.__automatically_use_proxies
 
+        self.render_workers_spinbutton.props.adjustment.props.upper = \
+            max(os.cpu_count() or 1, self.app.settings.renderWorkers)
+        self.render_workers_spinbutton.set_value(self.app.settings.renderWorkers)
+        self.smart_render_checkbutton.set_active(self.app.settings.smartRender)
+        self.background_render_checkbutton.set_active(
+            self.app.settings.backgroundRender)
+
         self.render_presets.setupUi(self.presets_combo, self.preset_menubutton)
         self.render_presets.loadAll()
 
@@ -854,7 +976,10 @@ class RenderDialog(Loggable):
         """Starts the render process."""
         self._pipeline.set_state(Gst.State.NULL)
         # FIXME: https://github.com/pitivi/gst-editing-services/issues/23
-        self._pipeline.set_mode(GES.PipelineFlags.RENDER)
+        if self.__smart_render:
+            self._pipeline.set_mode(GES.PipelineFlags.SMART_RENDER)
+        else:
+            self._pipeline.set_mode(GES.PipelineFlags.RENDER)
         encodebin = self._pipeline.get_by_name("internal-encodebin")
         self._gstSigId[encodebin] = encodebin.connect(
             "element-added", self._elementAddedCb)
@@ -863,6 +988,7 @@ class RenderDialog(Loggable):
         self._pipeline.set_state(Gst.State.PLAYING)
         self._is_rendering = True
         self._time_started = time.time()
+        self.__start_stats()
 
     def _cancelRender(self, *unused_args):
         self.debug("Aborting render")
@@ -874,6 +1000,17 @@ class RenderDialog(Loggable):
         self._is_rendering = False
         self._rendering_is_paused = False
         self._time_spent_paused = 0
+        self.__smart_render = False
+        if self._render_stats:
+            self._render_stats.close()
+            self._render_stats = None
+        if self.__segmented_render:
+            self.__segmented_render.disconnect_by_func(self.__segmented_render_progress_cb)
+            self.__segmented_render.disconnect_by_func(self.__segmented_render_done_cb)
+            self.__segmented_render.disconnect_by_func(self.__segmented_render_error_cb)
+            self.__segmented_render.cancel()
+            self.__segmented_render = None
+            self.app.simple_uninhibit(RenderDialog.INHIBIT_REASON)
         self._pipeline.set_state(Gst.State.NULL)
         self.__useProxyAssets()
         self._disconnectFromGst()
@@ -891,7 +1028,32 @@ class RenderDialog(Loggable):
             ) - self._last_timestamp_when_pausing
             self.debug(
                 "Resuming render after %d seconds in pause", self._time_spent_paused)
-        self.project.pipeline.togglePlayback()
+            if self._render_stats:
+                # The pause would make the throughput look lower.
+                self._render_stats.reset()
+        if self.__segmented_render:
+            self.__segmented_render.set_paused(self._rendering_is_paused)
+        else:
+            self.project.pipeline.togglePlayback()
+
+    def _renderCompleted(self):
+        """Shows the render is done."""
+        self._shutDown()
+        self.progress.progressbar.set_fraction(1.0)
+        self.progress.progressbar.set_text(_("Render complete"))
+        self.progress.window.set_title(_("Render complete"))
+        self.progress.setFilesizeEstimate(None)
+        self.progress.setThroughput(None)
+        if not self.progress.window.is_active():
+            notification = _(
+                '"%s" has finished rendering.') % self.fileentry.get_text()
+            self.notification = self.app.system.desktopMessage(
+                _("Render complete"), notification, "pitivi")
+        self._maybe_play_finished_sound()
+        self.progress.play_rendered_file_button.show()
+        self.progress.close_button.show()
+        self.progress.cancel_button.hide()
+        self.progress.play_pause_button.hide()
 
     def _destroyProgressWindow(self):
         """Handles the completion or the cancellation of the render process."""
@@ -958,6 +1120,120 @@ class RenderDialog(Loggable):
                                asset.get_id())
                     self.__unproxiedClips[clip] = asset
 
+    def __use_smart_render(self):
+        """Checks whether the render can copy parts of the sources.
+
+        Returns:
+            bool: Whether smart render is enabled and some ranges of the
+            timeline can be copied without re-encoding.
+        """
+        if not self.app.settings.smartRender:
+            return False
+
+        useful = can_copy_sources(self.project.ges_timeline, self.project,
+                                  self.project.container_profile)
+        self.info("Smart render can copy parts of the timeline: %s", useful)
+        return useful
+
+    def __start_segmented_render(self):
+        """Starts rendering in parallel processes, if enabled.
+
+        Returns:
+            bool: Whether the segmented render started.
+        """
+        workers = self.app.settings.renderWorkers
+        if workers < 2:
+            return False
+
+        segmented_render = SegmentedRender(self.project, self.outfile,
+                                           self.project.container_profile)
+        if not segmented_render.start(workers):
+            return False
+        segmented_render.connect("progress", self.__segmented_render_progress_cb)
+        segmented_render.connect("done", self.__segmented_render_done_cb)
+        segmented_render.connect("error", self.__segmented_render_error_cb)
+        self.__segmented_render = segmented_render
+        self._is_rendering = True
+        self._time_started = time.time()
+        self.__start_stats()
+        self.app.simple_inhibit(RenderDialog.INHIBIT_REASON,
+                                Gtk.ApplicationInhibitFlags.SUSPEND)
+        return True
+
+    def __render_log_path(self):
+        logs_dir = get_dir(os.path.join(xdg_cache_home(), "render-logs"))
+        prune_render_logs(logs_dir, MAX_RENDER_LOGS - 1)
+        name = "%s-%s.log" % (time.strftime("%Y%m%d-%H%M%S"),
+                              os.path.basename(path_from_uri(self.outfile)))
+        return os.path.join(logs_dir, name)
+
+    def __start_stats(self):
+        """Starts measuring the throughput and estimating the end."""
+        self._render_stats = RenderStats(self.project.ges_timeline,
+                                         self.project.videorate,
+                                         log_path=self.__render_log_path())
+        if not self._timeEstimateTimer:
+            self._timeEstimateTimer = GLib.timeout_add_seconds(
+                1, self._updateTimeEstimateCb)
+
+    def __background_inhibit_reason(self):
+        # Each background render inhibits the suspend on its own.
+        return "%s: %s" % (RenderDialog.INHIBIT_REASON,
+                           os.path.basename(path_from_uri(self.outfile)))
+
+    def __start_background_render(self):
+        """Renders a snapshot of the timeline in low priority processes.
+
+        Returns:
+            bool: Whether the render started.
+        """
+        segmented_render = SegmentedRender(self.project, self.outfile,
+                                           self.project.container_profile)
+        started = segmented_render.start(max(1, self.app.settings.renderWorkers),
+                                         niceness=BACKGROUND_RENDER_NICENESS)
+        # The snapshot has been saved, the timeline can be edited.
+        self.__useProxyAssets()
+        if not started:
+            return False
+
+        segmented_render.connect("progress", self.__background_render_progress_cb)
+        segmented_render.connect("done", self.__background_render_done_cb)
+        segmented_render.connect("error", self.__background_render_error_cb)
+        self.__background_render = segmented_render
+        self.__background_stats = RenderStats(self.project.ges_timeline,
+                                              self.project.videorate,
+                                              log_path=self.__render_log_path())
+
+        filename = os.path.basename(path_from_uri(self.outfile))
+        self.__background_indicator = BackgroundRenderIndicator(filename)
+        self.__background_indicator.connect(
+            "cancel", self.__background_render_cancel_cb)
+        self.app.gui.show_background_task(self.__background_indicator)
+        self.app.simple_inhibit(self.__background_inhibit_reason(),
+                                Gtk.ApplicationInhibitFlags.SUSPEND)
+        # Closing the project or the app stops the worker processes,
+        # which would otherwise be left behind with their temp files.
+        self.app.project_manager.connect("project-closed",
+                                         self.__background_render_project_closed_cb)
+        return True
+
+    def __stop_background_render(self):
+        self.__background_render.disconnect_by_func(
+            self.__background_render_progress_cb)
+        self.__background_render.disconnect_by_func(
+            self.__background_render_done_cb)
+        self.__background_render.disconnect_by_func(
+            self.__background_render_error_cb)
+        self.__background_render.cancel()
+        self.__background_render = None
+        self.__background_stats.close()
+        self.__background_stats = None
+        self.__background_indicator.destroy()
+        self.__background_indicator = None
+        self.app.simple_uninhibit(self.__background_inhibit_reason())
+        self.app.project_manager.disconnect_by_func(
+            self.__background_render_project_closed_cb)
+
     def __useProxyAssets(self):
         for clip, asset in self.__unproxiedClips.items():
             clip.set_asset(asset)
@@ -976,22 +1252,34 @@ class RenderDialog(Loggable):
         self.__maybeUseSourceAsset()
         self.outfile = os.path.join(self.filebutton.get_uri(),
                                     self.fileentry.get_text())
+        if self.app.settings.backgroundRender and \
+                self.__start_background_render():
+            # The dialog is destroyed when the render is done.
+            self.window.hide()
+            self.app.settings.lastExportFolder = \
+                self.filebutton.get_current_folder()
+            return
+
         self.progress = RenderingProgressDialog(self.app, self)
         # Hide the rendering settings dialog while rendering
         self.window.hide()
 
         self.app.gui.timeline_ui.timeline.set_best_zoom_ratio(allow_zoom_in=True)
         self.project.set_rendering(True)
-        self._pipeline.set_render_settings(
-            self.outfile, self.project.container_profile)
-        self.startAction()
+        # The segments cannot be cut at the keyframes of the copied ranges,
+        # so smart render is done in a single pass.
+        self.__smart_render = self.__use_smart_render()
+        if self.__smart_render or not self.__start_segmented_render():
+            self._pipeline.set_render_settings(
+                self.outfile, self.project.container_profile)
+            self.startAction()
+            bus = self._pipeline.get_bus()
+            bus.add_signal_watch()
+            self._gstSigId[bus] = bus.connect('message', self._busMessageCb)
+            self.project.pipeline.connect("position", self._updatePositionCb)
         self.progress.window.show()
         self.progress.connect("cancel", self._cancelRender)
         self.progress.connect("pause", self._pauseRender)
-        bus = self._pipeline.get_bus()
-        bus.add_signal_watch()
-        self._gstSigId[bus] = bus.connect('message', self._busMessageCb)
-        self.project.pipeline.connect("position", self._updatePositionCb)
         # Force writing the config now, or the path will be reset
         # if the user opens the rendering dialog again
         self.app.settings.lastExportFolder = self.filebutton.get_current_folder(
@@ -1010,20 +1298,48 @@ class RenderDialog(Loggable):
     def _containerContextHelpClickedCb(self, unused_button):
         show_user_manual("codecscontainers")
 
+    def _render_workers_spinbutton_changed_cb(self, spinbutton):
+        self.app.settings.renderWorkers = spinbutton.get_value_as_int()
+
+    def _smart_render_checkbutton_toggled_cb(self, checkbutton):
+        self.app.settings.smartRender = checkbutton.get_active()
+
+    def _background_render_checkbutton_toggled_cb(self, checkbutton):
+        self.app.settings.backgroundRender = checkbutton.get_active()
+
     # Periodic (timer) callbacks
     def _updateTimeEstimateCb(self):
         if self._rendering_is_paused:
             # Do nothing until we resume rendering
             return True
-        if self._is_rendering:
+        if self._is_rendering and self._render_stats:
             if self.current_position:
+                stats = self._render_stats
+                if self.__segmented_render:
+                    # Each segment is rendered in its own range. They are
+                    # concatenated in the output file only at the end.
+                    stats.add_ranges_sample(self.__segmented_render.rendered_ranges)
+                else:
+                    size = None
+                    try:
+                        size = os.stat(path_from_uri(self.outfile)).st_size
+                    except OSError:
+                        pass
+                    stats.add_sample(self.current_position, size)
+                self.progress.setThroughput(stats.fps, stats.realtime_factor,
+                                            stats.bitrate)
+
+                # In order to have enough averaging, only display the ETA
+                # after 5s.
                 timediff = time.time() - self._time_started - self._time_spent_paused
-                length = self.project.ges_timeline.props.duration
-                estimated_time = timediff * length / self.current_position
-                remaining_time = estimated_time - timediff
-                estimate = beautify_ETA(int(remaining_time * Gst.SECOND))
+                remaining_time = stats.eta()
+                estimate = None
+                if timediff >= 6 and remaining_time is not None:
+                    estimate = beautify_ETA(int(remaining_time * Gst.SECOND))
                 if estimate:
                     self.progress.updateProgressbarETA(estimate)
+                else:
+                    self.progress.progressbar.set_text(_("Estimating..."))
             return True
         else:
             self._timeEstimateTimer = None
@@ -1043,25 +1359,60 @@ class RenderDialog(Loggable):
             self._filesizeEstimateTimer = None
             return False  # Stop the timer
 
+    def __segmented_render_progress_cb(self, unused_segmented_render,
+                                       rendered, unused_duration):
+        # The segments are rendered in parallel, so the progress and the
+        # ETA are computed from the total rendered duration.
+        self._updatePositionCb(None, rendered)
+
+    def __background_render_progress_cb(self, segmented_render,
+                                        rendered, duration):
+        stats = self.__background_stats
+        stats.add_ranges_sample(segmented_render.rendered_ranges)
+        remaining_time = stats.eta()
+        estimate = None
+        if remaining_time is not None:
+            estimate = beautify_ETA(int(remaining_time * Gst.SECOND))
+        self.__background_indicator.update(min(rendered / duration, 1.0),
+                                           estimate)
+
+    def __background_render_done_cb(self, unused_segmented_render):
+        self.__stop_background_render()
+        notification = _('"%s" has finished rendering.') % \
+            self.fileentry.get_text()
+        self.app.system.desktopMessage(_("Render complete"), notification,
+                                       "pitivi")
+        self._maybe_play_finished_sound()
+        self.destroy()
+
+    def __background_render_error_cb(self, unused_segmented_render, message):
+        self.__stop_background_render()
+        self._showRenderErrorDialog(message, None)
+        self.destroy()
+
+    def __background_render_cancel_cb(self, unused_indicator):
+        self.debug("Aborting background render")
+        self.__stop_background_render()
+        self.destroy()
+
+    def __background_render_project_closed_cb(self, unused_project_manager,
+                                              unused_project):
+        self.info("Aborting background render, the project has been closed")
+        self.__stop_background_render()
+        self.destroy()
+
+    def __segmented_render_done_cb(self, unused_segmented_render):
+        self._renderCompleted()
+
+    def __segmented_render_error_cb(self, unused_segmented_render, message):
+        self._cancelRender()
+        self._showRenderErrorDialog(message, None)
+
     # GStreamer callbacks
     def _busMessageCb(self, unused_bus, message):
         if message.type == Gst.MessageType.EOS:  # Render complete
             self.debug("got EOS message, render complete")
-            self._shutDown()
-            self.progress.progressbar.set_fraction(1.0)
-            self.progress.progressbar.set_text(_("Render complete"))
-            self.progress.window.set_title(_("Render complete"))
-            self.progress.setFilesizeEstimate(None)
-            if not self.progress.window.is_active():
-                notification = _(
-                    '"%s" has finished rendering.') % self.fileentry.get_text()
-                self.notification = self.app.system.desktopMessage(
-                    _("Render complete"), notification, "pitivi")
-            self._maybe_play_finished_sound()
-            self.progress.play_rendered_file_button.show()
-            self.progress.close_button.show()
-            self.progress.cancel_button.hide()
-            self.progress.play_pause_button.hide()
+            self._renderCompleted()
 
         elif message.type == Gst.MessageType.ERROR:
             # Errors in a GStreamer pipeline are fatal. If we encounter one,
@@ -1096,16 +1447,12 @@ class RenderDialog(Loggable):
         fraction = float(min(position, length)) / float(length)
         self.progress.updatePosition(fraction)
 
-        # In order to have enough averaging, only display the ETA after 5s
-        timediff = time.time() - self._time_started
-        if not self._timeEstimateTimer:
-            if timediff < 6:
-                self.progress.progressbar.set_text(_("Estimating..."))
-            else:
-                self._timeEstimateTimer = GLib.timeout_add_seconds(
-                    3, self._updateTimeEstimateCb)
-
+        # The throughput and the ETA are computed by _updateTimeEstimateCb.
         # Filesize is trickier and needs more time to be meaningful.
+        if self.__segmented_render:
+            # The output file is written only at the end.
+            return
+        timediff = time.time() - self._time_started
         if not self._filesizeEstimateTimer and (fraction > 0.33 or timediff > 180):
             self._filesizeEstimateTimer = GLib.timeout_add_seconds(
                 5, self._updateFilesizeEstimateCb)
@@ -456,7 +456,8 @@ class MultipleKeyframeCurve(KeyframeCurve):
 
         self._timeline = timeline
         self._project = timeline.app.project_manager.current_project
-        self._project.pipeline.connect("position", self._position_cb)
+        self._project.pipeline.playhead.subscribe(self, self._position_cb,
+                                                  interval=pipeline.SLOW_PLAYHEAD_INTERVAL)
 
         sizes = [80]
         self.__selected_keyframe = self._ax.scatter([0], [0.5], marker='D', s=sizes,
@@ -468,7 +469,7 @@ class MultipleKeyframeCurve(KeyframeCurve):
 
     def release(self):
         super().release()
-        self._project.pipeline.disconnect_by_func(self._position_cb)
+        self._project.pipeline.playhead.unsubscribe(self._position_cb)
 
     def _connect_sources(self):
         for binding in self.__bindings:
@@ -1169,6 +1170,10 @@ class Clip(Gtk.EventBox, Zoomable, Loggable):
         return None
 
     def updatePosition(self):
+        if self.timeline.postpone(self.updatePosition):
+            # Bulk edit in progress.
+            return
+
         layer = self.layer
         if not layer or layer != self.get_parent():
             # Things are not settled yet.
@@ -291,6 +291,9 @@ class Layer(Gtk.Layout, Zoomable, Loggable):
             self.info("Not updating media types as"
                       " we are editing the timeline")
             return
+        if self.timeline.postpone(self.checkMediaTypes):
+            # Bulk edit in progress.
+            return
         old_media_types = self.media_types
         self.media_types = GES.TrackType(0)
         ges_clips = self.ges_layer.get_clips()
@@ -17,6 +17,7 @@
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
 """Previewers for the timeline."""
+import collections
 import contextlib
 import os
 import random
@@ -58,9 +59,14 @@ except ImportError:
 SAMPLE_DURATION = Gst.SECOND / 100
 
 THUMB_MARGIN_PX = 3
-# For the waveforms, ensures we always have a little extra surface when
-# scrolling while playing.
-MARGIN = 500
+
+# The width of the surfaces the waveforms are drawn on, in pixels.
+WAVEFORM_TILE_WIDTH = 256
+# The max size of the waveform surfaces kept for all the audio previewers.
+MAX_WAVEFORM_TILES_SIZE = 64 * 1024 ** 2
+# The number of waveform surfaces rendered in advance in the scrolling
+# direction, so they are ready when scrolling while playing.
+WAVEFORM_TILES_AHEAD = 2
 
 PREVIEW_GENERATOR_SIGNALS = {
     "done": (GObject.SIGNAL_RUN_LAST, None, ()),
@@ -833,6 +839,23 @@ class ThumbnailCache(Loggable):
 
         return self[timestamps[int(len(timestamps) / 2)][0]]
 
+    def get_nearest(self, position):
+        """Gets the cached thumbnail closest to the specified position.
+
+        Args:
+            position (int): The position in the asset.
+
+        Returns:
+            Optional[GdkPixbuf.Pixbuf]: The thumbnail, or None if the cache
+            is empty.
+        """
+        self._cur.execute("SELECT * FROM Thumbs ORDER BY ABS(Time - ?) LIMIT 1",
+                          (position,))
+        row = self._cur.fetchone()
+        if not row:
+            return None
+        return self.__getPixbufFromRow(row)
+
     # pylint: disable=no-self-use
     def __getPixbufFromRow(self, row):
         jpeg = row[1]
@@ -884,6 +907,84 @@ def get_wavefile_location_for_uri(uri):
     return os.path.join(cache_dir, filename)
 
 
+class WaveformTileCache(Loggable):
+    """Bounded LRU cache of the waveform surfaces of the audio previewers.
+
+    A single cache is shared by all the previewers, so the memory used does
+    not grow with the number of audio clips.
+
+    Attributes:
+        max_bytes (int): The max size of the cached surfaces.
+        size (int): The size of the cached surfaces, in bytes.
+    """
+
+    __shared = None
+
+    def __init__(self, max_bytes):
+        Loggable.__init__(self)
+        self.max_bytes = max_bytes
+        self.size = 0
+        # Maps (previewer, zoomratio, tile index, height) to (surface, size)
+        # tuples, the least recently used first.
+        self.__tiles = collections.OrderedDict()
+        # Maps the previewers to the keys of their tiles.
+        self.__keys = collections.defaultdict(set)
+
+    @classmethod
+    def get(cls):
+        """Gets the cache shared by all the audio previewers."""
+        if cls.__shared is None:
+            cls.__shared = WaveformTileCache(MAX_WAVEFORM_TILES_SIZE)
+        return cls.__shared
+
+    def __contains__(self, key):
+        return key in self.__tiles
+
+    def __len__(self):
+        return len(self.__tiles)
+
+    def lookup(self, key):
+        """Gets the specified surface, marking it as recently used.
+
+        Args:
+            key (tuple): The previewer, the zoom ratio, the tile index and
+                the height of the surface.
+
+        Returns:
+            Optional[cairo.ImageSurface]: The surface, if cached.
+        """
+        entry = self.__tiles.get(key)
+        if entry is None:
+            return None
+        self.__tiles.move_to_end(key)
+        return entry[0]
+
+    def add(self, key, surface):
+        """Caches a surface, evicting the least recently used ones if needed."""
+        self.__remove(key)
+        size = surface.get_stride() * surface.get_height()
+        self.__tiles[key] = (surface, size)
+        self.__keys[key[0]].add(key)
+        self.size += size
+        while self.size > self.max_bytes and len(self.__tiles) > 1:
+            self.__remove(next(iter(self.__tiles)))
+
+    def forget(self, previewer):
+        """Removes the surfaces of the specified previewer."""
+        for key in list(self.__keys.get(previewer, ())):
+            self.__remove(key)
+
+    def __remove(self, key):
+        entry = self.__tiles.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        keys = self.__keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.__keys[key[0]]
+
+
 class AudioPreviewer(Previewer, Zoomable, Loggable):
     """Audio previewer using the results from the "level" GStreamer element."""
 
@@ -905,9 +1006,13 @@ class AudioPreviewer(Previewer, Zoomable, Loggable):
         self.n_samples = asset.get_duration() / SAMPLE_DURATION
         self.samples = None
         self.peaks = None
-        self._start = 0
-        self._end = 0
-        self._surface_x = 0
+        # The waveform surfaces, keyed by (self, zoomratio, tile index, height).
+        self._tiles = WaveformTileCache.get()
+        self._last_clip_x = None
+        self._scroll_direction = 1
+        # The (index, height) of the tiles to be rendered in idle time.
+        self._tiles_ahead = []
+        self._render_ahead_id = 0
 
         # Guard against malformed URIs
         self.wavefile = None
@@ -915,19 +1020,13 @@ class AudioPreviewer(Previewer, Zoomable, Loggable):
 
         self._num_failures = 0
         self.adapter = None
-        self.surface = None
-
-        self._force_redraw = True
 
         self.ges_elem.connect("notify::in-point", self._inpoint_changed_cb)
-        self.connect("notify::height-request", self._height_changed_cb)
         self.becomeControlled()
 
     def _inpoint_changed_cb(self, unused_b_element, unused_value):
-        self._force_redraw = True
-
-    def _height_changed_cb(self, unused_widget, unused_param_spec):
-        self._force_redraw = True
+        # The samples shown by all the tiles are shifted.
+        self._clear_tiles()
 
     def _startLevelsDiscovery(self):
         filename = get_wavefile_location_for_uri(self._uri)
@@ -968,7 +1067,10 @@ class AudioPreviewer(Previewer, Zoomable, Loggable):
         bus.connect("message", self._busMessageCb)
 
     def zoomChanged(self):
-        self._force_redraw = True
+        # The tiles of the other zoom levels are kept, in case the user
+        # zooms back, until they are pushed out by the new ones.
+        self._tiles_ahead = []
+        self._last_clip_x = None
 
     def _prepareSamples(self):
         proxy = self.ges_elem.get_parent().get_asset().get_proxy_target()
@@ -1025,37 +1127,90 @@ class AudioPreviewer(Previewer, Zoomable, Loggable):
 
         return 0
 
+    def _clear_tiles(self):
+        self._tiles.forget(self)
+        self._tiles_ahead = []
+        if self._render_ahead_id:
+            GLib.source_remove(self._render_ahead_id)
+            self._render_ahead_id = 0
+
+    def _get_tile(self, index, height):
+        """Gets the surface of the specified tile, rendering it if needed.
+
+        Args:
+            index (int): The index of the tile, from the start of the clip.
+            height (int): The height of the surface.
+
+        Returns:
+            cairo.ImageSurface: The waveform between `index * WAVEFORM_TILE_WIDTH`
+            and the start of the next tile, or None if the clip ends before.
+        """
+        tile_x = index * WAVEFORM_TILE_WIDTH
+        width = min(WAVEFORM_TILE_WIDTH, self.props.width_request - tile_x)
+        if width <= 0:
+            return None
+
+        key = (self, Zoomable.zoomratio, index, height)
+        surface = self._tiles.lookup(key)
+        # The last tile is narrower when the clip has been trimmed.
+        if surface is not None and surface.get_width() == width:
+            return surface
+
+        num_inpoint_samples = self._get_num_inpoint_samples()
+        start = int(self.pixelToNs(tile_x) / SAMPLE_DURATION) + num_inpoint_samples
+        end = int(self.pixelToNs(tile_x + width) / SAMPLE_DURATION) + num_inpoint_samples
+        end = int(min(self.n_samples, end))
+        surface = renderer.fill_surface(self.samples[start:end], width, height)
+
+        self._tiles.add(key, surface)
+        return surface
+
+    def _schedule_tiles_ahead(self, first, last, height):
+        if self._scroll_direction > 0:
+            indexes = range(last + 1, last + 1 + WAVEFORM_TILES_AHEAD)
+        else:
+            indexes = range(first - 1, max(-1, first - 1 - WAVEFORM_TILES_AHEAD), -1)
+        self._tiles_ahead = [(index, height) for index in indexes
+                             if (self, Zoomable.zoomratio, index, height) not in self._tiles]
+        if self._tiles_ahead and not self._render_ahead_id:
+            self._render_ahead_id = GLib.idle_add(self._render_ahead_cb,
+                                                  priority=GLib.PRIORITY_LOW)
+
+    def _render_ahead_cb(self):
+        if self._tiles_ahead:
+            # A single tile per iteration, to keep the UI responsive.
+            index, height = self._tiles_ahead.pop(0)
+            self._get_tile(index, height)
+        if self._tiles_ahead:
+            return True
+        self._render_ahead_id = 0
+        return False
+
     # pylint: disable=arguments-differ
     def do_draw(self, context):
         if not self.discovered:
             return
 
         clipped_rect = Gdk.cairo_get_clip_rectangle(context)[1]
+        height = int(self.get_parent().get_allocation().height)
 
-        num_inpoint_samples = self._get_num_inpoint_samples()
-        drawn_start = self.pixelToNs(clipped_rect.x)
-        drawn_duration = self.pixelToNs(clipped_rect.width)
-        start = int(drawn_start / SAMPLE_DURATION) + num_inpoint_samples
-        end = int((drawn_start + drawn_duration) / SAMPLE_DURATION) + num_inpoint_samples
-
-        if self._force_redraw or self._surface_x > clipped_rect.x or self._end < end:
-            self._start = start
-            end = int(min(self.n_samples, end + (self.pixelToNs(MARGIN) /
-                                                 SAMPLE_DURATION)))
-            self._end = end
-            self._surface_x = clipped_rect.x
-            surface_width = min(self.props.width_request - clipped_rect.x,
-                                clipped_rect.width + MARGIN)
-            surface_height = int(self.get_parent().get_allocation().height)
-            self.surface = renderer.fill_surface(self.samples[start:end],
-                                                 surface_width,
-                                                 surface_height)
-
-            self._force_redraw = False
+        if self._last_clip_x is not None and clipped_rect.x != self._last_clip_x:
+            self._scroll_direction = 1 if clipped_rect.x > self._last_clip_x else -1
+        self._last_clip_x = clipped_rect.x
 
+        first = clipped_rect.x // WAVEFORM_TILE_WIDTH
+        last = (clipped_rect.x + clipped_rect.width - 1) // WAVEFORM_TILE_WIDTH
         context.set_operator(cairo.OPERATOR_OVER)
-        context.set_source_surface(self.surface, self._surface_x, 0)
-        context.paint()
+        for index in range(first, last + 1):
+            surface = self._get_tile(index, height)
+            if surface is None:
+                break
+            tile_x = index * WAVEFORM_TILE_WIDTH
+            context.set_source_surface(surface, tile_x, 0)
+            context.rectangle(tile_x, 0, surface.get_width(), height)
+            context.fill()
+
+        self._schedule_tiles_ahead(first, last, height)
 
     def _emit_done_on_idle(self):
         self.emit("done")
@@ -1086,4 +1241,5 @@ class AudioPreviewer(Previewer, Zoomable, Loggable):
     def release(self):
         """Stops preview generation and cleans the object."""
         self.stopGeneration()
+        self._clear_tiles()
         Zoomable.__del__(self)
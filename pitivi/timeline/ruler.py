@@ -81,6 +81,11 @@ FRAME_HEIGHT_PIXELS = 5
 NORMAL_FONT_SIZE = 13
 SMALL_FONT_SIZE = 11
 
+# The half width of the head of the playhead.
+PLAYHEAD_HEAD_SEMI_WIDTH = 4
+# How far the playhead, including the stroke of its head, extends on each side.
+PLAYHEAD_DRAW_MARGIN = PLAYHEAD_HEAD_SEMI_WIDTH + PLAYHEAD_WIDTH * 2
+
 
 class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
     """Widget for displaying the ruler.
@@ -108,7 +113,10 @@ class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
                         Gdk.EventMask.BUTTON_PRESS_MASK | Gdk.EventMask.BUTTON_RELEASE_MASK |
                         Gdk.EventMask.SCROLL_MASK)
 
+        # The background, ticks and times, without the playhead.
         self.pixbuf = None
+        # The (zoom, offset, frame duration) for which pixbuf has been painted.
+        self.__pixbuf_key = None
 
         # all values are in pixels
         self.pixbuf_offset = 0
@@ -134,11 +142,18 @@ class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
 
     def setPipeline(self, pipeline):
         self._pipeline = pipeline
-        self._pipeline.connect('position', self.timelinePositionCb)
+        self._pipeline.playhead.subscribe(self, self.timelinePositionCb)
 
     def timelinePositionCb(self, unused_pipeline, position):
+        # Only the playhead needs to be repainted.
+        self.__queue_draw_position()
         self.position = position
-        self.queue_draw()
+        self.__queue_draw_position()
+
+    def __queue_draw_position(self):
+        x = int(self.nsToPixel(self.position) - self.pixbuf_offset)
+        margin = PLAYHEAD_DRAW_MARGIN
+        self.queue_draw_area(x - margin, 0, 2 * margin + 1, self.get_allocated_height())
 
 # Gtk.Widget overrides
 
@@ -154,6 +169,7 @@ class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
 
         # Create a new buffer
         self.pixbuf = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.__pixbuf_key = None
 
         context = self.app.gui.get_style_context()
 
@@ -178,15 +194,19 @@ class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
 
         pixbuf = self.pixbuf
 
-        # Draw on a temporary context and then copy everything.
-        drawing_context = cairo.Context(pixbuf)
-        self.drawBackground(drawing_context)
-        self.drawRuler(drawing_context)
-        self.drawPosition(drawing_context)
-        pixbuf.flush()
+        # The size is taken into account by recreating the buffer when
+        # the widget is configured.
+        key = (Zoomable.zoomratio, self.pixbuf_offset, self.ns_per_frame)
+        if key != self.__pixbuf_key:
+            drawing_context = cairo.Context(pixbuf)
+            self.drawBackground(drawing_context)
+            self.drawRuler(drawing_context)
+            pixbuf.flush()
+            self.__pixbuf_key = key
 
         context.set_source_surface(self.pixbuf, 0.0, 0.0)
         context.paint()
+        self.drawPosition(context)
 
         return False
 
@@ -198,11 +218,15 @@ class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
         button = event.button
         if button == 3 or (button == 1 and self.app.settings.leftClickAlsoSeeks):
             position = self.pixelToNs(event.x + self.pixbuf_offset)
+            self._pipeline.begin_scrub()
             self._pipeline.simple_seek(position)
         return False
 
     def do_button_release_event(self, event):
         self.debug("button released at x:%d", event.x)
+        if self._pipeline:
+            # Show the exact frame where the scrubbing stopped.
+            self._pipeline.end_scrub()
         self.app.gui.focusTimeline()
         return False
 
@@ -381,7 +405,7 @@ class ScaleRuler(Gtk.DrawingArea, Zoomable, Loggable):
         """
         height = self.pixbuf.get_height()
 
-        semi_width = 4
+        semi_width = PLAYHEAD_HEAD_SEMI_WIDTH
         semi_height = int(semi_width * 1.61803)
         y = int(3 * height / 4)
 
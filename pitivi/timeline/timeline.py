@@ -16,6 +16,8 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
+import collections
+import contextlib
 import os
 from gettext import gettext as _
 
@@ -41,7 +43,9 @@ from pitivi.timeline.layer import SpacedSeparator
 from pitivi.timeline.previewers import Previewer
 from pitivi.timeline.ruler import ScaleRuler
 from pitivi.undo.timeline import CommitTimelineFinalizingAction
+from pitivi.utils.discovery_scheduler import PRIORITY_TIMELINE
 from pitivi.utils.loggable import Loggable
+from pitivi.utils.timeline import EditCoalescer
 from pitivi.utils.timeline import EditingContext
 from pitivi.utils.timeline import SELECT
 from pitivi.utils.timeline import SELECT_ADD
@@ -390,6 +394,8 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         self.__clickedHandle = None
         # The GES object for controlling the operation.
         self.editing_context = None
+        # Applies the edits of the drags once per frame.
+        self.__edit_coalescer = EditCoalescer(self)
         # Whether draggingElement really got dragged.
         self.__got_dragged = False
         # The x of the event which starts the drag operation.
@@ -415,6 +421,12 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         # The list of (Layer, Clip) tuples dragged into the timeline.
         self.__last_clips_on_leave = None
 
+        # Bulk edits.
+        # The number of `updates_frozen` blocks being executed.
+        self.__updates_frozen = 0
+        # The widget updates to be done when the updates are thawed.
+        self.__postponed_updates = collections.OrderedDict()
+
         # To be able to receive effects dragged on clips.
         self.drag_dest_set(0, [EFFECT_TARGET_ENTRY], Gdk.DragAction.COPY)
         # To be able to receive assets dragged from the media library.
@@ -436,6 +448,49 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         self.current_group = GES.Group()
         self.current_group.props.serialize = False
 
+    @contextlib.contextmanager
+    def updates_frozen(self):
+        """Postpones the widget updates requested in the block.
+
+        Each postponed update is done once when the outermost block is
+        exited, so the widgets are reconciled with the GES objects only
+        once at the end of a bulk edit.
+        """
+        self.__updates_frozen += 1
+        try:
+            yield
+        finally:
+            self.__updates_frozen -= 1
+            if not self.__updates_frozen:
+                self.__thaw_updates()
+
+    def postpone(self, callback):
+        """Schedules an update for when the updates are thawed, if frozen.
+
+        Args:
+            callback (function): The update, called without arguments.
+
+        Returns:
+            bool: True if the update has been postponed, False if it should
+            be done right away by the caller.
+        """
+        if not self.__updates_frozen:
+            return False
+        # Bound methods are equal when they have the same object and
+        # function, so repeated updates of a widget are done only once.
+        self.__postponed_updates[callback] = None
+        return True
+
+    def __thaw_updates(self):
+        if not self.__postponed_updates:
+            return
+        self.debug("Doing %d postponed updates", len(self.__postponed_updates))
+        while self.__postponed_updates:
+            callback, unused_value = self.__postponed_updates.popitem(last=False)
+            callback()
+        self.layout.update_width()
+        self.layout.queue_draw()
+
     def setProject(self, project):
         """Connects to the GES.Timeline holding the project."""
         # Avoid starting/closing preview generation like crazy while tearing down project
@@ -457,11 +512,11 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
                 self.ges_timeline = None
 
             if self._project:
-                self._project.pipeline.disconnect_by_func(self._positionCb)
+                self._project.pipeline.playhead.unsubscribe(self._positionCb)
 
         self._project = project
         if self._project:
-            self._project.pipeline.connect('position', self._positionCb)
+            self._project.pipeline.playhead.subscribe(self, self._positionCb)
             self.ges_timeline = self._project.ges_timeline
 
         if self.ges_timeline is None:
@@ -706,6 +761,7 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
 
         self._scrubbing = res and button == 3
         if self._scrubbing:
+            self._project.pipeline.begin_scrub()
             self._seek(event)
             clip = self._getParentOfType(event_widget, Clip)
             if clip:
@@ -730,7 +786,9 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         elif res and button == 1:
             self._selectUnderMarquee()
 
-        self._scrubbing = False
+        if self._scrubbing:
+            self._scrubbing = False
+            self._project.pipeline.end_scrub()
 
         self._scrolling = False
 
@@ -825,7 +883,7 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         self.selection.setSelection([], SELECT)
         assets = self._project.assetsForUris(self.dropData)
         if not assets:
-            self._project.addUris(self.dropData)
+            self._project.addUris(self.dropData, priority=PRIORITY_TIMELINE)
             return False
         for asset in assets:
             if asset.is_image():
@@ -1225,7 +1283,8 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
             self.__on_separators = []
         self._setSeparatorsPrelight(True)
 
-        self.editing_context.edit_to(position, self._on_layer)
+        self.__edit_coalescer.push(self.editing_context.edit_to,
+                                   position, self._on_layer)
 
     def create_layer(self, priority):
         """Adds a new layer to the GES timeline."""
@@ -1245,6 +1304,8 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
 
     def dragEnd(self):
         if self.editing_context:
+            # Apply the latest position before ending the drag.
+            self.__edit_coalescer.flush()
             self._snapEndedCb()
 
             if self.__on_separators and self.__got_dragged and not self.__clickedHandle:
@@ -1310,15 +1371,16 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
                            proxy_uri)
                 return
 
-        layers = self.ges_timeline.get_layers()
-        for layer in layers:
-            for clip in layer.get_clips():
-                if unproxy:
-                    if clip.get_asset() == proxy:
-                        clip.set_asset(asset)
-                elif clip.get_asset() == proxy.get_proxy_target():
-                    clip.set_asset(proxy)
-        self._project.pipeline.commit_timeline()
+        with self._project.bulk_edit():
+            layers = self.ges_timeline.get_layers()
+            for layer in layers:
+                for clip in layer.get_clips():
+                    if unproxy:
+                        if clip.get_asset() == proxy:
+                            clip.set_asset(asset)
+                    elif clip.get_asset() == proxy.get_proxy_target():
+                        clip.set_asset(proxy)
+            self._project.pipeline.commit_timeline()
 
     def insertAssets(self, assets, position=None):
         """Creates clips out of the specified assets on the longest layer."""
@@ -1388,12 +1450,13 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
 
     def purgeAsset(self, asset_id):
         """Removes all instances of an asset from the timeline."""
-        layers = self.ges_timeline.get_layers()
-        for layer in layers:
-            for clip in layer.get_clips():
-                if asset_id == clip.get_id():
-                    layer.remove_clip(clip)
-        self._project.pipeline.commit_timeline()
+        with self._project.bulk_edit():
+            layers = self.ges_timeline.get_layers()
+            for layer in layers:
+                for clip in layer.get_clips():
+                    if asset_id == clip.get_id():
+                        layer.remove_clip(clip)
+            self._project.pipeline.commit_timeline()
 
     def scrollToPixel(self, x):
         if x > self.timeline.hadj.props.upper:
@@ -1423,6 +1486,7 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
         can_paste = bool(self.__copiedGroup)
         self.paste_action.set_enabled(can_paste)
         self.keyframe_action.set_enabled(selection_non_empty)
+        self.prerender_action.set_enabled(selection_non_empty)
         project_loaded = bool(self._project)
         self.backward_one_frame_action.set_enabled(project_loaded)
         self.forward_one_frame_action.set_enabled(project_loaded)
@@ -1556,6 +1620,12 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
         self.app.shortcuts.add("timeline.keyframe-selected-clips", ["k"],
                                _("Add keyframe to the keyframe curve of selected clip"))
 
+        self.prerender_action = Gio.SimpleAction.new("prerender-selected-clips", None)
+        self.prerender_action.connect("activate", self._prerender_selected_cb)
+        group.add_action(self.prerender_action)
+        self.app.shortcuts.add("timeline.prerender-selected-clips", ["<Primary><Shift>r"],
+                               _("Pre-render the selected clips in the background for a smooth playback"))
+
         navigation_group = Gio.SimpleActionGroup()
         self.timeline.layout.insert_action_group("navigation", navigation_group)
         self.toolbar.insert_action_group("navigation", navigation_group)
@@ -1630,7 +1700,7 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
 
     def _deleteSelected(self, unused_action, unused_parameter):
         if self.ges_timeline:
-            with Previewer.manager.paused():
+            with self._project.bulk_edit(), Previewer.manager.paused():
                 with self.app.action_log.started("delete clip",
                                                 finalizing_action=CommitTimelineFinalizingAction(self._project.pipeline),
                                                 toplevel=True):
@@ -1644,43 +1714,44 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
 
     def _delete_selected_and_shift(self, unused_action, unused_parameter):
         if self.ges_timeline:
-            with self.app.action_log.started("delete clip and shift",
-                                             finalizing_action=CommitTimelineFinalizingAction(self._project.pipeline),
-                                             toplevel=True):
-                start = []
-                end = []
-
-                # remove the clips and store their start/end positions
-                for clip in self.timeline.selection:
-                    if isinstance(clip, GES.TransitionClip):
-                        continue
-                    layer = clip.get_layer()
-                    start.append(clip.start)
-                    end.append(clip.start + clip.duration)
-                    layer.remove_clip(clip)
-
-                if start:
-                    start = min(start)
-                    end = max(end)
-                    found_overlapping = False
-
-                    # check if any other clips occur during that period
-                    for layer in self.ges_timeline.layers:
-                        for clip in layer.get_clips():
-                            clip_end = clip.start + clip.duration
-                            if clip_end > start and clip.start < end:
-                                found_overlapping = True
-                                break
-                        if found_overlapping:
-                            break
+            with self._project.bulk_edit():
+                with self.app.action_log.started("delete clip and shift",
+                                                 finalizing_action=CommitTimelineFinalizingAction(self._project.pipeline),
+                                                 toplevel=True):
+                    start = []
+                    end = []
+
+                    # remove the clips and store their start/end positions
+                    for clip in self.timeline.selection:
+                        if isinstance(clip, GES.TransitionClip):
+                            continue
+                        layer = clip.get_layer()
+                        start.append(clip.start)
+                        end.append(clip.start + clip.duration)
+                        layer.remove_clip(clip)
 
-                    if not found_overlapping:
-                        # now shift everything following cut time
-                        shift_by = end - start
+                    if start:
+                        start = min(start)
+                        end = max(end)
+                        found_overlapping = False
+
+                        # check if any other clips occur during that period
                         for layer in self.ges_timeline.layers:
                             for clip in layer.get_clips():
-                                if clip.start >= end:
-                                    clip.set_start(clip.start - shift_by)
+                                clip_end = clip.start + clip.duration
+                                if clip_end > start and clip.start < end:
+                                    found_overlapping = True
+                                    break
+                            if found_overlapping:
+                                break
+
+                        if not found_overlapping:
+                            # now shift everything following cut time
+                            shift_by = end - start
+                            for layer in self.ges_timeline.layers:
+                                for clip in layer.get_clips():
+                                    if clip.start >= end:
+                                        clip.set_start(clip.start - shift_by)
 
             self.timeline.selection.setSelection([], SELECT)
 
@@ -1701,6 +1772,14 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
         self.timeline.resetSelectionGroup()
         self.timeline.selection.setSelection([], SELECT)
 
+    def _prerender_selected_cb(self, unused_action, unused_parameter):
+        clips = list(self.timeline.selection)
+        if not clips or not self._project.preview_cache:
+            return
+        start = min(clip.props.start for clip in clips)
+        stop = max(clip.props.start + clip.props.duration for clip in clips)
+        self._project.preview_cache.mark(start, stop)
+
     def _group_selected_cb(self, unused_action, unused_parameter):
         if not self.ges_timeline:
             self.info("No timeline set yet?")
@@ -1738,13 +1817,14 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
             self.info("Nothing to paste.")
             return
 
-        with self.app.action_log.started("paste",
-                                         finalizing_action=CommitTimelineFinalizingAction(self._project.pipeline),
-                                         toplevel=True):
-            save = self.__copiedGroup.copy(True)
-            position = self._project.pipeline.getPosition()
-            self.__copiedGroup.paste(position)
-            self.__copiedGroup = save
+        with self._project.bulk_edit():
+            with self.app.action_log.started("paste",
+                                             finalizing_action=CommitTimelineFinalizingAction(self._project.pipeline),
+                                             toplevel=True):
+                save = self.__copiedGroup.copy(True)
+                position = self._project.pipeline.getPosition()
+                self.__copiedGroup.paste(position)
+                self.__copiedGroup = save
 
     def _alignSelectedCb(self, unused_action, unused_parameter):
         if not self.ges_timeline:
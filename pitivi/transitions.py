@@ -27,6 +27,7 @@ from gi.repository import Gtk
 from pitivi.configure import get_pixmap_dir
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import disconnectAllByFunc
+from pitivi.utils.misc import SearchIndex
 from pitivi.utils.ui import fix_infobar
 from pitivi.utils.ui import PADDING
 from pitivi.utils.ui import SPACING
@@ -65,6 +66,11 @@ class TransitionsListWidget(Gtk.Box, Loggable):
         self._current_transition_name = None
         self._current_tooltip_icon = None
 
+        self._search_index = SearchIndex()
+        # The IDs of the transitions matching the search entry, or None
+        # when all the transitions match.
+        self._search_matches = None
+
         # Searchbox
         self.searchbar = Gtk.Box()
         self.searchbar.set_orientation(Gtk.Orientation.HORIZONTAL)
@@ -247,7 +253,11 @@ class TransitionsListWidget(Gtk.Box, Loggable):
             self.border_scale.add_mark(
                 25000, Gtk.PositionType.BOTTOM, _("Smooth"))
 
-    def _searchEntryChangedCb(self, unused_entry):
+    def _searchEntryChangedCb(self, entry):
+        matches = self._search_index.search(entry.get_text())
+        if matches == self._search_matches:
+            return
+        self._search_matches = matches
         self.modelFilter.refilter()
 
     def _searchEntryIconClickedCb(self, entry, unused, unused_1):
@@ -259,6 +269,9 @@ class TransitionsListWidget(Gtk.Box, Loggable):
         """Loads the transitions types and icons into the storemodel."""
         for trans_asset in GES.list_assets(GES.BaseTransitionClip):
             trans_asset.icon = self._getIcon(trans_asset.get_id())
+            self._search_index.add(trans_asset.get_id(),
+                                   trans_asset.get_id(),
+                                   trans_asset.get_meta(GES.META_DESCRIPTION))
             self.storemodel.append([trans_asset,
                                     str(trans_asset.get_id()),
                                     str(trans_asset.get_meta(
@@ -359,6 +372,7 @@ class TransitionsListWidget(Gtk.Box, Loggable):
 
     def _setRowVisible(self, model, iter, unused_data):
         """Filters the icon view to show only the search results."""
-        text = self.searchEntry.get_text().lower()
-        return text in model.get_value(iter, COL_DESC_TEXT).lower() or\
-            text in model.get_value(iter, COL_NAME_TEXT).lower()
+        if self._search_matches is None:
+            return True
+        asset = model.get_value(iter, COL_TRANSITION_ASSET)
+        return asset.get_id() in self._search_matches
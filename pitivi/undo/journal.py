@@ -0,0 +1,899 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Journal of the operations committed in the undo/redo log."""
+import os
+
+from gi.repository import GES
+from gi.repository import GLib
+from gi.repository import GObject
+from gi.repository import Gst
+from gi.repository import GstController
+
+from pitivi.effects import PROPS_TO_IGNORE
+from pitivi.undo.project import AssetAddedIntention
+from pitivi.undo.project import AssetRemovedAction
+from pitivi.undo.timeline import child_property_name
+from pitivi.undo.timeline import ClipAdded
+from pitivi.undo.timeline import ClipRemoved
+from pitivi.undo.timeline import ControlSourceRemoveAction
+from pitivi.undo.timeline import ControlSourceSetAction
+from pitivi.undo.timeline import KeyframeAddedAction
+from pitivi.undo.timeline import KeyframeRemovedAction
+from pitivi.undo.timeline import LayerAdded
+from pitivi.undo.timeline import LayerMoved
+from pitivi.undo.timeline import LayerRemoved
+from pitivi.undo.timeline import TrackElementAdded
+from pitivi.undo.timeline import TrackElementPropertyChanged
+from pitivi.undo.timeline import TrackElementRemoved
+from pitivi.undo.undo import PropertyChangedAction
+from pitivi.undo.undo import UndoableActionStack
+from pitivi.utils.fileio import write_file_atomically
+from pitivi.utils.loggable import Loggable
+
+# The name of the structure identifying the full save the journal applies to.
+HEADER_NAME = "journal"
+
+# The types of the child props which can be written in the journal.
+SERIALIZABLE_TYPES = (GObject.TYPE_BOOLEAN, GObject.TYPE_INT, GObject.TYPE_UINT,
+                      GObject.TYPE_LONG, GObject.TYPE_ULONG, GObject.TYPE_INT64,
+                      GObject.TYPE_UINT64, GObject.TYPE_FLOAT,
+                      GObject.TYPE_DOUBLE, GObject.TYPE_STRING)
+
+
+def _base_fingerprint(path):
+    stat = os.stat(path)
+    return "%d:%d" % (stat.st_size, stat.st_mtime_ns)
+
+
+def _to_time(seconds):
+    return int(round(seconds * Gst.SECOND))
+
+
+def _get_layer(ges_timeline, priority):
+    for ges_layer in ges_timeline.get_layers():
+        if ges_layer.props.priority == priority:
+            return ges_layer
+    return None
+
+
+def _replay_add_layer(project, structure):
+    ges_layer = GES.Layer()
+    ges_layer.props.priority = structure["priority"]
+    ges_layer.props.auto_transition = structure["auto-transition"]
+    return project.ges_timeline.add_layer(ges_layer)
+
+
+def _replay_remove_layer(project, structure):
+    ges_layer = _get_layer(project.ges_timeline, structure["priority"])
+    if not ges_layer:
+        return False
+    return project.ges_timeline.remove_layer(ges_layer)
+
+
+def _replay_add_clip(project, structure):
+    ges_layer = _get_layer(project.ges_timeline, structure["layer-priority"])
+    if not ges_layer:
+        return False
+    extractable_type = GObject.type_from_name(structure["type"])
+    asset = project.get_asset(structure["asset-id"], extractable_type)
+    if not asset:
+        asset = GES.Asset.request(extractable_type, structure["asset-id"])
+    if not asset:
+        return False
+    ges_clip = ges_layer.add_asset(asset,
+                                   _to_time(structure["start"]),
+                                   _to_time(structure["inpoint"]),
+                                   _to_time(structure["duration"]),
+                                   GES.TrackType.UNKNOWN)
+    if not ges_clip:
+        return False
+    # The next changes refer to the clip by its original name.
+    return ges_clip.set_name(structure["name"])
+
+
+def _replay_remove_clip(project, structure):
+    ges_clip = project.ges_timeline.get_element(structure["name"])
+    if not ges_clip or not ges_clip.props.layer:
+        return False
+    return ges_clip.props.layer.remove_clip(ges_clip)
+
+
+def _replay_move_clip(project, structure):
+    ges_clip = project.ges_timeline.get_element(structure["name"])
+    ges_layer = _get_layer(project.ges_timeline, structure["layer-priority"])
+    if not ges_clip or not ges_layer:
+        return False
+    if ges_clip.props.layer != ges_layer and not ges_clip.move_to_layer(ges_layer):
+        return False
+    if ges_clip.get_name() == structure["new-name"]:
+        return True
+    return ges_clip.set_name(structure["new-name"])
+
+
+def _replay_name_child(project, structure):
+    ges_clip = project.ges_timeline.get_element(structure["container-name"])
+    if not ges_clip:
+        return False
+    for child in ges_clip.get_children(False):
+        if GObject.type_name(child) == structure["child-type"] and \
+                int(child.get_track_type()) == structure["track-type"]:
+            if child.get_name() == structure["child-name"]:
+                return True
+            # The next changes refer to the child by its original name.
+            return child.set_name(structure["child-name"])
+    return False
+
+
+def _replay_remove_child(project, structure):
+    ges_clip = project.ges_timeline.get_element(structure["container-name"])
+    if not ges_clip:
+        return False
+    for child in ges_clip.get_children(True):
+        if child.get_name() == structure["child-name"]:
+            return ges_clip.remove(child)
+    return False
+
+
+def _replay_add_effect(project, structure):
+    ges_clip = project.ges_timeline.get_element(structure["container-name"])
+    if not ges_clip:
+        return False
+    effect = GES.Effect.new(structure["asset-id"])
+    if not ges_clip.add(effect):
+        return False
+    # The next changes refer to the effect by its original name.
+    return effect.set_name(structure["child-name"])
+
+
+def _get_control_source(project, structure):
+    ges_element = project.ges_timeline.get_element(structure["element-name"])
+    if not ges_element:
+        return None
+    binding = ges_element.get_control_binding(structure["property-name"])
+    if not binding:
+        return None
+    return binding.props.control_source
+
+
+def _replay_add_keyframe(project, structure):
+    control_source = _get_control_source(project, structure)
+    if not control_source:
+        return False
+    return control_source.set(_to_time(structure["timestamp"]),
+                              structure["value"])
+
+
+def _replay_remove_keyframe(project, structure):
+    control_source = _get_control_source(project, structure)
+    if not control_source:
+        return False
+    return control_source.unset(_to_time(structure["timestamp"]))
+
+
+def _replay_set_control_source(project, structure):
+    ges_element = project.ges_timeline.get_element(structure["element-name"])
+    if not ges_element:
+        return False
+    control_source = GstController.InterpolationControlSource()
+    control_source.props.mode = GstController.InterpolationMode.LINEAR
+    return ges_element.set_control_source(control_source,
+                                          structure["property-name"],
+                                          structure["binding-type"])
+
+
+def _replay_remove_control_source(project, structure):
+    ges_element = project.ges_timeline.get_element(structure["element-name"])
+    if not ges_element:
+        return False
+    return ges_element.remove_control_binding(structure["property-name"])
+
+
+def _replay_move_layers(project, structure):
+    # All the layers are found before changing any priority, because
+    # several layers have the same priority while they are being moved.
+    moves = []
+    for move in structure["priorities"].split(","):
+        old_priority, priority = move.split(":")
+        ges_layer = _get_layer(project.ges_timeline, int(old_priority))
+        if not ges_layer:
+            return False
+        moves.append((ges_layer, int(priority)))
+    for ges_layer, priority in moves:
+        ges_layer.props.priority = priority
+    return True
+
+
+def _replay_set_property(project, structure):
+    ges_element = project.ges_timeline.get_element(structure["element-name"])
+    if not ges_element:
+        return False
+    ges_element.set_property(structure["property"], structure["value"])
+    return True
+
+
+def _replay_set_child_property(project, structure):
+    ges_element = project.ges_timeline.get_element(structure["element-name"])
+    if not ges_element:
+        return False
+    return ges_element.set_child_property(structure["property"],
+                                          structure["value"])
+
+
+def _replay_add_asset(project, structure):
+    extractable_type = GObject.type_from_name(structure["type"])
+    if project.get_asset(structure["id"], extractable_type):
+        return True
+    if extractable_type == GES.UriClip:
+        asset = GES.UriClipAsset.request_sync(structure["id"])
+    else:
+        asset = GES.Asset.request(extractable_type, structure["id"])
+    if not asset:
+        return False
+    return project.add_asset(asset)
+
+
+def _replay_remove_asset(project, structure):
+    extractable_type = GObject.type_from_name(structure["type"])
+    asset = project.get_asset(structure["id"], extractable_type)
+    if not asset:
+        return False
+    return project.remove_asset(asset)
+
+
+# The functions applying the journaled changes, by structure name.
+REPLAYERS = {
+    "add-layer": _replay_add_layer,
+    "remove-layer": _replay_remove_layer,
+    "move-layers": _replay_move_layers,
+    "add-clip": _replay_add_clip,
+    "remove-clip": _replay_remove_clip,
+    "move-clip": _replay_move_clip,
+    "name-child": _replay_name_child,
+    "container-add-child": _replay_add_effect,
+    "container-remove-child": _replay_remove_child,
+    "set-property": _replay_set_property,
+    "set-child-property": _replay_set_child_property,
+    "add-keyframe": _replay_add_keyframe,
+    "remove-keyframe": _replay_remove_keyframe,
+    "set-control-source": _replay_set_control_source,
+    "remove-control-source": _replay_remove_control_source,
+    "add-asset": _replay_add_asset,
+    "remove-asset": _replay_remove_asset,
+}
+
+
+def _structure(name, **fields):
+    structure = Gst.Structure.new_empty(name)
+    for field, value in fields.items():
+        structure.set_value(field.replace("_", "-"), value)
+    return structure
+
+
+def _to_seconds(timestamp):
+    return float(timestamp / Gst.SECOND)
+
+
+def _property_value(pspec, value):
+    """Gets the value of a prop as it can be written in the journal."""
+    if isinstance(value, (GObject.GEnum, GObject.GFlags)):
+        return int(value)
+    if value is None or \
+            GObject.type_fundamental(pspec.value_type) not in SERIALIZABLE_TYPES:
+        return None
+    # Keep the exact type, for example guint64 for the timestamps.
+    return GObject.Value(pspec.value_type, value)
+
+
+def _set_property_structure(ges_element, property_name, value):
+    pspec = ges_element.find_property(property_name)
+    if not pspec:
+        return None
+    value = _property_value(pspec, value)
+    if value is None:
+        return None
+    return _structure("set-property", element_name=ges_element.get_name(),
+                      property=property_name, value=value)
+
+
+def _keyframe_structure(adding, action_info, timestamp, value):
+    structure = Gst.Structure.new_empty("add-keyframe" if adding else "remove-keyframe")
+    for key, info in action_info.items():
+        structure.set_value(key, info)
+    structure.set_value("timestamp", _to_seconds(timestamp))
+    structure.set_value("value", value)
+    return structure
+
+
+def serialize_track_element(ges_track_element):
+    """Gets the structures restoring the state of a track element.
+
+    Args:
+        ges_track_element (GES.TrackElement): The element, already named.
+
+    Returns:
+        List[Gst.Structure]: The changes of the props and keyframes.
+    """
+    name = ges_track_element.get_name()
+    structures = []
+    if not ges_track_element.props.active:
+        structures.append(_structure("set-property", element_name=name,
+                                     property="active", value=False))
+
+    for pspec in ges_track_element.list_children_properties():
+        if not pspec.flags & GObject.ParamFlags.WRITABLE or \
+                pspec.flags & GObject.ParamFlags.CONSTRUCT_ONLY or \
+                pspec.name in PROPS_TO_IGNORE:
+            continue
+        property_name = child_property_name(pspec)
+        res, value = ges_track_element.get_child_property(property_name)
+        value = _property_value(pspec, value) if res else None
+        if value is not None:
+            structures.append(_structure("set-child-property", element_name=name,
+                                         property=property_name, value=value))
+
+    for property_name, binding in ges_track_element.get_all_control_bindings().items():
+        binding_type = "direct-absolute" if binding.props.absolute else "direct"
+        structures.append(_structure("set-control-source", element_name=name,
+                                     property_name=property_name,
+                                     binding_type=binding_type))
+        action_info = {"element-name": name, "property-name": property_name}
+        for keyframe in binding.props.control_source.get_all():
+            structures.append(_keyframe_structure(True, action_info,
+                                                  keyframe.timestamp,
+                                                  keyframe.value))
+    return structures
+
+
+def serialize_clip(ges_clip):
+    """Gets the structures recreating a clip with its current state.
+
+    Used for the clips which cannot be described by the changes which
+    created them, for example the clips created by splitting or restored
+    by undoing their removal.
+
+    Args:
+        ges_clip (GES.Clip): The clip, in a layer.
+
+    Returns:
+        List[Gst.Structure]: The clip, its effects and the state of its
+        children.
+    """
+    structures = [_structure("add-clip",
+                             name=ges_clip.get_name(),
+                             layer_priority=ges_clip.props.layer.props.priority,
+                             asset_id=ges_clip.get_asset().get_id(),
+                             type=GObject.type_name(ges_clip),
+                             start=_to_seconds(ges_clip.props.start),
+                             inpoint=_to_seconds(ges_clip.props.in_point),
+                             duration=_to_seconds(ges_clip.props.duration))]
+    for child in ges_clip.get_children(False):
+        if isinstance(child, GES.Effect):
+            structures.append(_structure("container-add-child",
+                                         container_name=ges_clip.get_name(),
+                                         child_name=child.get_name(),
+                                         asset_id=child.get_id(),
+                                         child_type=GObject.type_name(GES.Effect)))
+        else:
+            # The core children are created by GES when adding the clip.
+            structures.append(_structure("name-child",
+                                         container_name=ges_clip.get_name(),
+                                         child_name=child.get_name(),
+                                         child_type=GObject.type_name(child),
+                                         track_type=int(child.get_track_type())))
+        structures.extend(serialize_track_element(child))
+    return structures
+
+
+def _flatten(stack, undo):
+    """Gets the actions of an operation, in the order they are applied."""
+    actions = stack.done_actions
+    for action in reversed(actions) if undo else actions:
+        if isinstance(action, UndoableActionStack):
+            yield from _flatten(action, undo)
+        else:
+            yield action
+
+
+class StackSerializer(Loggable):
+    """Serializes an operation, or its undoing, as changes to be replayed.
+
+    Most actions are written as their scenario actions, or as the inverse
+    ones when undoing. The clips created by GES, such as the ones created
+    by splitting, and the elements restored when undoing a removal are
+    written with their entire state, read when the operation is done.
+
+    Args:
+        undo (bool): Whether the operation has been undone.
+
+    Attributes:
+        structures (List[Gst.Structure]): The changes.
+        unsupported (Optional[UndoableAction]): The action which cannot be
+            replayed, if any.
+    """
+
+    def __init__(self, undo=False):
+        Loggable.__init__(self)
+        self.undo = undo
+        self.structures = []
+        self.unsupported = None
+        # The names of the elements whose entire state has been written.
+        self.__covered = set()
+        # The clips and children added and removed by the same operation.
+        self.__skipped = set()
+        # The clips removed from a layer and added to another one.
+        self.__moved_clips = set()
+        # The "move-layers" change being gathered and the moved layers,
+        # mapped to their initial and final priorities.
+        self.__layers_moved = None
+        self.__layer_priorities = {}
+
+    def serialize(self, stack):
+        """Serializes the specified operation.
+
+        Args:
+            stack (UndoableActionStack): The operation.
+
+        Returns:
+            bool: Whether all its actions can be replayed.
+        """
+        actions = list(_flatten(stack, self.undo))
+        removed_clips = set()
+        for action in actions:
+            adding = self.__adds_clip(action)
+            if adding and action.clip in removed_clips:
+                self.__moved_clips.add(action.clip)
+            elif adding is False:
+                removed_clips.add(action.clip)
+
+        for action in actions:
+            if not isinstance(action, LayerMoved):
+                self.__finish_layer_moves()
+            try:
+                serialized = self.__serialize(action)
+            except NotImplementedError:
+                serialized = False
+            if not serialized:
+                self.unsupported = action
+                return False
+        self.__finish_layer_moves()
+        return True
+
+    def __adds_clip(self, action):
+        if isinstance(action, ClipAdded):
+            return not self.undo
+        if isinstance(action, ClipRemoved):
+            return self.undo
+        return None
+
+    def __append(self, structure):
+        if structure is None:
+            return False
+        self.structures.append(structure)
+        return True
+
+    def __append_state(self, structures):
+        for structure in structures:
+            for field in ("name", "child-name"):
+                if structure.has_field(field):
+                    self.__covered.add(structure.get_string(field))
+        self.structures.extend(structures)
+        return True
+
+    def __serialize(self, action):
+        adding = self.__adds_clip(action)
+        if adding is not None:
+            return self.__serialize_clip_change(action, adding)
+        if isinstance(action, (TrackElementAdded, TrackElementRemoved)):
+            adding = isinstance(action, TrackElementAdded) != self.undo
+            return self.__serialize_child_change(action, adding)
+        if isinstance(action, (LayerAdded, LayerRemoved)):
+            adding = isinstance(action, LayerAdded) != self.undo
+            return self.__serialize_layer_change(action.ges_layer, adding)
+        if isinstance(action, LayerMoved):
+            return self.__serialize_layer_move(action)
+        if isinstance(action, PropertyChangedAction):
+            return self.__serialize_property_change(action)
+        if isinstance(action, TrackElementPropertyChanged):
+            return self.__serialize_child_property_change(action)
+        if isinstance(action, (KeyframeAddedAction, KeyframeRemovedAction)):
+            if action.action_info["element-name"] in self.__covered:
+                return True
+            adding = isinstance(action, KeyframeAddedAction) != self.undo
+            return self.__append(_keyframe_structure(adding, action.action_info,
+                                                     action.keyframe.timestamp,
+                                                     action.keyframe.value))
+        if isinstance(action, (ControlSourceSetAction, ControlSourceRemoveAction)):
+            adding = isinstance(action, ControlSourceSetAction) != self.undo
+            return self.__serialize_control_source_change(action, adding)
+        if isinstance(action, (AssetAddedIntention, AssetRemovedAction)):
+            adding = isinstance(action, AssetAddedIntention) != self.undo
+            asset = action.asset
+            if not asset:
+                # The asset is still being loaded, or has never been added.
+                return not adding
+            return self.__append(_structure(
+                "add-asset" if adding else "remove-asset", id=asset.get_id(),
+                type=GObject.type_name(asset.get_extractable_type())))
+
+        if self.undo:
+            return False
+        structure = action.asScenarioAction()
+        if not structure or structure.get_name() not in REPLAYERS:
+            return False
+        return self.__append(structure)
+
+    def __serialize_clip_change(self, action, adding):
+        ges_clip = action.clip
+        name = ges_clip.get_name()
+        if ges_clip in self.__skipped or name in self.__covered:
+            return True
+
+        if ges_clip in self.__moved_clips:
+            if not adding or not ges_clip.props.layer:
+                return True
+            return self.__append(_structure(
+                "move-clip", name=action.previous_name or name, new_name=name,
+                layer_priority=ges_clip.props.layer.props.priority))
+
+        if adding:
+            if not ges_clip.props.layer:
+                # Removed later in the operation.
+                self.__skipped.add(ges_clip)
+                return True
+            return self.__append_state(serialize_clip(ges_clip))
+        return self.__append(_structure("remove-clip", name=name))
+
+    def __serialize_child_change(self, action, adding):
+        ges_track_element = action.track_element
+        if action.clip.get_name() in self.__covered or \
+                ges_track_element in self.__skipped:
+            return True
+
+        if not adding:
+            return self.__append(_structure(
+                "container-remove-child", container_name=action.clip.get_name(),
+                child_name=ges_track_element.get_name()))
+
+        if not isinstance(ges_track_element, GES.Effect):
+            # Only the effects are added by the user, the other children
+            # are created by GES.
+            return False
+        if ges_track_element.get_parent() != action.clip:
+            # Removed later in the operation.
+            self.__skipped.add(ges_track_element)
+            return True
+        structure = _structure("container-add-child",
+                               container_name=action.clip.get_name(),
+                               child_name=ges_track_element.get_name(),
+                               asset_id=ges_track_element.get_id(),
+                               child_type=GObject.type_name(GES.Effect))
+        structures = [structure] + serialize_track_element(ges_track_element)
+        return self.__append_state(structures)
+
+    def __serialize_layer_change(self, ges_layer, adding):
+        if not adding:
+            return self.__append(_structure("remove-layer",
+                                            priority=ges_layer.props.priority))
+
+        self.__append(_structure("add-layer", priority=ges_layer.props.priority,
+                                 auto_transition=ges_layer.props.auto_transition))
+        # The clips are restored with the layer when undoing its removal.
+        for ges_clip in ges_layer.get_clips():
+            if not isinstance(ges_clip, GES.TransitionClip) and \
+                    ges_clip.get_name() not in self.__covered:
+                self.__append_state(serialize_clip(ges_clip))
+        return True
+
+    def __serialize_layer_move(self, action):
+        if self.__layers_moved is None:
+            self.__layers_moved = Gst.Structure.new_empty("move-layers")
+            self.structures.append(self.__layers_moved)
+        if self.undo:
+            old_priority, priority = action.priority, action.old_priority
+        else:
+            old_priority, priority = action.old_priority, action.priority
+        initial_priority, unused = self.__layer_priorities.get(action.ges_layer,
+                                                               (old_priority, None))
+        self.__layer_priorities[action.ges_layer] = (initial_priority, priority)
+        return True
+
+    def __finish_layer_moves(self):
+        if self.__layers_moved is None:
+            return
+        moves = ["%d:%d" % priorities
+                 for priorities in self.__layer_priorities.values()
+                 if priorities[0] != priorities[1]]
+        if moves:
+            self.__layers_moved.set_value("priorities", ",".join(moves))
+        else:
+            self.structures.remove(self.__layers_moved)
+        self.__layers_moved = None
+        self.__layer_priorities = {}
+
+    def __serialize_property_change(self, action):
+        ges_element = action.auto_object
+        if not isinstance(ges_element, GES.TimelineElement):
+            return False
+        if ges_element.get_name() in self.__covered:
+            return True
+        value = action.old_value if self.undo else action.new_value
+        return self.__append(_set_property_structure(
+            ges_element, action.field_name.replace("_", "-"), value))
+
+    def __serialize_child_property_change(self, action):
+        ges_track_element = action.track_element
+        if ges_track_element.get_name() in self.__covered:
+            return True
+        value = action.old_value if self.undo else action.new_value
+        if isinstance(value, (GObject.GEnum, GObject.GFlags)):
+            value = int(value)
+        return self.__append(_structure("set-child-property",
+                                        element_name=ges_track_element.get_name(),
+                                        property=action.property_name,
+                                        value=value))
+
+    def __serialize_control_source_change(self, action, adding):
+        name = action.track_element.get_name()
+        if name in self.__covered:
+            return True
+        if not adding:
+            return self.__append(_structure("remove-control-source",
+                                            element_name=name,
+                                            property_name=action.property_name))
+
+        self.__append(_structure("set-control-source", element_name=name,
+                                 property_name=action.property_name,
+                                 binding_type=action.binding_type))
+        # The keyframes are restored with the control source when undoing
+        # its removal.
+        action_info = {"element-name": name, "property-name": action.property_name}
+        for keyframe in action.control_source.get_all():
+            self.__append(_keyframe_structure(True, action_info,
+                                              keyframe.timestamp, keyframe.value))
+        return True
+
+
+def load_journal(path):
+    """Reads the journaled changes, if they apply to an existing full save.
+
+    A line truncated by a crash while it was being written is ignored,
+    together with the lines following it.
+
+    Args:
+        path (str): The journal file.
+
+    Returns:
+        Optional[Tuple[str, List[Gst.Structure]]]: The path of the full save
+        and the changes to be replayed on top of it, or None if there are
+        no usable changes.
+    """
+    try:
+        with open(path, encoding="UTF-8") as journal_file:
+            lines = journal_file.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not lines:
+        return None
+
+    header = Gst.Structure.new_from_string(lines[0])
+    if not header or header.get_name() != HEADER_NAME:
+        return None
+    base_path = header.get_string("base-path")
+    try:
+        if _base_fingerprint(base_path) != header.get_string("base-fingerprint"):
+            # The full save has been replaced since.
+            return None
+    except (OSError, TypeError):
+        return None
+
+    structures = []
+    for line in lines[1:]:
+        structure = Gst.Structure.new_from_string(line)
+        if not structure:
+            break
+        structures.append(structure)
+    if not structures:
+        return None
+    return base_path, structures
+
+
+def replay_journal(project, structures):
+    """Applies the journaled changes on the project.
+
+    Args:
+        project (Project): The project loaded from the full save.
+        structures (List[Gst.Structure]): The changes, as returned by
+            `load_journal`.
+
+    Returns:
+        int: The number of changes applied. The replay stops at the first
+        change which cannot be applied.
+    """
+    replayed = 0
+    for structure in structures:
+        replayer = REPLAYERS.get(structure.get_name())
+        try:
+            res = replayer is not None and replayer(project, structure)
+        except (GLib.Error, KeyError, RuntimeError, TypeError) as e:
+            project.warning("Failed replaying %s: %s", structure.to_string(), e)
+            res = False
+        if not res:
+            project.warning("Stopping the replay at %s", structure.to_string())
+            break
+        replayed += 1
+    if replayed:
+        project.pipeline.commit_timeline()
+        # The restored timeline is shown right away.
+        project.pipeline.commit_scheduler.flush()
+    return replayed
+
+
+class EditJournal(GObject.Object, Loggable):
+    """Append-only journal of the operations committed in an action log.
+
+    The first line identifies the full save on top of which the operations
+    apply. Each committed, undone or redone operation is appended as the
+    changes to be replayed and synced to the disk right away, so after a
+    crash of the app the timeline can be restored by loading the full save
+    and replaying the journal, without having to serialize the entire
+    project after each change.
+
+    When an operation cannot be replayed, the journal stops growing until
+    it is rebased on a newer full save, and the "broken" signal is emitted
+    so a full save can be made right away.
+
+    Attributes:
+        path (str): The journal file.
+        action_log (UndoableActionLog): The log providing the operations.
+        broken (bool): Whether operations have been missed since the full
+            save the journal is based on.
+    """
+
+    __gsignals__ = {
+        "broken": (GObject.SIGNAL_RUN_LAST, None, ()),
+    }
+
+    def __init__(self, path, action_log):
+        GObject.Object.__init__(self)
+        Loggable.__init__(self)
+        self.path = path
+        self.action_log = action_log
+        self.broken = False
+
+        self.__header = None
+        self.__file = None
+        # The lines journaled since the full save in progress was started.
+        self.__pending_lines = None
+        self.__pending_broken = False
+
+        action_log.connect("commit", self.__commit_cb)
+        action_log.connect("move", self.__move_cb)
+
+    def checkpoint(self):
+        """Marks the state serialized by the full save being started."""
+        self.__pending_lines = []
+        self.__pending_broken = False
+
+    def rebase(self, base_path):
+        """Restarts the journal on top of the full save of the last checkpoint.
+
+        The operations committed after the checkpoint are kept.
+
+        Args:
+            base_path (str): The file where the full save has been written.
+
+        Returns:
+            bool: Whether the journal has been restarted.
+        """
+        if self.__pending_lines is None:
+            # The checkpoint has been made obsolete by a more recent one.
+            return False
+
+        lines = self.__pending_lines
+        self.broken = self.__pending_broken
+        self.__pending_lines = None
+        self.__close_file()
+        try:
+            header = Gst.Structure.new_empty(HEADER_NAME)
+            header.set_value("base-path", base_path)
+            header.set_value("base-fingerprint", _base_fingerprint(base_path))
+            self.__header = header.to_string()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.__append(lines)
+        except OSError as e:
+            self.warning("Failed rebasing journal %s: %s", self.path, e)
+            self.__header = None
+            self.broken = True
+            return False
+
+        self.debug("Journal %s rebased on %s", self.path, base_path)
+        return True
+
+    def close(self):
+        """Stops journaling the operations."""
+        self.action_log.disconnect_by_func(self.__commit_cb)
+        self.action_log.disconnect_by_func(self.__move_cb)
+        self.__close_file()
+
+    def remove(self):
+        """Stops journaling the operations and removes the journal file."""
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.warning("Failed removing journal %s: %s", self.path, e)
+
+    def __close_file(self):
+        if self.__file:
+            self.__file.close()
+            self.__file = None
+
+    def __append(self, lines):
+        if not lines:
+            return
+        if not self.__file:
+            # The journal file is created only when there is something to
+            # replay.
+            data = "\n".join([self.__header] + lines) + "\n"
+            write_file_atomically(self.path, data.encode("UTF-8"))
+            self.__file = open(self.path, "a", encoding="UTF-8")
+        else:
+            self.__file.write("\n".join(lines) + "\n")
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+    def __mark_broken(self, reason):
+        was_broken = self.broken
+        self.broken = True
+        self.__pending_broken = True
+        if not was_broken:
+            self.info("Journal %s stops until the next save: %s",
+                      self.path, reason)
+            self.emit("broken")
+
+    def __journal_stack(self, stack, undo):
+        serializer = StackSerializer(undo)
+        if not serializer.serialize(stack):
+            self.__mark_broken("cannot replay %s" % serializer.unsupported)
+            return
+        lines = [structure.to_string() for structure in serializer.structures]
+
+        if self.__pending_lines is not None and not self.__pending_broken:
+            self.__pending_lines.extend(lines)
+
+        if self.broken or not self.__header:
+            return
+        try:
+            self.__append(lines)
+        except OSError as e:
+            self.warning("Failed writing journal %s: %s", self.path, e)
+            self.broken = True
+
+    def __commit_cb(self, action_log, stack):
+        if action_log.is_in_transaction():
+            # The operation is journaled when the toplevel one is committed.
+            return
+        self.__journal_stack(stack, undo=False)
+
+    def __move_cb(self, action_log, stack):
+        # An undone operation is moved to the redo stacks.
+        undo = bool(action_log.redo_stacks) and action_log.redo_stacks[-1] is stack
+        self.__journal_stack(stack, undo)
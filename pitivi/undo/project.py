@@ -137,6 +137,12 @@ class ProjectObserver(MetaContainerObserver):
         self.timeline_observer = TimelineObserver(project.ges_timeline,
                                                   action_log)
 
+    def release(self):
+        self.meta_container.disconnect_by_func(self._assetAddedCb)
+        self.meta_container.disconnect_by_func(self._assetRemovedCb)
+        self.timeline_observer.release()
+        MetaContainerObserver.release(self)
+
     def _assetAddedCb(self, unused_project, asset):
         if not isinstance(asset, GES.UriClipAsset):
             return
@@ -16,13 +16,18 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
+import collections
+import time
+
 from gi.repository import GES
+from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import Gst
 from gi.repository import GstController
 
 from pitivi.effects import PROPS_TO_IGNORE
 from pitivi.undo.undo import Action
+from pitivi.undo.undo import ACTION_SIZE
 from pitivi.undo.undo import FinalizingAction
 from pitivi.undo.undo import GObjectObserver
 from pitivi.undo.undo import MetaContainerObserver
@@ -33,6 +38,12 @@ from pitivi.utils.loggable import Loggable
 
 TRANSITION_PROPS = ["border", "invert", "transition-type"]
 
+# The estimated memory kept alive by a removed timeline element, in bytes.
+REMOVED_ELEMENT_SIZE = 16 * 1024
+
+# The number of elements whose props are snapshotted in an idle callback.
+SNAPSHOTS_PER_IDLE = 50
+
 
 def child_property_name(pspec):
     return "%s::%s" % (pspec.owner_type.name, pspec.name)
@@ -69,6 +80,14 @@ class TrackElementPropertyChanged(UndoableAction):
         self.track_element.set_child_property(
             self.property_name, self.old_value)
 
+    def expand(self, action):
+        if not isinstance(action, TrackElementPropertyChanged) or \
+                self.track_element != action.track_element or \
+                self.property_name != action.property_name:
+            return False
+        self.new_value = action.new_value
+        return True
+
     def asScenarioAction(self):
         st = Gst.Structure.new_empty("set-child-property")
         st['element-name'] = self.track_element.get_name()
@@ -81,6 +100,71 @@ class TrackElementPropertyChanged(UndoableAction):
         return st
 
 
+class PendingSnapshots(Loggable):
+    """Takes the snapshots of the props of the observed elements when needed.
+
+    Reading all the props of all the elements when a project is loaded is
+    slow, and most of them never change. The snapshots are taken a few at a
+    time when the app is idle, and all the remaining ones are taken before
+    an operation is recorded, so the initial values are always available
+    when creating the UndoableActions.
+
+    Attributes:
+        action_log (UndoableActionLog): The action log whose operations
+            require the snapshots.
+    """
+
+    def __init__(self, action_log):
+        Loggable.__init__(self)
+        self.action_log = action_log
+        self.__observers = collections.OrderedDict()
+        self.__idle_id = 0
+
+        action_log.connect("begin", self.__begin_cb)
+
+    def __len__(self):
+        return len(self.__observers)
+
+    def add(self, observer):
+        """Schedules the snapshot of the props of the specified observer."""
+        self.__observers[observer] = None
+        if not self.__idle_id:
+            self.__idle_id = GLib.idle_add(self.__snapshot_some_cb,
+                                           priority=GLib.PRIORITY_LOW)
+
+    def discard(self, observer):
+        """Forgets the specified observer, if scheduled."""
+        self.__observers.pop(observer, None)
+
+    def flush(self):
+        """Takes all the scheduled snapshots."""
+        while self.__observers:
+            observer, unused = self.__observers.popitem(last=False)
+            observer.snapshot()
+
+    def release(self):
+        """Stops taking the snapshots."""
+        self.action_log.disconnect_by_func(self.__begin_cb)
+        if self.__idle_id:
+            GLib.source_remove(self.__idle_id)
+            self.__idle_id = 0
+        self.__observers.clear()
+
+    def __begin_cb(self, unused_action_log, unused_stack):
+        self.flush()
+
+    def __snapshot_some_cb(self):
+        for unused_i in range(SNAPSHOTS_PER_IDLE):
+            if not self.__observers:
+                break
+            observer, unused = self.__observers.popitem(last=False)
+            observer.snapshot()
+        if self.__observers:
+            return True
+        self.__idle_id = 0
+        return False
+
+
 class TimelineElementObserver(Loggable):
     """Monitors the props of an element and all its children.
 
@@ -88,26 +172,48 @@ class TimelineElementObserver(Loggable):
 
     Attributes:
         ges_timeline_element (GES.TimelineElement): The object to be monitored.
+
+    Args:
+        pending_snapshots (Optional[PendingSnapshots]): Where to schedule
+            the snapshot of the props, instead of taking it right away.
+            Not used when the element is observed during an operation.
     """
 
-    def __init__(self, ges_timeline_element, action_log):
+    def __init__(self, ges_timeline_element, action_log, pending_snapshots=None):
         Loggable.__init__(self)
         self.ges_timeline_element = ges_timeline_element
         self.action_log = action_log
+        self.pending_snapshots = pending_snapshots
+
+        self._properties = None
+        if pending_snapshots is None or action_log.is_in_transaction():
+            # The element might change in the current operation.
+            self.snapshot()
+        else:
+            pending_snapshots.add(self)
+
+        ges_timeline_element.connect('deep-notify', self._property_changed_cb)
+
+    def snapshot(self):
+        """Reads the current values of the props, unless already done."""
+        if self._properties is not None or not self.ges_timeline_element:
+            return
 
+        if self.pending_snapshots is not None:
+            self.pending_snapshots.discard(self)
         self._properties = {}
-        for prop in ges_timeline_element.list_children_properties():
+        for prop in self.ges_timeline_element.list_children_properties():
             if prop.name in PROPS_TO_IGNORE:
                 continue
 
             prop_name = child_property_name(prop)
-            res, value = ges_timeline_element.get_child_property(prop_name)
+            res, value = self.ges_timeline_element.get_child_property(prop_name)
             assert res, prop_name
             self._properties[prop_name] = value
 
-        ges_timeline_element.connect('deep-notify', self._property_changed_cb)
-
     def release(self):
+        if self.pending_snapshots is not None:
+            self.pending_snapshots.discard(self)
         self.ges_timeline_element.disconnect_by_func(self._property_changed_cb)
         self.ges_timeline_element = None
 
@@ -120,6 +226,12 @@ class TimelineElementObserver(Loggable):
             self.debug("Property %s controlled", prop_name)
             return
 
+        if self._properties is None:
+            # No operation has been started since the element is observed,
+            # so the change is not recorded anyway.
+            self.snapshot()
+            return
+
         old_value = self._properties[prop_name]
         res, new_value = ges_timeline_element.get_child_property(prop_name)
         assert res, prop_name
@@ -142,8 +254,9 @@ class TrackElementObserver(TimelineElementObserver):
         ges_track_element (GES.TrackElement): The object to be monitored.
     """
 
-    def __init__(self, ges_track_element, action_log):
-        TimelineElementObserver.__init__(self, ges_track_element, action_log)
+    def __init__(self, ges_track_element, action_log, pending_snapshots=None):
+        TimelineElementObserver.__init__(self, ges_track_element, action_log,
+                                         pending_snapshots)
         self.gobject_observer = GObjectObserver(ges_track_element, ("active",), action_log)
 
     def release(self):
@@ -175,6 +288,9 @@ class TrackElementAction(UndoableAction):
     def remove(self):
         self.clip.remove(self.track_element)
 
+    def estimate_size(self):
+        return ACTION_SIZE + REMOVED_ELEMENT_SIZE
+
 
 class TrackElementAdded(TrackElementAction):
 
@@ -190,6 +306,7 @@ class TrackElementAdded(TrackElementAction):
     def asScenarioAction(self):
         st = Gst.Structure.new_empty("container-add-child")
         st["container-name"] = self.clip.get_name()
+        st["child-name"] = self.track_element.get_name()
         st["asset-id"] = self.track_element.get_id()
         asset = self.track_element.get_asset()
         if asset:
@@ -273,8 +390,11 @@ class ClipAction(UndoableAction):
         UndoableAction.__init__(self)
         self.layer = layer
         self.clip = clip
+        # The name of the clip before it has been renamed by `add`.
+        self.previous_name = None
 
     def add(self):
+        self.previous_name = self.clip.get_name()
         self.clip.set_name(None)
         children = self.clip.get_children(False)
         self.layer.add_clip(self.clip)
@@ -291,6 +411,11 @@ class ClipAction(UndoableAction):
         self.layer.remove_clip(self.clip)
         self.layer.get_timeline().get_asset().pipeline.commit_timeline()
 
+    def estimate_size(self):
+        # The clip and its children are kept alive.
+        children = self.clip.get_children(True)
+        return ACTION_SIZE + REMOVED_ELEMENT_SIZE * (1 + len(children))
+
 
 class ClipAdded(ClipAction):
 
@@ -482,6 +607,9 @@ class LayerRemoved(UndoableAction):
     def __repr__(self):
         return "<LayerRemoved %s>" % self.ges_layer
 
+    def estimate_size(self):
+        return ACTION_SIZE + REMOVED_ELEMENT_SIZE
+
     def do(self):
         self.ges_timeline.remove_layer(self.ges_layer)
         self.ges_timeline.get_asset().pipeline.commit_timeline()
@@ -638,15 +766,18 @@ class LayerObserver(MetaContainerObserver, Loggable):
 
     Args:
         ges_layer (GES.Layer): The layer to observe.
+        pending_snapshots (Optional[PendingSnapshots]): Where to schedule
+            the snapshots of the props of the track elements.
 
     Attributes:
         action_log (UndoableActionLog): The action log where to report actions.
     """
 
-    def __init__(self, ges_layer, action_log):
+    def __init__(self, ges_layer, action_log, pending_snapshots=None):
         MetaContainerObserver.__init__(self, ges_layer, action_log)
         Loggable.__init__(self)
         self.action_log = action_log
+        self.pending_snapshots = pending_snapshots
         self.priority = ges_layer.props.priority
 
         self.keyframe_observers = {}
@@ -718,7 +849,8 @@ class LayerObserver(MetaContainerObserver, Loggable):
                               self._control_binding_removed_cb)
         if isinstance(track_element, GES.BaseEffect) or \
                 isinstance(track_element, GES.VideoSource):
-            observer = TrackElementObserver(track_element, self.action_log)
+            observer = TrackElementObserver(track_element, self.action_log,
+                                            self.pending_snapshots)
             self.track_element_observers[track_element] = observer
 
     def _disconnectFromTrackElement(self, track_element):
@@ -855,11 +987,15 @@ class TimelineObserver(Loggable):
         Loggable.__init__(self)
         self.ges_timeline = ges_timeline
         self.action_log = action_log
+        self.pending_snapshots = PendingSnapshots(action_log)
 
+        start = time.monotonic()
         self.layer_observers = {}
         self.group_observers = {}
         for ges_layer in ges_timeline.get_layers():
             self._connect_to_layer(ges_layer)
+        self.info("Observing the timeline took %.3fs, %d snapshots deferred",
+                  time.monotonic() - start, len(self.pending_snapshots))
 
         ges_timeline.connect("layer-added", self.__layer_added_cb)
         ges_timeline.connect("layer-removed", self.__layer_removed_cb)
@@ -871,13 +1007,22 @@ class TimelineObserver(Loggable):
         # We don't care about the group-removed signal because this greatly
         # simplifies the logic.
 
+    def release(self):
+        """Stops monitoring the timeline."""
+        self.ges_timeline.disconnect_by_func(self.__layer_added_cb)
+        self.ges_timeline.disconnect_by_func(self.__layer_removed_cb)
+        self.ges_timeline.disconnect_by_func(self.__group_added_cb)
+        # The snapshots are not needed anymore.
+        self.pending_snapshots.release()
+
     def __layer_added_cb(self, ges_timeline, ges_layer):
         action = LayerAdded(self.ges_timeline, ges_layer)
         self.action_log.push(action)
         self._connect_to_layer(ges_layer)
 
     def _connect_to_layer(self, ges_layer):
-        layer_observer = LayerObserver(ges_layer, self.action_log)
+        layer_observer = LayerObserver(ges_layer, self.action_log,
+                                       self.pending_snapshots)
         self.layer_observers[ges_layer] = layer_observer
 
     def __layer_removed_cb(self, ges_timeline, ges_layer):
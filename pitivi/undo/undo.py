@@ -18,11 +18,30 @@
 # Boston, MA 02110-1301, USA.
 """Undo/redo."""
 import contextlib
+import time
 
 from gi.repository import GObject
 
+from pitivi.settings import GlobalSettings
 from pitivi.utils.loggable import Loggable
 
+GlobalSettings.addConfigSection("undo")
+GlobalSettings.addConfigOption("undoMaxDepth",
+                               section="undo",
+                               key="max-depth",
+                               default=500)
+GlobalSettings.addConfigOption("undoMaxMemory",
+                               section="undo",
+                               key="max-memory-mb",
+                               default=64)
+
+# The estimated memory retained by an action, in bytes.
+ACTION_SIZE = 512
+
+# The max interval between two operations changing the same property
+# so they are undone together, in seconds.
+COALESCE_INTERVAL = 1.0
+
 
 class UndoError(Exception):
     """Base class for undo/redo exceptions."""
@@ -58,6 +77,14 @@ class UndoableAction(Action):
     def undo(self):
         raise NotImplementedError()
 
+    def estimate_size(self):
+        """Estimates the memory kept alive by the action.
+
+        Returns:
+            int: The number of bytes.
+        """
+        return ACTION_SIZE
+
     def expand(self, action):
         """Allows the action to expand by including the specified action.
 
@@ -129,6 +156,9 @@ class UndoableActionStack(UndoableAction):
         self.action_group_name = action_group_name
         self.done_actions = []
         self.finalizing_action = finalizing_action
+        self.generation = 0
+        self.size = 0
+        self.commit_time = 0
 
     def __repr__(self):
         return "%s: %s" % (self.action_group_name, self.done_actions)
@@ -158,11 +188,40 @@ class UndoableActionStack(UndoableAction):
             return
         self.finalizing_action.do()
 
+    def estimate_size(self):
+        return ACTION_SIZE + sum(action.estimate_size()
+                                 for action in self.done_actions)
+
+    def coalesce(self, stack):
+        """Includes the specified stack if it continues the last action.
+
+        Args:
+            stack (UndoableActionStack): The operation committed after
+                this one.
+
+        Returns:
+            bool: Whether the stack has been included.
+        """
+        if stack.action_group_name != self.action_group_name or \
+                len(stack.done_actions) != 1 or not self.done_actions:
+            return False
+        return self.done_actions[-1].expand(stack.done_actions[0])
+
 
 class UndoableActionLog(GObject.Object, Loggable):
     """The undo/redo manager.
 
     A separate instance should be created for each Project instance.
+
+    The oldest operations are forgotten when there are too many of them or
+    when they keep too much memory alive. An operation changing the same
+    property as the previous one shortly after it is merged into it.
+
+    Args:
+        max_depth (Optional[int]): The max number of operations which can
+            be undone, 0 for no limit.
+        max_memory (Optional[int]): The max memory estimated to be kept by
+            the operations, in bytes, 0 for no limit.
     """
 
     __gsignals__ = {
@@ -174,14 +233,22 @@ class UndoableActionLog(GObject.Object, Loggable):
         "move": (GObject.SIGNAL_RUN_LAST, None, (object,)),
     }
 
-    def __init__(self):
+    def __init__(self, max_depth=0, max_memory=0):
         GObject.Object.__init__(self)
         Loggable.__init__(self)
 
+        self.max_depth = max_depth
+        self.max_memory = max_memory
         self.undo_stacks = []
         self.redo_stacks = []
         self.stacks = []
         self.running = False
+        # The estimated memory kept by the undo and redo stacks.
+        self.size = 0
+        # Identifies the content of the committed stacks, see `dirty`.
+        self.__generation = 0
+        # The generation of the last forgotten stack, see `_takeSnapshot`.
+        self.__forgotten_generation = 0
         self._checkpoint = self._takeSnapshot()
 
     @contextlib.contextmanager
@@ -284,19 +351,63 @@ class UndoableActionLog(GObject.Object, Loggable):
         if not stack.done_actions:
             self.debug("Ignore empty stack %s", stack.action_group_name)
             return
+        # An operation made after an undo is not coalesced into the
+        # operation before it.
+        can_coalesce = not self.redo_stacks
+        if self.redo_stacks:
+            # Forget the redo stacks first, so the memory they kept alive
+            # is not counted when enforcing max_memory.
+            self.size -= sum(redo_stack.size for redo_stack in self.redo_stacks)
+            self.redo_stacks = []
+
         if not self.stacks:
-            self.undo_stacks.append(stack)
+            self.__push_undo_stack(stack, can_coalesce)
             stack.finish_operation()
         else:
             self.stacks[-1].push(stack)
 
-        if self.redo_stacks:
-            self.redo_stacks = []
-
         self.debug("commit action group %s nested %s",
                    stack.action_group_name, len(self.stacks))
         self.emit("commit", stack)
 
+    def __push_undo_stack(self, stack, can_coalesce):
+        self.__generation += 1
+        now = time.monotonic()
+        if self.undo_stacks and can_coalesce:
+            last_stack = self.undo_stacks[-1]
+            if now - last_stack.commit_time < COALESCE_INTERVAL and \
+                    last_stack.coalesce(stack):
+                self.debug("Coalesced %s", stack.action_group_name)
+                last_stack.generation = self.__generation
+                last_stack.commit_time = now
+                if self.max_memory:
+                    size = last_stack.estimate_size()
+                    self.size += size - last_stack.size
+                    last_stack.size = size
+                    self.__forget_old_stacks()
+                return
+
+        stack.generation = self.__generation
+        stack.commit_time = now
+        if self.max_memory:
+            stack.size = stack.estimate_size()
+        self.undo_stacks.append(stack)
+        self.size += stack.size
+        self.__forget_old_stacks()
+
+    def __forget_old_stacks(self):
+        # The last operation is always kept.
+        while len(self.undo_stacks) > 1:
+            depth_exceeded = self.max_depth and \
+                len(self.undo_stacks) > self.max_depth
+            memory_exceeded = self.max_memory and self.size > self.max_memory
+            if not depth_exceeded and not memory_exceeded:
+                break
+            stack = self.undo_stacks.pop(0)
+            self.size -= stack.size
+            self.__forgotten_generation = stack.generation
+            self.debug("Forgot %s", stack.action_group_name)
+
     def undo(self):
         """Undoes the last recorded operation."""
         if self.stacks:
@@ -324,7 +435,12 @@ class UndoableActionLog(GObject.Object, Loggable):
         self.emit("move", stack)
 
     def _takeSnapshot(self):
-        return list(self.undo_stacks)
+        # Each committed stack gets a new generation, so the last one
+        # identifies the entire undo history. When all the stacks are
+        # undone, the forgotten ones still changed the initial content.
+        if not self.undo_stacks:
+            return self.__forgotten_generation
+        return self.undo_stacks[-1].generation
 
     def checkpoint(self):
         if self.stacks:
@@ -333,8 +449,8 @@ class UndoableActionLog(GObject.Object, Loggable):
         self._checkpoint = self._takeSnapshot()
 
     def dirty(self):
-        current_snapshot = self._takeSnapshot()
-        return current_snapshot != self._checkpoint
+        """Gets whether the undo history changed since the checkpoint."""
+        return self._takeSnapshot() != self._checkpoint
 
     def _run(self, operation):
         self.running = True
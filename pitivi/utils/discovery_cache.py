@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Persistent cache of the discovery info of media files."""
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+
+from gi.repository import GES
+from gi.repository import GLib
+from gi.repository import GObject
+from gi.repository import GstPbutils
+
+from pitivi.settings import get_dir
+from pitivi.settings import xdg_cache_home
+from pitivi.utils.fileio import prune_cache_dir
+from pitivi.utils.loggable import Loggable
+from pitivi.utils.misc import path_from_uri
+
+# Bump this when the format of the cache files changes.
+CACHE_VERSION = 1
+
+# The max total size of the cached info files, in bytes.
+MAX_CACHE_SIZE = 64 * 1024 ** 2
+
+# The max number of seconds since a cached info has been used.
+MAX_ENTRY_AGE = 90 * 24 * 3600
+
+# How many info files are written between two prunings of the cache dir.
+PRUNE_INTERVAL = 100
+
+
+class DiscoveryCache(Loggable):
+    """Stores the serialized discovery info of the media files on disk.
+
+    The info of a file is reused as long as the file's fingerprint, made of
+    its URI, size and modification time, does not change.
+
+    The info files are written by a separate thread. The least recently
+    used ones are removed when the cache grows too big or when they have
+    not been used for a long time.
+
+    Attributes:
+        cache_dir (str): The directory where the info files are kept.
+        installed (bool): Whether GES reuses the serialized info when
+            discovering files.
+        hits (int): How many lookups found a usable info.
+        misses (int): How many lookups did not find a usable info.
+        max_size (int): The max total size of the info files, in bytes.
+        max_age (int): The max number of seconds since an info has been used.
+    """
+
+    def __init__(self, cache_dir=None, max_size=MAX_CACHE_SIZE,
+                 max_age=MAX_ENTRY_AGE):
+        Loggable.__init__(self)
+        if cache_dir is None:
+            cache_dir = os.path.join(xdg_cache_home(), "discovery")
+        self.cache_dir = get_dir(cache_dir)
+        self.installed = False
+        self.hits = 0
+        self.misses = 0
+        self.max_size = max_size
+        self.max_age = max_age
+
+        self.__infos = queue.Queue()
+        self.__writer = None
+        # The number of info files written since the last pruning. The
+        # cache dir is pruned once the first info is written.
+        self.__written = PRUNE_INTERVAL
+
+    def install(self):
+        """Makes GES reuse the cached info when discovering files.
+
+        When GES provides `GES.DiscovererManager`, the info is loaded from
+        this cache. Older versions of GES keep their discoverers private,
+        so instead the discoverers are switched to the serialized info
+        cache of GstDiscoverer when they start discovering their first
+        file, if GstDiscoverer has one. In both cases the info of the
+        project assets is also stored in this cache, which is used for
+        example by the file previewer.
+
+        Returns:
+            bool: Whether GES reuses the serialized info.
+        """
+        manager_class = getattr(GES, "DiscovererManager", None)
+        if manager_class is not None:
+            manager = manager_class.get_default()
+            manager.connect("load-serialized-info", self.__load_serialized_info_cb)
+            manager.connect("discovered", self.__discovered_cb)
+            self.installed = True
+            return True
+
+        if not hasattr(GstPbutils.Discoverer.props, "use_cache"):
+            self.info("GES cannot load serialized discovery info,"
+                      " the files will be discovered by GES")
+            return False
+
+        GObject.add_emission_hook(GstPbutils.Discoverer, "source-setup",
+                                  self.__source_setup_hook)
+        self.installed = True
+        return True
+
+    def __source_setup_hook(self, discoverer, unused_source):
+        if not discoverer.props.use_cache:
+            self.debug("Reusing the serialized info in %s", discoverer)
+            discoverer.props.use_cache = True
+        # Keep the hook for the discoverers created later.
+        return True
+
+    def __load_serialized_info_cb(self, unused_manager, uri):
+        return self.lookup(uri)
+
+    def __discovered_cb(self, unused_manager, info, error):
+        if not error:
+            self.store(info)
+
+    @staticmethod
+    def fingerprint(uri):
+        """Computes the key identifying the current version of the file.
+
+        Returns:
+            Optional[str]: The fingerprint, or None if the file is not usable.
+        """
+        try:
+            stat = os.stat(path_from_uri(uri))
+        except (AssertionError, OSError):
+            return None
+        key = "%d:%s:%d:%d" % (CACHE_VERSION, uri, stat.st_size,
+                               stat.st_mtime_ns)
+        return hashlib.sha256(key.encode("UTF-8")).hexdigest()
+
+    def _path(self, fingerprint):
+        return os.path.join(self.cache_dir, fingerprint)
+
+    def lookup(self, uri):
+        """Gets the cached info of the file, if the file did not change.
+
+        Returns:
+            Optional[GstPbutils.DiscovererInfo]: The info of the file.
+        """
+        fingerprint = self.fingerprint(uri)
+        if not fingerprint:
+            return None
+
+        try:
+            with open(self._path(fingerprint), "rb") as file:
+                type_string = file.readline().decode("ASCII").strip()
+                data = file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except OSError as e:
+            self.warning("Failed reading cached info of %s: %s", uri, e)
+            self.misses += 1
+            return None
+
+        try:
+            variant = GLib.Variant.new_from_bytes(GLib.VariantType.new(type_string),
+                                                  GLib.Bytes.new(data), False)
+            info = GstPbutils.DiscovererInfo.from_variant(variant)
+        except (GLib.Error, TypeError, ValueError) as e:
+            self.warning("Discarding corrupt cached info of %s: %s", uri, e)
+            info = None
+        if info is None:
+            self.forget(uri)
+            self.misses += 1
+            return None
+
+        try:
+            # Mark the info as recently used, so it's pruned last.
+            os.utime(self._path(fingerprint))
+        except OSError:
+            pass
+        self.hits += 1
+        self.log("Using cached info of %s", uri)
+        return info
+
+    def store(self, info):
+        """Saves the specified info of a file, unless already cached.
+
+        The info is written by a separate thread, see `flush`.
+        """
+        if info.get_result() != GstPbutils.DiscovererResult.OK:
+            return
+        self.__infos.put(info)
+        if not self.__writer:
+            self.__writer = threading.Thread(target=self.__write_infos,
+                                             name="discovery-cache",
+                                             daemon=True)
+            self.__writer.start()
+
+    def flush(self):
+        """Waits until the info files being stored are written."""
+        self.__infos.join()
+
+    def prune(self):
+        """Removes the least recently used info files which are too many.
+
+        Returns:
+            List[str]: The paths of the removed files.
+        """
+        removed = prune_cache_dir(self.cache_dir, max_size=self.max_size,
+                                  max_age=self.max_age)
+        if removed:
+            self.debug("Pruned %d cached infos", len(removed))
+        return removed
+
+    def __write_infos(self):
+        while True:
+            info = self.__infos.get()
+            try:
+                self._write(info)
+                if self.__written >= PRUNE_INTERVAL:
+                    self.__written = 0
+                    self.prune()
+            finally:
+                self.__infos.task_done()
+
+    def _write(self, info):
+        uri = info.get_uri()
+        fingerprint = self.fingerprint(uri)
+        if not fingerprint:
+            return
+        path = self._path(fingerprint)
+        if os.path.exists(path):
+            # Already cached and the file did not change since.
+            return
+
+        variant = info.to_variant(GstPbutils.DiscovererSerializeFlags.ALL)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(variant.get_type_string().encode("ASCII") + b"\n")
+                file.write(variant.get_data_as_bytes().get_data())
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.warning("Failed caching the info of %s: %s", uri, e)
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+        self.__written += 1
+        self.log("Cached the info of %s", uri)
+
+    def forget(self, uri):
+        """Removes the cached info of the file, if any."""
+        fingerprint = self.fingerprint(uri)
+        if not fingerprint:
+            return
+        try:
+            os.unlink(self._path(fingerprint))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Scheduling of the discovery of the assets added to a project."""
+import heapq
+import itertools
+
+from gi.repository import GES
+from gi.repository import GObject
+
+from pitivi.settings import GlobalSettings
+from pitivi.utils.loggable import Loggable
+
+GlobalSettings.addConfigSection("discovery")
+GlobalSettings.addConfigOption("numDiscoveryJobs",
+                               section="discovery",
+                               key="num-discovery-jobs",
+                               default=4)
+
+# The priorities of the discovery jobs, lower is more urgent.
+PRIORITY_TIMELINE = 0
+PRIORITY_LIBRARY = 1
+PRIORITY_DEFAULT = 2
+
+
+class DiscoveryScheduler(GObject.Object, Loggable):
+    """Limits the number of assets being discovered at the same time.
+
+    The assets are created in the project in the order of their priority,
+    at most `width` at a time, so a large import does not overload a slow
+    disk. The files dropped on the timeline are discovered first, then the
+    files imported in the media library.
+
+    Attributes:
+        project (Project): The project where the assets are added.
+        width (int): The max number of assets discovered at the same time.
+        total (int): The number of assets scheduled in the current batch.
+        discovered (int): The number of assets of the current batch which
+            have been discovered.
+
+    Signals:
+        progress: The discovery of an asset finished. The arguments are the
+            numbers of discovered and of scheduled assets.
+    """
+
+    __gsignals__ = {
+        "progress": (GObject.SIGNAL_RUN_LAST, None, (int, int)),
+    }
+
+    def __init__(self, project, width):
+        GObject.Object.__init__(self)
+        Loggable.__init__(self)
+
+        self.project = project
+        self.width = width
+        self.total = 0
+        self.discovered = 0
+
+        # Heap of (priority, sequence number, uri) tuples. The entries whose
+        # priority does not match the one in __priorities are stale.
+        self.__queue = []
+        self.__priorities = {}
+        self.__sequence = itertools.count()
+        # The URIs being discovered.
+        self.__running = set()
+        self.__starting = False
+
+        project.connect("asset-added", self.__asset_added_cb)
+        project.connect("error-loading-asset", self.__error_loading_asset_cb)
+
+    @property
+    def pending(self):
+        """Whether some of the scheduled assets are not discovered yet."""
+        return bool(self.__priorities or self.__running)
+
+    def add(self, uri, priority=PRIORITY_DEFAULT):
+        """Schedules the creation of the asset for the specified URI.
+
+        Args:
+            uri (str): The quoted URI of the file.
+            priority (int): How urgent the discovery is.
+
+        Returns:
+            bool: Whether the asset has been scheduled, False if it is
+            already scheduled or part of the project.
+        """
+        if uri in self.__running:
+            return False
+        if uri in self.__priorities:
+            self.prioritize([uri], priority)
+            return False
+        if self.project.get_asset(uri, GES.UriClip):
+            return False
+
+        self.total += 1
+        self.__push(uri, priority)
+        self.__start_next()
+        return True
+
+    def prioritize(self, uris, priority=PRIORITY_TIMELINE):
+        """Moves the specified scheduled URIs ahead in the queue."""
+        for uri in uris:
+            if self.__priorities.get(uri, priority) > priority:
+                self.__push(uri, priority)
+
+    def cancel(self):
+        """Forgets the assets whose discovery did not start yet."""
+        self.total -= len(self.__priorities)
+        self.__queue = []
+        self.__priorities = {}
+        self.__check_done()
+
+    def release(self):
+        """Stops scheduling discoveries, for example when the project closes.
+
+        The discoveries already started are finished by GES, but no new
+        asset is created in the project.
+        """
+        self.cancel()
+        self.__running.clear()
+        self.__check_done()
+        self.project.disconnect_by_func(self.__asset_added_cb)
+        self.project.disconnect_by_func(self.__error_loading_asset_cb)
+
+    def __push(self, uri, priority):
+        self.__priorities[uri] = priority
+        heapq.heappush(self.__queue, (priority, next(self.__sequence), uri))
+
+    def __start_next(self):
+        if self.__starting:
+            # Already in the loop below, for example when create_asset
+            # finished synchronously.
+            return
+        self.__starting = True
+        try:
+            while len(self.__running) < max(1, self.width) and self.__queue:
+                priority, unused_sequence, uri = heapq.heappop(self.__queue)
+                if self.__priorities.get(uri) != priority:
+                    continue
+                del self.__priorities[uri]
+                self.__start(uri)
+        finally:
+            self.__starting = False
+
+    def __start(self, uri):
+        self.debug("Discovering %s", uri)
+        self.__running.add(uri)
+        if not self.project.create_asset(uri, GES.UriClip):
+            # The asset was already part of the project.
+            self.__done(uri)
+
+    def __asset_added_cb(self, unused_project, asset):
+        self.__done(asset.get_id())
+
+    def __error_loading_asset_cb(self, unused_project, unused_error, asset_id,
+                                 unused_type):
+        self.__done(asset_id)
+
+    def __done(self, uri):
+        if uri not in self.__running:
+            return
+        self.__running.remove(uri)
+        self.discovered += 1
+        self.emit("progress", self.discovered, self.total)
+        self.__check_done()
+        self.__start_next()
+
+    def __check_done(self):
+        if not self.pending:
+            self.total = 0
+            self.discovered = 0
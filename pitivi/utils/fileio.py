@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""File helpers usable without a display, by the headless commands too."""
+import os
+import tempfile
+import time
+
+
+def write_file_atomically(path, data):
+    """Replaces the contents of the specified file in a crash-safe way.
+
+    The data is written to a temporary file in the same directory, synced
+    to the disk and then renamed over the file, so the file contains either
+    the old or the new data, never a mix.
+
+    Args:
+        path (str): The path of the file to write.
+        data (bytes): The new contents of the file.
+    """
+    temp_path = create_temp_file(path)
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        replace_file_atomically(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def create_temp_file(path):
+    """Creates an empty file for replacing the specified file.
+
+    Args:
+        path (str): The path of the file to be replaced.
+
+    Returns:
+        str: The path of the new file, in the same directory.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                     suffix=".part",
+                                     prefix="." + os.path.basename(path))
+    os.close(fd)
+    return temp_path
+
+
+def replace_file_atomically(temp_path, path):
+    """Renames a fully written file over the specified file.
+
+    The new file is synced to the disk before being renamed and gets the
+    permissions of the replaced file.
+
+    Args:
+        temp_path (str): The new file, created with `create_temp_file`.
+        path (str): The path of the file to be replaced.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        mode = 0o644
+    fd = os.open(temp_path, os.O_RDONLY)
+    try:
+        os.fchmod(fd, mode & 0o777)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(temp_path, path)
+
+    # Make sure the rename itself reaches the disk.
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def prune_cache_dir(cache_dir, max_size, max_age, keep=()):
+    """Removes the old files until the cache dir is small enough.
+
+    The files are considered used when they have been modified last, so
+    the files still in use should be touched regularly.
+
+    Args:
+        cache_dir (str): The dir containing the cached files.
+        max_size (int): The max total size of the files, in bytes.
+        max_age (int): The max number of seconds since a file has been used.
+        keep (Iterable[str]): The paths of the files in use, which are kept
+            even if they are too many.
+
+    Returns:
+        List[str]: The paths of the removed files.
+    """
+    files = []
+    try:
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return []
+
+    keep = set(keep)
+    total_size = sum(size for unused_mtime, size, unused_path in files)
+    oldest = time.time() - max_age
+    removed = []
+    # The least recently used first.
+    for mtime, size, path in sorted(files):
+        if path in keep:
+            continue
+        if mtime >= oldest and total_size <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total_size -= size
+        removed.append(path)
+    return removed
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Cache of the composited frames around the playhead."""
+import collections
+import os
+import sys
+import tempfile
+
+import cairo
+from gi.repository import GES
+from gi.repository import GLib
+from gi.repository import Gst
+
+from pitivi.settings import GlobalSettings
+from pitivi.utils.loggable import Loggable
+
+GlobalSettings.addConfigSection("frame-cache")
+GlobalSettings.addConfigOption("frameCacheSize",
+                               section="frame-cache",
+                               key="size",
+                               default=256,
+                               notify=True)
+GlobalSettings.addConfigOption("frameCachePrefetch",
+                               section="frame-cache",
+                               key="prefetch",
+                               default=12)
+
+# The max width of the cached frames, to limit the memory they take.
+MAX_FRAME_WIDTH = 960
+
+# How long to wait after the playhead stopped before prefetching, in ms.
+PREFETCH_DELAY_MS = 200
+
+# How long to wait after the last edit before snapshotting the timeline
+# again, in ms. Each commit reschedules the prefetch, so no snapshot is
+# made while the edits keep arriving.
+SNAPSHOT_DELAY_MS = 1000
+
+# The format with the same memory layout as cairo.FORMAT_RGB24.
+FRAME_FORMAT = "BGRx" if sys.byteorder == "little" else "xRGB"
+
+
+def frame_index(position, framerate):
+    """Gets the index of the frame displayed at the specified position."""
+    return int(position * framerate.num / (Gst.SECOND * framerate.denom))
+
+
+def frame_position(frame, framerate):
+    """Gets the position in the middle of the specified frame.
+
+    The same position is used by `Pipeline.stepFrame`.
+    """
+    frame_duration = Gst.SECOND * framerate.denom / framerate.num
+    return int(frame * frame_duration + frame_duration / 2)
+
+
+def prefetch_order(center, count):
+    """Gets the frames around the center, the nearest first.
+
+    Twice more frames are taken after the center than before it, since
+    the playhead most often moves forward.
+
+    Args:
+        center (int): The frame at the playhead.
+        count (int): The number of frames to be taken after the center.
+
+    Returns:
+        List[int]: The frames, including the center.
+    """
+    frames = [center]
+    behind = count // 2
+    for offset in range(1, count + 1):
+        frames.append(center + offset)
+        if offset <= behind:
+            frames.append(center - offset)
+    return [frame for frame in frames if frame >= 0]
+
+
+def surface_from_sample(sample):
+    """Copies the frame of the specified sample in a cairo surface.
+
+    Args:
+        sample (Gst.Sample): A sample in the `FRAME_FORMAT` format.
+
+    Returns:
+        Optional[cairo.ImageSurface]: The frame, or None if it's unusable.
+    """
+    structure = sample.get_caps().get_structure(0)
+    width = structure.get_value("width")
+    height = structure.get_value("height")
+    buffer = sample.get_buffer()
+    res, map_info = buffer.map(Gst.MapFlags.READ)
+    if not res:
+        return None
+    try:
+        data = bytearray(map_info.data)
+    finally:
+        buffer.unmap(map_info)
+
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_RGB24, width)
+    if len(data) < stride * height:
+        return None
+    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_RGB24,
+                                              width, height, stride)
+
+
+def get_video_caps(ges_timeline):
+    """Gets the width, height and framerate of the timeline's video.
+
+    Returns:
+        Optional[Tuple[int, int, Gst.Fraction]]: The video format, or None if
+        the timeline has no video track with complete restriction caps.
+    """
+    for track in ges_timeline.get_tracks():
+        if not isinstance(track, GES.VideoTrack):
+            continue
+        caps = track.props.restriction_caps
+        if not caps or caps.is_empty():
+            continue
+        structure = caps.get_structure(0)
+        res_width, width = structure.get_int("width")
+        res_height, height = structure.get_int("height")
+        res_rate, num, denom = structure.get_fraction("framerate")
+        if res_width and res_height and res_rate and num and denom:
+            return width, height, Gst.Fraction(num, denom)
+    return None
+
+
+class FrameCache(Loggable):
+    """Bounded LRU cache of the frames displayed by the viewer.
+
+    The frames are identified by their index at the cache's framerate and
+    by the generation of the timeline when they have been composited. The
+    generation is increased by `invalidate` each time the timeline is
+    committed, which makes all the cached frames obsolete.
+
+    Attributes:
+        max_bytes (int): The max size of the cached frames.
+        generation (int): The current generation of the timeline.
+        framerate (Optional[Gst.Fraction]): The framerate of the frames.
+        size (int): The size of the cached frames, in bytes.
+        hits (int): How many lookups found the frame.
+        misses (int): How many lookups did not find the frame.
+    """
+
+    def __init__(self, max_bytes):
+        Loggable.__init__(self)
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.framerate = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # Maps frame indexes to (surface, size) tuples, least recent first.
+        self.__frames = collections.OrderedDict()
+
+    def __contains__(self, frame):
+        return frame in self.__frames
+
+    def __len__(self):
+        return len(self.__frames)
+
+    def invalidate(self):
+        """Forgets all the frames, as the timeline changed."""
+        self.generation += 1
+        self.__clear()
+
+    def set_framerate(self, framerate):
+        """Sets the framerate, forgetting the frames if it changed."""
+        if self.framerate is not None and framerate is not None and \
+                self.framerate == framerate:
+            return
+        self.framerate = framerate
+        self.__clear()
+
+    def set_max_bytes(self, max_bytes):
+        """Changes the max size of the cache, evicting frames if needed."""
+        self.max_bytes = max_bytes
+        self.__evict()
+
+    def __clear(self):
+        self.__frames.clear()
+        self.size = 0
+
+    def __evict(self):
+        while self.__frames and self.size > self.max_bytes:
+            unused_frame, (unused_surface, size) = self.__frames.popitem(last=False)
+            self.size -= size
+
+    def add(self, generation, frame, surface):
+        """Caches a frame, unless it has been composited for an old timeline.
+
+        Args:
+            generation (int): The generation when the frame has been composited.
+            frame (int): The index of the frame.
+            surface (cairo.ImageSurface): The frame.
+
+        Returns:
+            bool: Whether the frame has been cached.
+        """
+        if generation != self.generation or self.framerate is None:
+            return False
+        size = surface.get_stride() * surface.get_height()
+        if size > self.max_bytes:
+            return False
+
+        if frame in self.__frames:
+            unused_surface, old_size = self.__frames.pop(frame)
+            self.size -= old_size
+        self.__frames[frame] = (surface, size)
+        self.size += size
+        self.__evict()
+        return True
+
+    def lookup(self, frame):
+        """Gets the specified frame, if cached.
+
+        Returns:
+            Optional[cairo.ImageSurface]: The frame.
+        """
+        try:
+            surface, unused_size = self.__frames[frame]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.__frames.move_to_end(frame)
+        self.hits += 1
+        return surface
+
+    def lookup_position(self, position):
+        """Gets the frame displayed at the specified position, if cached.
+
+        Returns:
+            Optional[cairo.ImageSurface]: The frame.
+        """
+        if self.framerate is None:
+            return None
+        return self.lookup(frame_index(position, self.framerate))
+
+
+class FramePrefetcher(Loggable):
+    """Fills a frame cache with the frames around the playhead.
+
+    The frames are composited by a pipeline of its own, playing a snapshot
+    of the timeline, so the displayed pipeline is not disturbed. The
+    snapshot is made again when the generation of the cache changes and
+    the timeline has not been edited for a while. The new snapshot is
+    loaded in the timeline of the same pipeline.
+
+    Attributes:
+        frame_cache (FrameCache): The cache to be filled.
+        count (int): The number of frames prefetched after the playhead.
+    """
+
+    def __init__(self, frame_cache, count):
+        Loggable.__init__(self)
+        self.frame_cache = frame_cache
+        self.count = count
+
+        # The generation of the cache when the snapshot has been made.
+        self.__generation = None
+        self.__snapshot_path = None
+        self.__project = None
+        self.__pipeline = None
+        self.__appsink = None
+        # The size of the frames composited by the pipeline.
+        self.__frame_size = None
+        # Whether the pipeline can be seeked.
+        self.__ready = False
+        # The frames left to be prefetched, the most urgent first.
+        self.__frames = []
+        # The frame being composited.
+        self.__frame = None
+        self.__timeout_id = 0
+
+    def schedule(self, ges_timeline, position):
+        """Prefetches the frames around the position, after a short delay.
+
+        Args:
+            ges_timeline (GES.Timeline): The timeline being displayed.
+            position (int): The position of the playhead.
+        """
+        self.stop()
+        video_caps = get_video_caps(ges_timeline)
+        if self.count <= 0 or not video_caps:
+            return
+        width, height, framerate = video_caps
+        self.frame_cache.set_framerate(framerate)
+
+        last_frame = frame_index(ges_timeline.props.duration, framerate)
+        self.__frames = [frame
+                         for frame in prefetch_order(frame_index(position, framerate),
+                                                     self.count)
+                         if frame < last_frame and frame not in self.frame_cache]
+        if not self.__frames:
+            return
+        if self.__generation not in (None, self.frame_cache.generation):
+            # The timeline has just been edited.
+            delay = SNAPSHOT_DELAY_MS
+        else:
+            delay = PREFETCH_DELAY_MS
+        self.__timeout_id = GLib.timeout_add(delay, self.__start_cb,
+                                             ges_timeline, width, height)
+
+    def stop(self):
+        """Stops prefetching, for example because the playback started."""
+        if self.__timeout_id:
+            GLib.source_remove(self.__timeout_id)
+            self.__timeout_id = 0
+        self.__frames = []
+
+    def release(self):
+        """Stops prefetching and releases the prefetching pipeline."""
+        self.stop()
+        self.__release_pipeline()
+
+    def __start_cb(self, ges_timeline, width, height):
+        self.__timeout_id = 0
+        if self.__project and self.__generation == self.frame_cache.generation:
+            if self.__ready and self.__frame is None:
+                self.__prefetch_next()
+            # Otherwise the frames are prefetched when the snapshot is ready.
+            return False
+
+        if self.__pipeline and self.__frame_size != (width, height):
+            self.__release_pipeline()
+        self.__load_snapshot(ges_timeline, width, height)
+        return False
+
+    def __load_snapshot(self, ges_timeline, width, height):
+        self.__remove_snapshot()
+        fd, self.__snapshot_path = tempfile.mkstemp(prefix="pitivi-frames-",
+                                                    suffix=".xges")
+        os.close(fd)
+        uri = Gst.filename_to_uri(self.__snapshot_path)
+        try:
+            saved = ges_timeline.save_to_uri(uri, None, True)
+        except GLib.Error as e:
+            self.warning("Cannot snapshot the timeline: %s", e)
+            saved = False
+        if not saved:
+            self.__release_pipeline()
+            return
+
+        if self.__project:
+            self.__project.disconnect_by_func(self.__loaded_cb)
+        self.__project = GES.Project.new(uri)
+        self.__project.connect("loaded", self.__loaded_cb, width, height)
+        self.__generation = self.frame_cache.generation
+        self.__ready = False
+        self.__frame = None
+        try:
+            if self.__pipeline:
+                # Reuse the pipeline by loading the snapshot in its timeline.
+                self.__pipeline.set_state(Gst.State.READY)
+                snapshot_timeline = self.__pipeline.props.timeline
+                for ges_layer in snapshot_timeline.get_layers():
+                    snapshot_timeline.remove_layer(ges_layer)
+                for track in snapshot_timeline.get_tracks():
+                    snapshot_timeline.remove_track(track)
+                if not self.__project.load(snapshot_timeline):
+                    self.__release_pipeline()
+            else:
+                self.__project.extract()
+        except GLib.Error as e:
+            self.warning("Cannot load the timeline snapshot: %s", e)
+            self.__release_pipeline()
+
+    def __loaded_cb(self, unused_project, ges_timeline, width, height):
+        if self.__pipeline:
+            self.__pipeline.set_state(Gst.State.PAUSED)
+            return
+
+        self.__frame_size = (width, height)
+        frame_width = min(width, MAX_FRAME_WIDTH)
+        frame_height = max(1, round(height * frame_width / width))
+        sink_bin = Gst.parse_bin_from_description(
+            "videoconvert ! videoscale ! video/x-raw,format=%s,width=%d,height=%d,"
+            "pixel-aspect-ratio=1/1 ! appsink name=appsink sync=false"
+            % (FRAME_FORMAT, frame_width, frame_height), True)
+        self.__appsink = sink_bin.get_by_name("appsink")
+
+        self.__pipeline = GES.Pipeline()
+        self.__pipeline.set_timeline(ges_timeline)
+        self.__pipeline.set_mode(GES.PipelineFlags.VIDEO_PREVIEW)
+        self.__pipeline.preview_set_video_sink(sink_bin)
+        bus = self.__pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.__bus_message_cb)
+        self.__pipeline.set_state(Gst.State.PAUSED)
+
+    def __release_pipeline(self):
+        self.__ready = False
+        self.__frame = None
+        self.__generation = None
+        if self.__pipeline:
+            bus = self.__pipeline.get_bus()
+            bus.disconnect_by_func(self.__bus_message_cb)
+            bus.remove_signal_watch()
+            self.__pipeline.set_state(Gst.State.NULL)
+            self.__pipeline = None
+            self.__appsink = None
+            self.__frame_size = None
+        if self.__project:
+            self.__project.disconnect_by_func(self.__loaded_cb)
+            self.__project = None
+        self.__remove_snapshot()
+
+    def __remove_snapshot(self):
+        if self.__snapshot_path:
+            try:
+                os.unlink(self.__snapshot_path)
+            except OSError as e:
+                self.warning("Failed removing the timeline snapshot: %s", e)
+            self.__snapshot_path = None
+
+    def __prefetch_next(self):
+        while self.__frames:
+            frame = self.__frames.pop(0)
+            if frame in self.frame_cache:
+                continue
+            position = frame_position(frame, self.frame_cache.framerate)
+            if self.__pipeline.seek_simple(Gst.Format.TIME,
+                                           Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                                           position):
+                self.__frame = frame
+                return
+            self.warning("Failed prefetching frame %d", frame)
+
+    def __bus_message_cb(self, unused_bus, message):
+        if message.type == Gst.MessageType.ASYNC_DONE:
+            if self.__generation != self.frame_cache.generation:
+                # The timeline changed, the snapshot is obsolete.
+                self.__frames = []
+                self.__frame = None
+                return
+
+            if self.__frame is not None:
+                sample = self.__appsink.emit("pull-preroll")
+                surface = surface_from_sample(sample) if sample else None
+                if surface:
+                    self.frame_cache.add(self.__generation, self.__frame, surface)
+                    self.log("Prefetched frame %d", self.__frame)
+                self.__frame = None
+            self.__ready = True
+            self.__prefetch_next()
+        elif message.type == Gst.MessageType.ERROR:
+            error, detail = message.parse_error()
+            self.warning("Prefetching failed: %s, %s", error, detail)
+            self.__release_pipeline()
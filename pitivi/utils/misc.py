@@ -20,6 +20,8 @@
 import bisect
 import hashlib
 import os
+import queue
+import re
 import subprocess
 import threading
 import time
@@ -29,6 +31,7 @@ from urllib.parse import urlparse
 from urllib.parse import urlsplit
 
 from gi.repository import GES
+from gi.repository import Gio
 from gi.repository import GLib
 from gi.repository import Gst
 from gi.repository import Gtk
@@ -168,18 +171,77 @@ def quote_uri(uri):
     return Gst.filename_to_uri(raw_path)
 
 
+# The top-level MIME types of the files which can be imported.
+MEDIA_MIME_CATEGORIES = ("audio", "image", "video")
+
+# The MIME types of media files which are not in MEDIA_MIME_CATEGORIES.
+MEDIA_APPLICATION_MIME_TYPES = ("application/mxf",
+                                "application/ogg",
+                                "application/vnd.rn-realmedia",
+                                "application/x-matroska")
+
+# How many bytes are read to sniff the MIME type of ambiguous files.
+MIME_SNIFF_SIZE = 4096
+
+
+def is_media_file(path):
+    """Returns whether the specified file can be a media file.
+
+    The MIME type is guessed from the file name and, when that is not
+    conclusive, from the first bytes of the file. Only the files which are
+    obviously not media files are rejected.
+    """
+    content_type, uncertain = Gio.content_type_guess(path, None)
+    if uncertain:
+        try:
+            with open(path, "rb") as file:
+                data = file.read(MIME_SNIFF_SIZE)
+        except OSError:
+            return False
+        content_type, uncertain = Gio.content_type_guess(path, data)
+        if uncertain:
+            return True
+
+    mime_type = Gio.content_type_get_mime_type(content_type)
+    if not mime_type or mime_type == "application/octet-stream":
+        return True
+    if mime_type.split("/", 1)[0] in MEDIA_MIME_CATEGORIES:
+        return True
+    return mime_type in MEDIA_APPLICATION_MIME_TYPES
+
+
 class PathWalker(Thread):
-    """Thread for recursively searching in a list of directories."""
+    """Thread for recursively searching in a list of directories.
+
+    The URIs of the found files are passed to the callback in batches, in
+    the main thread, as soon as they are found. The directories are scanned
+    concurrently by a few worker threads.
+
+    Attributes:
+        uris (List[str]): The URIs of the files and directories to scan.
+        callback (function): The function receiving the lists of found URIs.
+        batch_size (int): The max number of URIs passed to the callback.
+        batch_interval (float): The max number of seconds a found URI is
+            kept before being passed to the callback.
+        n_workers (int): The number of threads scanning directories.
+        filter_func (function): The function deciding whether a file path
+            is to be passed to the callback.
+    """
 
-    def __init__(self, uris, callback):
+    def __init__(self, uris, callback, batch_size=200, batch_interval=0.2,
+                 n_workers=4, filter_func=is_media_file):
         Thread.__init__(self)
         self.log("New PathWalker for %s", uris)
         self.uris = uris
         self.callback = callback
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.n_workers = n_workers
+        self.filter_func = filter_func
         self.stopme = threading.Event()
 
     def _scan(self, uris):
-        """Scans the URIs and yields the file URIs."""
+        """Scans the URIs and yields the paths of the files and directories."""
         for uri in uris:
             if self.stopme.is_set():
                 return
@@ -189,35 +251,113 @@ class PathWalker(Thread):
                 continue
             path = unquote(url.path)
             if os.path.isfile(path):
-                yield uri
+                yield path, False
             elif os.path.isdir(path):
-                yield from self._scan_dir(path)
+                yield path, True
             else:
                 self.warning("Unusable, not a file nor a dir: %s, %s", uri, path)
 
-    def _scan_dir(self, folder):
-        """Scans the folder recursively and yields the URIs of the files."""
+    def _scan_dir(self, folder, dirs, batch):
+        """Adds the files in the folder to the batch and the subfolders to dirs."""
         self.log("Scanning folder %s", folder)
-        for path, dirs, files in os.walk(folder):
+        try:
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            self.warning("Cannot scan folder %s: %s", folder, e)
+            return
+        for entry in entries:
             if self.stopme.is_set():
                 return
-            for afile in files:
-                yield Gst.filename_to_uri(os.path.join(path, afile))
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.put(entry.path)
+                elif entry.is_file():
+                    batch.add(entry.path)
+            except OSError as e:
+                self.warning("Cannot stat %s: %s", entry.path, e)
+
+    def _dir_worker(self, dirs):
+        batch = _PathBatch(self)
+        while True:
+            folder = dirs.get()
+            if folder is None:
+                break
+            try:
+                if not self.stopme.is_set():
+                    self._scan_dir(folder, dirs, batch)
+                    batch.maybe_flush()
+            except Exception as e:
+                # Keep the worker alive to scan the remaining folders.
+                self.error("Failed scanning folder %s: %s", folder, e)
+            finally:
+                # Otherwise process() waits forever for the folder.
+                dirs.task_done()
+        batch.flush()
 
     def process(self):
-        uris = list(self._scan(self.uris))
-        if uris:
-            GLib.idle_add(self.callback, uris)
+        batch = _PathBatch(self)
+        dirs = queue.Queue()
+        for path, is_dir in self._scan(self.uris):
+            if is_dir:
+                dirs.put(path)
+            else:
+                batch.add(path)
+        batch.flush()
+
+        if dirs.empty():
+            return
+
+        workers = []
+        for unused_i in range(max(1, self.n_workers)):
+            worker = threading.Thread(target=self._dir_worker, args=(dirs,))
+            worker.start()
+            workers.append(worker)
+        # The queue is empty and all the directories have been scanned.
+        dirs.join()
+        for worker in workers:
+            dirs.put(None)
+        for worker in workers:
+            worker.join()
 
     def abort(self):
         self.stopme.set()
 
 
+class _PathBatch(object):
+    """Accumulates the found files of a PathWalker thread."""
+
+    def __init__(self, walker):
+        self.walker = walker
+        self.uris = []
+        self.time = time.monotonic()
+
+    def add(self, path):
+        if self.walker.filter_func and not self.walker.filter_func(path):
+            self.walker.log("Skipping non-media file %s", path)
+            return
+        self.uris.append(Gst.filename_to_uri(path))
+        if len(self.uris) >= self.walker.batch_size:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.time >= self.walker.batch_interval:
+            self.flush()
+
+    def flush(self):
+        self.time = time.monotonic()
+        if not self.uris or self.walker.stopme.is_set():
+            return
+        GLib.idle_add(self.walker.callback, self.uris)
+        self.uris = []
+
+
 def hash_file(uri):
     """Hashes the first 256KB of the specified file."""
     sha256 = hashlib.sha256()
     with open(uri, "rb") as file:
-        for _ in range(1024):
+        for unused_i in range(1024):
             chunk = file.read(256)
             if not chunk:
                 break
@@ -252,6 +392,124 @@ def binary_search(elements, value):
     return closest_index
 
 
+SEARCH_TOKEN_RE = re.compile(r"\w+")
+
+
+def search_tokens(text):
+    """Returns the normalized search tokens found in the specified text.
+
+    Args:
+        text (str): The text to split, usually plain text, not markup.
+
+    Returns:
+        set[str]: The casefolded words in the text.
+    """
+    if not text:
+        return set()
+    return set(SEARCH_TOKEN_RE.findall(text.casefold()))
+
+
+class SearchIndex(object):
+    """Inverted index for filtering lists of items by a search query.
+
+    The items are represented by hashable keys, for example URIs. The texts
+    describing an item are split into normalized tokens when the item is
+    added, so filtering is done with set lookups instead of scanning and
+    reformatting the texts of every item on every keystroke.
+
+    A query matches an item when each word of the query is a prefix of
+    one of the item's tokens.
+    """
+
+    def __init__(self):
+        self._tokens_by_key = {}
+        self._keys_by_token = {}
+        # Sorted list of all the tokens, rebuilt lazily for prefix lookups.
+        self._vocabulary = None
+
+    def __len__(self):
+        return len(self._tokens_by_key)
+
+    def __contains__(self, key):
+        return key in self._tokens_by_key
+
+    def add(self, key, *texts):
+        """Indexes the specified texts for the specified item.
+
+        If the item is already indexed, its tokens are replaced.
+
+        Args:
+            key (object): The hashable identifier of the item.
+            texts (List[str]): The texts describing the item.
+        """
+        self.remove(key)
+        tokens = set()
+        for text in texts:
+            tokens |= search_tokens(text)
+        self._tokens_by_key[key] = tokens
+        for token in tokens:
+            keys = self._keys_by_token.get(token)
+            if keys is None:
+                self._keys_by_token[token] = {key}
+                self._vocabulary = None
+            else:
+                keys.add(key)
+
+    def remove(self, key):
+        """Removes the specified item from the index, if present."""
+        tokens = self._tokens_by_key.pop(key, None)
+        if not tokens:
+            return
+        for token in tokens:
+            keys = self._keys_by_token[token]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_token[token]
+                self._vocabulary = None
+
+    def clear(self):
+        """Removes all the items from the index."""
+        self._tokens_by_key.clear()
+        self._keys_by_token.clear()
+        self._vocabulary = None
+
+    def _keys_for_prefix(self, prefix):
+        keys = self._keys_by_token.get(prefix)
+        res = set(keys) if keys else set()
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._keys_by_token)
+        index = bisect.bisect_right(self._vocabulary, prefix)
+        while index < len(self._vocabulary):
+            token = self._vocabulary[index]
+            if not token.startswith(prefix):
+                break
+            res |= self._keys_by_token[token]
+            index += 1
+        return res
+
+    def search(self, query):
+        """Finds the items matching the specified query.
+
+        Args:
+            query (str): The text entered by the user.
+
+        Returns:
+            Optional[set]: The keys of the matching items, or None if the
+            query is empty, meaning all the items match.
+        """
+        tokens = search_tokens(query)
+        if not tokens:
+            return None
+        res = None
+        # Start with the longest words, they are the most selective.
+        for token in sorted(tokens, key=len, reverse=True):
+            keys = self._keys_for_prefix(token)
+            res = keys if res is None else res & keys
+            if not res:
+                break
+        return res
+
+
 def show_user_manual(page=None):
     """Displays the user manual.
 
@@ -19,6 +19,8 @@
 # the Free Software Foundation; either version 3, or (at your option)
 # any later version.
 """High-level pipelines."""
+import collections
+import contextlib
 import os
 
 from gi.repository import GES
@@ -27,8 +29,15 @@ from gi.repository import GObject
 from gi.repository import Gst
 
 from pitivi.check import videosink_factory
+from pitivi.utils.frame_cache import FrameCache
+from pitivi.utils.frame_cache import FramePrefetcher
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import format_ns
+from pitivi.utils.preview_quality import PREVIEW_DIVISORS
+from pitivi.utils.preview_quality import PreviewQuality
+from pitivi.utils.preview_quality import QOS_INTERVAL_MS
+from pitivi.utils.preview_quality import QosMonitor
+from pitivi.utils.preview_quality import scaled_size
 
 
 PIPELINE_SIGNALS = {
@@ -39,20 +48,193 @@ PIPELINE_SIGNALS = {
     "error": (GObject.SignalFlags.RUN_LAST, None, (GObject.TYPE_STRING, GObject.TYPE_STRING)),
     "died": (GObject.SignalFlags.RUN_LAST, None, ()),
     "async-done": (GObject.SignalFlags.RUN_LAST, None, ()),
+    "cached-frame": (GObject.SignalFlags.RUN_LAST, None, (GObject.TYPE_UINT64, GObject.TYPE_PYOBJECT)),
 }
 
+TIMELINE_PIPELINE_SIGNALS = dict(PIPELINE_SIGNALS, **{
+    "about-to-play": (GObject.SignalFlags.RUN_LAST, None, ()),
+    "forwarding-stopped": (GObject.SignalFlags.RUN_LAST, None, (GObject.TYPE_UINT64, GObject.TYPE_BOOLEAN)),
+})
+
 MAX_RECOVERIES = 3
 WATCHDOG_TIMEOUT = 3
 MAX_BRINGING_TO_PAUSED_DURATION = 5
 MAX_SET_STATE_DURATION = 1
 
 DEFAULT_POSITION_LISTENNING_INTERVAL = 500
+# The min interval in milliseconds between the playhead updates of the
+# widgets which are expensive to update.
+SLOW_PLAYHEAD_INTERVAL = 100
+
+# The max number of prerolled pipelines kept for previewing assets.
+ASSET_PIPELINE_POOL_SIZE = 3
+
+# The time in milliseconds during which the requested commits are merged.
+COMMIT_DELAY_MS = 50
 
 
 class PipelineError(Exception):
     pass
 
 
+class PlayheadSubscriber:
+    """A widget following the playhead.
+
+    Attributes:
+        widget (Gtk.Widget): The widget displaying the position.
+        callback (function): The function called with the pipeline and
+            the position.
+        interval (int): The min number of milliseconds between two calls
+            while playing, or 0 for calling it on every frame.
+    """
+
+    def __init__(self, widget, callback, interval):
+        self.widget = widget
+        self.callback = callback
+        self.interval = interval
+        # The frame time of the last call, in microseconds.
+        self.last_time = None
+        # Whether a position has not been delivered while unmapped.
+        self.stale = False
+        self.tick_id = 0
+        self.map_handler_id = 0
+
+
+class PlayheadDispatcher(Loggable):
+    """Notifies the widgets following the playhead of its position.
+
+    While playing, the position is queried at most once per frame displayed
+    by the frame clock of the widgets and passed to the mapped subscribers.
+    The subscribers which are not mapped are skipped and receive the latest
+    position when they are mapped again. Otherwise, the positions emitted by
+    the pipeline, when seeking for example, are passed along.
+
+    Args:
+        pipeline (SimplePipeline): The pipeline whose position is followed.
+    """
+
+    def __init__(self, pipeline):
+        Loggable.__init__(self)
+        self.pipeline = pipeline
+        self.playing = False
+        self.__subscribers = []
+        self.__position = None
+        # The (frame clock, frame counter) of the queried position.
+        self.__position_frame = None
+
+        pipeline.connect("position", self.__position_cb)
+
+    def subscribe(self, widget, callback, interval=0):
+        """Starts calling the callback with the positions of the playhead.
+
+        Args:
+            widget (Gtk.Widget): The widget displaying the position.
+            callback (function): The function to be called with the
+                pipeline and the position.
+            interval (Optional[int]): The min number of milliseconds between
+                two calls while playing, for expensive callbacks.
+        """
+        subscriber = PlayheadSubscriber(widget, callback, interval)
+        subscriber.map_handler_id = widget.connect("map", self.__map_cb, subscriber)
+        self.__subscribers.append(subscriber)
+        if self.playing:
+            self.__add_tick(subscriber)
+
+    def unsubscribe(self, callback):
+        """Stops calling the callback.
+
+        Args:
+            callback (function): A function passed to `subscribe`.
+        """
+        for subscriber in self.__subscribers:
+            if subscriber.callback == callback:
+                self.__remove_tick(subscriber)
+                subscriber.widget.disconnect(subscriber.map_handler_id)
+                self.__subscribers.remove(subscriber)
+                return
+        self.warning("%s is not subscribed", callback)
+
+    def set_playing(self, playing):
+        """Starts or stops following the playback on each frame."""
+        if playing == self.playing:
+            return
+        self.playing = playing
+        for subscriber in self.__subscribers:
+            if playing:
+                subscriber.last_time = None
+                self.__add_tick(subscriber)
+            else:
+                self.__remove_tick(subscriber)
+
+    def release(self):
+        """Removes all the subscribers."""
+        for subscriber in self.__subscribers:
+            self.__remove_tick(subscriber)
+            subscriber.widget.disconnect(subscriber.map_handler_id)
+        self.__subscribers.clear()
+        self.pipeline.disconnect_by_func(self.__position_cb)
+
+    def __add_tick(self, subscriber):
+        if not subscriber.tick_id:
+            subscriber.tick_id = subscriber.widget.add_tick_callback(
+                self.__tick_cb, subscriber)
+
+    def __remove_tick(self, subscriber):
+        if subscriber.tick_id:
+            subscriber.widget.remove_tick_callback(subscriber.tick_id)
+            subscriber.tick_id = 0
+
+    def __dispatch(self, subscriber, position):
+        subscriber.stale = False
+        subscriber.callback(self.pipeline, position)
+
+    def __position_cb(self, unused_pipeline, position):
+        self.__position = position
+        self.__position_frame = None
+        if self.playing:
+            # The subscribers are updated on each frame.
+            return
+        for subscriber in list(self.__subscribers):
+            if subscriber.widget.get_mapped():
+                self.__dispatch(subscriber, position)
+            else:
+                subscriber.stale = True
+
+    def __map_cb(self, unused_widget, subscriber):
+        if subscriber.stale and self.__position is not None:
+            self.__dispatch(subscriber, self.__position)
+
+    def __query_position(self, frame_clock):
+        frame = (frame_clock, frame_clock.get_frame_counter())
+        if frame != self.__position_frame:
+            try:
+                position = self.pipeline.getPosition()
+            except PipelineError as e:
+                self.log("Could not get the position: %s", e)
+                return None
+            if position == Gst.CLOCK_TIME_NONE:
+                return None
+            self.__position = position
+            self.__position_frame = frame
+        return self.__position
+
+    def __tick_cb(self, widget, frame_clock, subscriber):
+        if not widget.get_mapped():
+            subscriber.stale = True
+            return GLib.SOURCE_CONTINUE
+
+        frame_time = frame_clock.get_frame_time()
+        if subscriber.interval and subscriber.last_time is not None and \
+                frame_time - subscriber.last_time < subscriber.interval * 1000:
+            return GLib.SOURCE_CONTINUE
+
+        position = self.__query_position(frame_clock)
+        if position is not None:
+            subscriber.last_time = frame_time
+            self.__dispatch(subscriber, position)
+        return GLib.SOURCE_CONTINUE
+
+
 class SimplePipeline(GObject.Object, Loggable):
     """High-level pipeline.
 
@@ -67,8 +249,13 @@ class SimplePipeline(GObject.Object, Loggable):
         position: The current position of the pipeline changed.
         eos: The Pipeline has finished playing.
         error: An error happened.
+        cached-frame: A seek has been started and the frame at the new
+            position is already cached. The frame can be displayed until
+            the seek is done.
 
     Attributes:
+        playhead (PlayheadDispatcher): Updates the widgets following the
+            position while playing.
         _pipeline (Gst.Pipeline): The low-level pipeline.
     """
 
@@ -97,12 +284,18 @@ class SimplePipeline(GObject.Object, Loggable):
         self._attempted_recoveries = 0
         # The position where the user intends to seek.
         self._next_seek = None
+        # Whether the seeks are fast and approximate, while scrubbing.
+        self._scrubbing = False
+        # The last position requested while scrubbing.
+        self._scrub_position = None
         self._timeout_async_id = 0
         self._force_position_listener = False
 
         self.video_sink = None
         self.sink_widget = None
 
+        self.playhead = PlayheadDispatcher(self)
+
     def create_sink(self):
         sink = Gst.ElementFactory.make(videosink_factory.get_name(), None)
         self.sink_widget = sink.props.widget
@@ -129,6 +322,7 @@ class SimplePipeline(GObject.Object, Loggable):
         """
         self._removeWaitingForAsyncDoneTimeout()
         self.deactivatePositionListener()
+        self.playhead.release()
         self._bus.disconnect_by_func(self._busMessageCb)
         self._bus.remove_signal_watch()
 
@@ -312,6 +506,11 @@ class SimplePipeline(GObject.Object, Loggable):
         self._timeout_async_id = GLib.timeout_add_seconds(timeout,
                                                           self._async_done_not_received_cb)
 
+    @property
+    def seek_pending(self):
+        """Whether a seek will be done when the current operation is done."""
+        return self._next_seek is not None
+
     @property
     def _busy_async(self):
         """Gets whether the pipeline is busy in the background.
@@ -331,6 +530,37 @@ class SimplePipeline(GObject.Object, Loggable):
         """
         return bool(self._timeout_async_id)
 
+    def begin_scrub(self):
+        """Makes the next seeks fast and approximate, until `end_scrub`.
+
+        While scrubbing, the seeks go to the nearest keyframe, and only the
+        newest of the seeks requested while the pipeline is busy is done.
+        """
+        self._scrubbing = True
+
+    def end_scrub(self, position=None):
+        """Stops scrubbing and seeks accurately to the final position.
+
+        Args:
+            position (Optional[int]): The final position. By default the
+                last position requested while scrubbing.
+
+        Raises:
+            PipelineError: When the seek fails.
+        """
+        self._scrubbing = False
+        if position is None:
+            position = self._scrub_position
+        self._scrub_position = None
+        if position is not None:
+            self.simple_seek(position)
+
+    def _seek_flags(self):
+        if self._scrubbing:
+            return Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | \
+                Gst.SeekFlags.SNAP_NEAREST
+        return Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+
     def simple_seek(self, position):
         """Seeks in the low-level pipeline to the specified position.
 
@@ -340,7 +570,11 @@ class SimplePipeline(GObject.Object, Loggable):
         Raises:
             PipelineError: When the seek fails.
         """
+        if self._scrubbing:
+            self._scrub_position = position
+
         if self._busy_async or self.getState() < Gst.State.PAUSED:
+            # Only the newest of the pending seeks is done.
             self._next_seek = position
             self.info("Setting next seek to %s", self._next_seek)
             return
@@ -352,7 +586,7 @@ class SimplePipeline(GObject.Object, Loggable):
         self.debug("Seeking to position: %s", format_ns(position))
         res = self._pipeline.seek(1.0,
                                   Gst.Format.TIME,
-                                  Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                                  self._seek_flags(),
                                   Gst.SeekType.SET,
                                   position,
                                   Gst.SeekType.NONE,
@@ -409,8 +643,10 @@ class SimplePipeline(GObject.Object, Loggable):
                     self._listenToPosition(self._force_position_listener)
                 elif prev == Gst.State.PAUSED and new == Gst.State.PLAYING:
                     self._listenToPosition(True)
+                    self.playhead.set_playing(True)
                 elif prev == Gst.State.PLAYING and new == Gst.State.PAUSED:
                     self._listenToPosition(self._force_position_listener)
+                    self.playhead.set_playing(False)
 
                 if emit_state_change:
                     self.emit('state-change', new, prev)
@@ -521,10 +757,139 @@ class AssetPipeline(SimplePipeline):
         self._pipeline.set_property("uri", uri)
 
 
+class AssetPipelinePool(Loggable):
+    """Keeps prerolled pipelines for the recently previewed assets.
+
+    Switching to a pipeline of the pool is cheap since it's already
+    paused, with its decoders ready. The least recently used pipelines are
+    released when the pool is full.
+
+    Attributes:
+        size (int): The max number of pipelines kept.
+    """
+
+    def __init__(self, size=ASSET_PIPELINE_POOL_SIZE):
+        Loggable.__init__(self)
+        self.size = size
+        # Maps URIs to pipelines, least recent first.
+        self.__pipelines = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.__pipelines)
+
+    def get(self, clip):
+        """Gets a pipeline playing the asset of the clip.
+
+        Args:
+            clip (GES.UriClip): The clip whose asset is previewed.
+
+        Returns:
+            AssetPipeline: The pipeline, paused or being prerolled.
+        """
+        uri = clip.props.uri
+        pipeline = self.__pipelines.pop(uri, None)
+        if pipeline is None:
+            self.debug("Prerolling a pipeline for %s", uri)
+            pipeline = AssetPipeline(clip)
+            pipeline.pause()
+        self.__pipelines[uri] = pipeline
+
+        while len(self.__pipelines) > self.size:
+            unused_uri, old_pipeline = self.__pipelines.popitem(last=False)
+            old_pipeline.release()
+        return pipeline
+
+    def release(self):
+        """Releases all the pipelines."""
+        for pipeline in self.__pipelines.values():
+            pipeline.release()
+        self.__pipelines.clear()
+
+
+class CommitScheduler(Loggable):
+    """Merges the commits requested in a short time into one.
+
+    Each commit of a non-empty timeline recomposes the NLE compositions,
+    and the pipeline has to wait for ASYNC_DONE. Many operations request a
+    commit, so the commit is done only after `COMMIT_DELAY_MS`, for all the
+    commits requested meanwhile.
+
+    Args:
+        commit_func (function): The function doing the actual commit.
+
+    Attributes:
+        saved (int): The number of requested commits which have been merged
+            into another one.
+    """
+
+    def __init__(self, commit_func, delay=COMMIT_DELAY_MS):
+        Loggable.__init__(self)
+        self.saved = 0
+        self.__commit_func = commit_func
+        self.__delay = delay
+        self.__timeout_id = 0
+
+    @property
+    def pending(self):
+        """Whether a commit is scheduled."""
+        return self.__timeout_id != 0
+
+    def schedule(self):
+        """Requests a commit."""
+        if self.__timeout_id:
+            self.saved += 1
+            self.log("Commit merged, %d saved so far", self.saved)
+            return
+        self.__timeout_id = GLib.timeout_add(self.__delay, self.__commit_cb)
+
+    def flush(self):
+        """Commits right away if a commit is scheduled.
+
+        To be used by the operations which need the timeline to be committed.
+        """
+        if not self.__timeout_id:
+            return
+        GLib.source_remove(self.__timeout_id)
+        self.__timeout_id = 0
+        self.__commit_func()
+
+    def cancel(self):
+        """Forgets the scheduled commit, if any."""
+        if self.__timeout_id:
+            GLib.source_remove(self.__timeout_id)
+            self.__timeout_id = 0
+
+    def __commit_cb(self):
+        self.__timeout_id = 0
+        self.__commit_func()
+        return False
+
+
 class Pipeline(GES.Pipeline, SimplePipeline):
-    """Helper to handle GES.Pipeline through the SimplePipeline API."""
+    """Helper to handle GES.Pipeline through the SimplePipeline API.
 
-    __gsignals__ = PIPELINE_SIGNALS
+    While paused, the frames around the playhead are composited in the
+    background and kept in `frame_cache`, so stepping and small scrubs
+    can display them right away.
+
+    The playback can be forwarded to another pipeline playing a copy of
+    the timeline, see `set_playback_pipeline`. The "about-to-play" signal
+    is emitted before starting the playback, to allow choosing that
+    pipeline.
+
+    The preview can be displayed at a lower resolution than the project,
+    as specified by the `previewQuality` setting. In the auto mode the
+    resolution is lowered when frames are dropped while playing, and
+    raised back once the playback keeps up. The video is scaled down only
+    in front of the video sink, so the tracks, the saved projects and the
+    renders keep the size of the project.
+
+    Attributes:
+        commit_scheduler (CommitScheduler): Merges the timeline commits.
+        frame_cache (FrameCache): The recently composited frames.
+    """
+
+    __gsignals__ = TIMELINE_PIPELINE_SIGNALS
 
     def __init__(self, app):
         GES.Pipeline.__init__(self)
@@ -534,6 +899,30 @@ class Pipeline(GES.Pipeline, SimplePipeline):
 
         self._was_empty = False
         self._commit_wanted = False
+        # The number of `commits_batched` blocks being executed.
+        self.__commits_batched = 0
+        # Whether a commit has been requested while batching.
+        self.__commit_pending = False
+        self.commit_scheduler = CommitScheduler(self.__commit)
+
+        self.frame_cache = FrameCache(app.settings.frameCacheSize * 1024 * 1024)
+        self.__frame_prefetcher = FramePrefetcher(self.frame_cache,
+                                                  app.settings.frameCachePrefetch)
+        app.settings.connect("frameCacheSizeChanged",
+                             self.__frame_cache_size_changed_cb)
+        # The pipeline the playback is forwarded to.
+        self.__playback_pipeline = None
+
+        self.__preview_divisor = 1
+        # The size of the project, scaled down by the preview divisor.
+        self.__video_size = None
+        # The capsfilter in front of the video sink, see `create_sink`.
+        self.__preview_capsfilter = None
+        self.__qos_monitor = QosMonitor()
+        self.__qos_timeout_id = 0
+        app.settings.connect("previewQualityChanged",
+                             self.__preview_quality_changed_cb)
+        self.__update_preview_divisor()
 
         if "watchdog" in os.environ.get("PITIVI_UNSTABLE_FEATURES", ''):
             watchdog = Gst.ElementFactory.make("watchdog", None)
@@ -544,13 +933,171 @@ class Pipeline(GES.Pipeline, SimplePipeline):
                 watchdog.props.timeout = WATCHDOG_TIMEOUT * 1000
                 self.props.audio_filter = watchdog
 
+    def __frame_cache_size_changed_cb(self, settings):
+        self.frame_cache.set_max_bytes(settings.frameCacheSize * 1024 * 1024)
+
+    @property
+    def preview_divisor(self):
+        """The number the size of the project is divided by for previewing.
+
+        Always 1 while rendering.
+        """
+        return self.__preview_divisor
+
+    def __preview_quality_changed_cb(self, unused_settings):
+        self.__update_preview_divisor()
+        self.__watch_qos(self.getState())
+
+    def __update_preview_divisor(self):
+        quality = self.app.settings.previewQuality
+        if self._rendering():
+            divisor = 1
+        elif quality == PreviewQuality.AUTO:
+            divisor = self.__qos_monitor.divisor
+        else:
+            divisor = PREVIEW_DIVISORS.get(quality, 1)
+        if divisor == self.__preview_divisor:
+            return
+        self.__preview_divisor = divisor
+        self.__update_preview_caps()
+
+    def set_video_size(self, width, height):
+        """Sets the size of the project, which the preview is scaled from.
+
+        Args:
+            width (int): The width of the video.
+            height (int): The height of the video.
+        """
+        self.__video_size = (width, height)
+        self.__update_preview_caps()
+
+    def __update_preview_caps(self):
+        if not self.__preview_capsfilter:
+            return
+        if self.__preview_divisor == 1 or not self.__video_size:
+            caps = Gst.Caps.new_any()
+        else:
+            width, height = scaled_size(*self.__video_size, self.__preview_divisor)
+            caps = Gst.Caps.new_empty_simple("video/x-raw")
+            caps.set_value("width", width)
+            caps.set_value("height", height)
+        self.debug("Preview caps: %s", caps)
+        self.__preview_capsfilter.props.caps = caps
+
+    def __watch_qos(self, state):
+        watch = state == Gst.State.PLAYING and not self._rendering() and \
+            self.app.settings.previewQuality == PreviewQuality.AUTO
+        if watch and not self.__qos_timeout_id:
+            self.__qos_monitor.reset()
+            self.__qos_timeout_id = GLib.timeout_add(QOS_INTERVAL_MS,
+                                                     self.__check_qos_cb)
+        elif not watch and self.__qos_timeout_id:
+            GLib.source_remove(self.__qos_timeout_id)
+            self.__qos_timeout_id = 0
+
+    def __check_qos_cb(self):
+        if self.__qos_monitor.check():
+            self.__update_preview_divisor()
+        return True
+
+    def set_playback_pipeline(self, pipeline):
+        """Forwards the playback to a pipeline playing a copy of the timeline.
+
+        While forwarding, this pipeline is expected to be stopped. The
+        playback controls and the position queries are handled by the other
+        pipeline and its positions are emitted by this pipeline. The
+        forwarding stops when the timeline is committed, because the copy
+        does not contain the changes, see `stop_forwarding`.
+
+        Args:
+            pipeline (Optional[SimplePipeline]): The pipeline, or None to
+                stop forwarding.
+        """
+        if self.__playback_pipeline:
+            self.__playback_pipeline.disconnect_by_func(self.__playback_position_cb)
+            self.__playback_pipeline.disconnect_by_func(self.__playback_state_change_cb)
+            self.playhead.set_playing(False)
+        self.__playback_pipeline = pipeline
+        if pipeline:
+            pipeline.connect("position", self.__playback_position_cb)
+            pipeline.connect("state-change", self.__playback_state_change_cb)
+
+    def stop_forwarding(self):
+        """Stops forwarding the playback and emits "forwarding-stopped".
+
+        The handlers are given the position and whether the other pipeline
+        was playing, to continue from there.
+        """
+        pipeline = self.__playback_pipeline
+        if not pipeline:
+            return
+        position = pipeline.getPosition(False)
+        playing = pipeline.playing()
+        self.set_playback_pipeline(None)
+        self.emit("forwarding-stopped", position, playing)
+
+    def __playback_position_cb(self, unused_pipeline, position):
+        self.emit("position", position)
+
+    def __playback_state_change_cb(self, unused_pipeline, state, unused_prev):
+        self.playhead.set_playing(state == Gst.State.PLAYING)
+
+    def play(self):
+        if not self._rendering():
+            self.emit("about-to-play")
+        if self.__playback_pipeline:
+            self.__playback_pipeline.play()
+        else:
+            SimplePipeline.play(self)
+
+    def pause(self):
+        if self.__playback_pipeline:
+            self.__playback_pipeline.pause()
+        else:
+            SimplePipeline.pause(self)
+
+    def playing(self):
+        if self.__playback_pipeline:
+            return self.__playback_pipeline.playing()
+        return SimplePipeline.playing(self)
+
+    def getPosition(self, fails=True):
+        if self.__playback_pipeline:
+            return self.__playback_pipeline.getPosition(fails)
+        return SimplePipeline.getPosition(self, fails)
+
+    def release(self):
+        self.app.settings.disconnect_by_func(self.__frame_cache_size_changed_cb)
+        self.app.settings.disconnect_by_func(self.__preview_quality_changed_cb)
+        self.__watch_qos(Gst.State.NULL)
+        self.commit_scheduler.cancel()
+        self.__frame_prefetcher.release()
+        SimplePipeline.release(self)
+
     def create_sink(self):
         SimplePipeline.create_sink(self)
-        self._pipeline.preview_set_video_sink(self.video_sink)
+
+        # Scales the composited frames down to the size of the preview.
+        sinkbin = Gst.Bin.new("preview-sinkbin")
+        videoscale = Gst.ElementFactory.make("videoscale", None)
+        self.__preview_capsfilter = Gst.ElementFactory.make("capsfilter", None)
+        for element in (videoscale, self.__preview_capsfilter, self.video_sink):
+            sinkbin.add(element)
+        videoscale.link(self.__preview_capsfilter)
+        self.__preview_capsfilter.link(self.video_sink)
+        sinkbin.add_pad(Gst.GhostPad.new("sink", videoscale.get_static_pad("sink")))
+        self.__update_preview_caps()
+
+        self._pipeline.preview_set_video_sink(sinkbin)
 
     def set_mode(self, mode):
         self._next_seek = None
-        return GES.Pipeline.set_mode(self, mode)
+        self.__frame_prefetcher.stop()
+        self.commit_scheduler.flush()
+        res = GES.Pipeline.set_mode(self, mode)
+        self.__watch_qos(self.getState())
+        self.__update_preview_divisor()
+        return res
 
     def _getDuration(self):
         return self.props.timeline.get_duration()
@@ -590,6 +1137,10 @@ class Pipeline(GES.Pipeline, SimplePipeline):
         self.simple_seek(new_pos)
 
     def simple_seek(self, position):
+        if self.__playback_pipeline:
+            self.__playback_pipeline.simple_seek(position)
+            return
+
         if self.props.timeline.is_empty():
             # Nowhere to seek.
             return
@@ -597,14 +1148,26 @@ class Pipeline(GES.Pipeline, SimplePipeline):
         if self._rendering():
             raise PipelineError("Trying to seek while rendering")
 
+        # Seek in what the timeline currently contains.
+        self.commit_scheduler.flush()
+
         st = Gst.Structure.new_empty("seek")
         if self.getState() == Gst.State.PLAYING:
             st.set_value("playback_time", float(
                 self.getPosition()) / Gst.SECOND)
         st.set_value("start", float(position / Gst.SECOND))
-        st.set_value("flags", "accurate+flush")
+        if self._scrubbing:
+            st.set_value("flags", "key-unit+snap-nearest+flush")
+        else:
+            st.set_value("flags", "accurate+flush")
         self.app.write_action(st)
 
+        if self.getState() == Gst.State.PAUSED:
+            self.__frame_prefetcher.stop()
+            surface = self.frame_cache.lookup_position(position)
+            if surface:
+                self.emit("cached-frame", position, surface)
+
         try:
             SimplePipeline.simple_seek(self, position)
         except PipelineError as e:
@@ -612,6 +1175,13 @@ class Pipeline(GES.Pipeline, SimplePipeline):
                        format_ns(position), e)
 
     def _busMessageCb(self, bus, message):
+        if message.type == Gst.MessageType.QOS:
+            self.__qos_monitor.add_message(message)
+        elif message.type == Gst.MessageType.STATE_CHANGED and \
+                message.src == self._pipeline:
+            unused_prev, new, unused_pending = message.parse_state_changed()
+            self.__watch_qos(new)
+
         if message.type == Gst.MessageType.ASYNC_DONE:
             self.commiting = False
             self.app.gui.timeline_ui.timeline.update_visible_overlays()
@@ -624,8 +1194,53 @@ class Pipeline(GES.Pipeline, SimplePipeline):
             self._commit_wanted = False
         else:
             SimplePipeline._busMessageCb(self, bus, message)
+            if message.type == Gst.MessageType.ASYNC_DONE:
+                self.__prefetch_frames()
+
+    def __prefetch_frames(self):
+        if self._busy_async or self._rendering() or \
+                self.getState() != Gst.State.PAUSED:
+            return
+        try:
+            position = self.getPosition()
+        except PipelineError:
+            return
+        self.__frame_prefetcher.schedule(self.props.timeline, position)
+
+    @contextlib.contextmanager
+    def commits_batched(self):
+        """Gathers the timeline commits requested in the block into one.
+
+        The commit, if any has been requested, is done when the outermost
+        block is exited.
+        """
+        self.__commits_batched += 1
+        try:
+            yield
+        finally:
+            self.__commits_batched -= 1
+            if not self.__commits_batched and self.__commit_pending:
+                self.__commit_pending = False
+                self.commit_timeline()
+                # The commits of the block have already been merged.
+                self.commit_scheduler.flush()
 
     def commit_timeline(self):
+        """Requests a commit of the timeline.
+
+        The commit is done a bit later, see `CommitScheduler`.
+        """
+        if self.__commits_batched:
+            self.log("Commit postponed until the end of the batch")
+            self.__commit_pending = True
+            return
+
+        self.frame_cache.invalidate()
+        self.commit_scheduler.schedule()
+        # The copy of the timeline being played does not contain the changes.
+        self.stop_forwarding()
+
+    def __commit(self):
         if self.getState() == Gst.State.NULL:
             # No need to commit. NLE will do it automatically when
             # changing state from READY to PAUSED.
@@ -642,6 +1257,10 @@ class Pipeline(GES.Pipeline, SimplePipeline):
             self._was_empty = is_empty
 
     def setState(self, state):
+        if state == Gst.State.PLAYING:
+            self.__frame_prefetcher.stop()
+        # Play or stop what the timeline currently contains.
+        self.commit_scheduler.flush()
         SimplePipeline.setState(self, state)
         if state >= Gst.State.PAUSED and self.props.timeline.is_empty():
             self.debug("No ASYNC_DONE will be emited on empty timelines")
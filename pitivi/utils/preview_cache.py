@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Background pre-render of the timeline regions too heavy to play."""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from gi.repository import GES
+from gi.repository import GLib
+from gi.repository import Gst
+from gi.repository import GstPbutils
+
+from pitivi.settings import get_dir
+from pitivi.settings import GlobalSettings
+from pitivi.settings import xdg_cache_home
+from pitivi.utils.fileio import prune_cache_dir
+from pitivi.utils.loggable import Loggable
+from pitivi.utils.render_stats import complexity_profile
+from pitivi.utils.render_worker import RenderProcess
+
+GlobalSettings.addConfigSection("preview-cache")
+GlobalSettings.addConfigOption("previewCacheEnabled",
+                               section="preview-cache",
+                               key="enabled",
+                               default=False,
+                               notify=True)
+GlobalSettings.addConfigOption("previewCacheThreshold",
+                               section="preview-cache",
+                               key="threshold",
+                               default=4)
+
+# Bump this when the hashed properties or the format of the files change.
+CACHE_VERSION = 1
+
+# The detected heavy regions shorter than this are not pre-rendered.
+MIN_RANGE_DURATION = Gst.SECOND
+
+# How long to wait after the last change of the timeline before looking
+# for the ranges to be pre-rendered, in ms.
+UPDATE_DELAY_MS = 1000
+
+# How much to lower the priority of the render processes.
+NICENESS = 10
+
+# The max total size of the pre-rendered files of all the projects. The
+# least recently used files are removed first when it is exceeded.
+MAX_CACHE_SIZE = 20 * 1024 ** 3
+# The pre-rendered files not used for this long are removed, in seconds.
+MAX_FILE_AGE = 30 * 24 * 3600
+
+
+def merge_ranges(ranges):
+    """Merges the overlapping or adjacent ranges.
+
+    Args:
+        ranges (List[Tuple[int, int]]): The (start, stop) ranges.
+
+    Returns:
+        List[Tuple[int, int]]: The sorted disjoint ranges.
+    """
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def heavy_ranges(ges_timeline, threshold, min_duration=MIN_RANGE_DURATION):
+    """Detects the regions of the timeline too heavy to be played.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline.
+        threshold (float): The number of clips and effects active at the
+            same time from which a region is considered heavy.
+        min_duration (int): The min duration of the returned ranges.
+
+    Returns:
+        List[Tuple[int, int]]: The sorted disjoint heavy ranges.
+    """
+    boundaries, cumulative = complexity_profile(ges_timeline)
+    ranges = []
+    for index, (start, stop) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+        if stop <= start:
+            continue
+        active = (cumulative[index + 1] - cumulative[index]) * Gst.SECOND / (stop - start)
+        if active >= threshold:
+            ranges.append((start, stop))
+    return [(start, stop) for start, stop in merge_ranges(ranges)
+            if stop - start >= min_duration]
+
+
+def _hash_element(digest, ges_element):
+    digest.update(repr((type(ges_element).__gtype__.name,
+                        ges_element.props.priority,
+                        ges_element.props.in_point,
+                        ges_element.props.duration)).encode("UTF-8"))
+    if isinstance(ges_element, GES.TrackElement):
+        digest.update(repr(ges_element.props.active).encode("UTF-8"))
+    if isinstance(ges_element, GES.BaseEffect):
+        digest.update(ges_element.props.bin_description.encode("UTF-8"))
+    for pspec in ges_element.list_children_properties():
+        unused_res, value = ges_element.get_child_property(pspec.name)
+        digest.update(("%s=%s" % (pspec.name, value)).encode("UTF-8"))
+    if isinstance(ges_element, GES.TrackElement):
+        bindings = ges_element.get_all_control_bindings()
+        for name in sorted(bindings):
+            source = bindings[name].props.control_source
+            values = [(timed.timestamp, timed.value) for timed in source.get_all()]
+            digest.update(("%s:%s" % (name, values)).encode("UTF-8"))
+
+
+def range_hash(ges_timeline, start, stop):
+    """Computes the hash of the content of a range of the timeline.
+
+    The hash covers the clips overlapping the range, their effects and the
+    properties of their track elements, relative to the start of the range,
+    so it does not change when the range is moved as a whole.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline.
+        start (int): The start of the range.
+        stop (int): The end of the range.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((CACHE_VERSION, stop - start)).encode("UTF-8"))
+    for track in ges_timeline.get_tracks():
+        caps = track.props.restriction_caps
+        digest.update((caps.to_string() if caps else "").encode("UTF-8"))
+
+    for ges_layer in sorted(ges_timeline.get_layers(),
+                            key=lambda ges_layer: ges_layer.props.priority):
+        for ges_clip in ges_layer.get_clips():
+            clip_start = ges_clip.props.start
+            if clip_start >= stop or clip_start + ges_clip.props.duration <= start:
+                continue
+            asset = ges_clip.get_asset()
+            digest.update(repr((ges_layer.props.priority,
+                                clip_start - start,
+                                asset.get_id() if asset else None)).encode("UTF-8"))
+            _hash_element(digest, ges_clip)
+            for child in ges_clip.get_children(True):
+                _hash_element(digest, child)
+    return digest.hexdigest()
+
+
+def create_intermediate_profile():
+    """Creates the profile of the pre-rendered files.
+
+    The video is encoded as Motion JPEG, made only of keyframes, so the
+    files can be seeked and played cheaply.
+
+    Returns:
+        GstPbutils.EncodingContainerProfile: The profile.
+    """
+    container_profile = GstPbutils.EncodingContainerProfile.new(
+        "pitivi-preview", None, Gst.Caps.from_string("video/x-matroska"), None)
+    container_profile.add_profile(GstPbutils.EncodingVideoProfile.new(
+        Gst.Caps.from_string("image/jpeg"), None, None, 0))
+    container_profile.add_profile(GstPbutils.EncodingAudioProfile.new(
+        Gst.Caps.from_string("audio/x-raw"), None, None, 0))
+    return container_profile
+
+
+def substitute_ranges(ges_timeline, ranges):
+    """Replaces the content of the pre-rendered ranges with their files.
+
+    Meant to be used on a copy of the project's timeline.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline to be changed.
+        ranges (List[PreviewRange]): The pre-rendered ranges.
+
+    Returns:
+        int: The number of substituted ranges.
+
+    Raises:
+        GLib.Error: When a file cannot be used.
+    """
+    substituted = 0
+    ges_layers = ges_timeline.get_layers()
+    for preview_range in ranges:
+        asset = GES.UriClipAsset.request_sync(Gst.filename_to_uri(preview_range.path))
+        for ges_layer in ges_layers:
+            for ges_clip in ges_layer.get_clips():
+                if isinstance(ges_clip, GES.TransitionClip):
+                    # Removed along with the clips they join.
+                    continue
+                clip_start = ges_clip.props.start
+                clip_stop = clip_start + ges_clip.props.duration
+                if clip_stop <= preview_range.start or clip_start >= preview_range.stop:
+                    continue
+                if clip_start < preview_range.start:
+                    ges_clip = ges_clip.split(preview_range.start)
+                if ges_clip and clip_stop > preview_range.stop:
+                    ges_clip.split(preview_range.stop)
+                if ges_clip:
+                    ges_layer.remove_clip(ges_clip)
+
+        # Nothing else is left in the range, so any layer can be used.
+        ges_layer = ges_timeline.append_layer()
+        if ges_layer.add_asset(asset, preview_range.start, 0,
+                               preview_range.stop - preview_range.start,
+                               GES.TrackType.UNKNOWN):
+            substituted += 1
+    return substituted
+
+
+class PreviewRange(object):
+    """A range of the timeline pre-rendered in the background.
+
+    Attributes:
+        start (int): The start of the range.
+        stop (int): The end of the range.
+        digest (str): The hash of the content of the range.
+        path (str): The file where the range is pre-rendered.
+        ready (bool): Whether the file has been rendered.
+    """
+
+    def __init__(self, start, stop, digest, path):
+        self.start = start
+        self.stop = stop
+        self.digest = digest
+        self.path = path
+        self.ready = os.path.exists(path)
+
+
+class PreviewCache(Loggable):
+    """Pre-renders the heavy regions of a project's timeline.
+
+    The ranges marked by the user and, if enabled, the automatically
+    detected heavy ranges are rendered one at a time by a low priority
+    worker process to intermediate files. A file is identified by the hash
+    of the content of its range, so it is used only as long as the range
+    is unchanged. When the timeline is committed, the ranges are looked up
+    again and the files of the edited ranges are removed. The files of the
+    other projects and sessions are removed when they are too many or have
+    not been used for a long time.
+
+    For the playback, `get_playback_timeline` provides a copy of the
+    timeline where the pre-rendered ranges are replaced by their files.
+
+    Attributes:
+        project (Project): The project whose timeline is pre-rendered.
+        cache_dir (str): The directory where the files are kept.
+        marked (List[Tuple[int, int]]): The ranges marked by the user.
+        ranges (List[PreviewRange]): The ranges being pre-rendered.
+    """
+
+    def __init__(self, project, cache_dir=None):
+        Loggable.__init__(self)
+        self.project = project
+        if cache_dir is None:
+            cache_dir = os.path.join(xdg_cache_home(), "preview-renders")
+        self.cache_dir = get_dir(cache_dir)
+        self.marked = []
+        self.ranges = []
+
+        # The digests of the ranges which failed to render.
+        self.__failed = set()
+        self.__update_id = 0
+        self.__temp_dir = None
+        # The range being rendered and its worker process.
+        self.__rendering = None
+        self.__process = None
+        # The copy of the timeline prepared for the next playback.
+        self.__playback_timeline = None
+        self.__playback_project = None
+
+        project.app.settings.connect("previewCacheEnabledChanged",
+                                     self.__enabled_changed_cb)
+        # Clean up after the previous sessions and the other projects.
+        self.prune()
+
+    def __enabled_changed_cb(self, unused_settings):
+        self.schedule_update()
+
+    def mark(self, start, stop):
+        """Marks a range to be pre-rendered."""
+        self.marked = merge_ranges(self.marked + [(start, stop)])
+        self.schedule_update()
+
+    def clear_marks(self):
+        """Forgets the ranges marked by the user."""
+        self.marked = []
+        self.schedule_update()
+
+    def invalidate(self):
+        """Looks up the ranges again, as the timeline changed."""
+        self.__release_playback_timeline()
+        self.schedule_update()
+
+    def schedule_update(self):
+        """Looks up the ranges after a short delay."""
+        if self.__update_id:
+            GLib.source_remove(self.__update_id)
+        self.__update_id = GLib.timeout_add(UPDATE_DELAY_MS, self.__update_cb)
+
+    def __update_cb(self):
+        self.__update_id = 0
+        self.update()
+        return False
+
+    def update(self):
+        """Looks up the ranges to be pre-rendered and starts rendering them."""
+        ges_timeline = self.project.ges_timeline
+        candidates = list(self.marked)
+        if self.project.app.settings.previewCacheEnabled:
+            candidates += heavy_ranges(ges_timeline,
+                                       self.project.app.settings.previewCacheThreshold)
+
+        ranges = []
+        for start, stop in merge_ranges(candidates):
+            stop = min(stop, ges_timeline.props.duration)
+            if stop <= start:
+                continue
+            digest = range_hash(ges_timeline, start, stop)
+            if digest in self.__failed:
+                continue
+            path = os.path.join(self.cache_dir, digest + ".mkv")
+            ranges.append(PreviewRange(start, stop, digest, path))
+
+        digests = {preview_range.digest for preview_range in ranges}
+        for preview_range in self.ranges:
+            if preview_range.digest not in digests:
+                # The range has been edited.
+                self.__remove_file(preview_range.path)
+        if self.__rendering and self.__rendering.digest not in digests:
+            self.__stop_render()
+        self.ranges = ranges
+        self.debug("Pre-rendered ranges: %s",
+                   [(r.start, r.stop, r.ready) for r in ranges])
+        self.__touch_ready_files()
+        self.__render_next()
+
+    def __touch_ready_files(self):
+        """Marks the files in use as recently used, to keep them in the cache."""
+        for preview_range in self.ready_ranges:
+            try:
+                os.utime(preview_range.path)
+            except OSError as e:
+                self.warning("Failed touching %s: %s", preview_range.path, e)
+
+    def prune(self):
+        """Removes the least recently used files not needed by the project."""
+        keep = [preview_range.path for preview_range in self.ranges]
+        if self.__rendering:
+            keep.append(self.__rendering.path + ".part")
+        removed = prune_cache_dir(self.cache_dir, MAX_CACHE_SIZE, MAX_FILE_AGE,
+                                  keep)
+        if removed:
+            self.info("Removed %d old pre-rendered files", len(removed))
+
+    def __remove_file(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.warning("Failed removing %s: %s", path, e)
+
+    @property
+    def ready_ranges(self):
+        """The ranges whose files can be played."""
+        return [preview_range for preview_range in self.ranges
+                if preview_range.ready]
+
+    def __render_next(self):
+        if self.__rendering:
+            return
+        pending = [preview_range for preview_range in self.ranges
+                   if not preview_range.ready]
+        if not pending:
+            self.__remove_temp_dir()
+            self.__prepare_playback_timeline()
+            return
+
+        preview_range = pending[0]
+        if not self.__temp_dir:
+            self.__temp_dir = tempfile.mkdtemp(prefix="pitivi-preview-")
+        snapshot_uri = Gst.filename_to_uri(os.path.join(self.__temp_dir,
+                                                        "project.xges"))
+        profile_path = os.path.join(self.__temp_dir, "profile.gep")
+        try:
+            # Not saving the project itself, which would keep presets of
+            # the encoder settings and adopt the URI of the snapshot.
+            saved = self.project.ges_timeline.save_to_uri(snapshot_uri, None, True)
+            target = GstPbutils.EncodingTarget.new(
+                "pitivi-preview", "device", "", [create_intermediate_profile()])
+            target.save_to_file(profile_path)
+        except (GLib.Error, OSError) as e:
+            self.warning("Failed preparing the pre-render: %s", e)
+            saved = False
+        if not saved:
+            return
+
+        self.__rendering = preview_range
+        self.__process = RenderProcess(
+            ["--start", str(preview_range.start), "--stop", str(preview_range.stop),
+             "--nice", str(NICENESS), "--profile", profile_path,
+             "--output", preview_range.path + ".part", snapshot_uri])
+        self.__process.connect("exited", self.__exited_cb)
+        self.info("Pre-rendering %s - %s", preview_range.start, preview_range.stop)
+        if not self.__process.start():
+            self.warning("Failed starting the pre-render: %s", self.__process.error)
+            self.__stop_render()
+
+    def __exited_cb(self, process, success):
+        preview_range = self.__rendering
+        self.__rendering = None
+        self.__process = None
+        part_path = preview_range.path + ".part"
+        if success:
+            try:
+                os.replace(part_path, preview_range.path)
+                preview_range.ready = True
+                # The next copy of the timeline also plays this range.
+                self.__release_playback_timeline()
+            except OSError as e:
+                self.warning("Failed saving %s: %s", preview_range.path, e)
+            self.prune()
+        else:
+            self.warning("Failed pre-rendering %s - %s: %s", preview_range.start,
+                         preview_range.stop, process.error)
+            # Do not try again until the range changes.
+            self.__failed.add(preview_range.digest)
+            self.ranges.remove(preview_range)
+        if not preview_range.ready:
+            self.__remove_file(part_path)
+        self.__render_next()
+
+    def __stop_render(self):
+        if self.__process:
+            self.__process.disconnect_by_func(self.__exited_cb)
+            self.__process.cancel()
+            self.__process = None
+        if self.__rendering:
+            self.__remove_file(self.__rendering.path + ".part")
+            self.__rendering = None
+
+    def __remove_temp_dir(self):
+        if self.__temp_dir:
+            shutil.rmtree(self.__temp_dir, ignore_errors=True)
+            self.__temp_dir = None
+
+    def __prepare_playback_timeline(self):
+        if self.__playback_project or not self.ready_ranges:
+            return
+
+        fd, path = tempfile.mkstemp(prefix="pitivi-playback-", suffix=".xges")
+        os.close(fd)
+        uri = Gst.filename_to_uri(path)
+        try:
+            saved = self.project.ges_timeline.save_to_uri(uri, None, True)
+        except GLib.Error as e:
+            self.warning("Cannot snapshot the timeline: %s", e)
+            saved = False
+        if saved:
+            self.__playback_project = GES.Project.new(uri)
+            self.__playback_project.connect("loaded", self.__playback_loaded_cb,
+                                            path, list(self.ready_ranges))
+            try:
+                self.__playback_project.extract()
+                return
+            except GLib.Error as e:
+                self.warning("Cannot load the timeline snapshot: %s", e)
+                self.__playback_project = None
+        self.__remove_file(path)
+
+    def __playback_loaded_cb(self, project, ges_timeline, path, ranges):
+        self.__remove_file(path)
+        if project is not self.__playback_project:
+            return
+        try:
+            substituted = substitute_ranges(ges_timeline, ranges)
+        except GLib.Error as e:
+            self.warning("Cannot substitute the pre-rendered ranges: %s", e)
+            substituted = 0
+        if substituted:
+            self.__playback_timeline = ges_timeline
+        else:
+            self.__playback_project = None
+
+    def __release_playback_timeline(self):
+        self.__playback_timeline = None
+        self.__playback_project = None
+
+    def get_playback_timeline(self, position):
+        """Gets the copy of the timeline for playing from a position.
+
+        The same copy is returned until the timeline is edited or more
+        ranges are pre-rendered, so its pipeline can be reused.
+
+        Args:
+            position (int): The position where the playback starts.
+
+        Returns:
+            Optional[GES.Timeline]: A copy of the timeline where the ranges
+            pre-rendered are played from their files, or None if no such
+            range is ahead of the position.
+        """
+        ges_timeline = self.__playback_timeline
+        if not ges_timeline or not any(preview_range.stop > position
+                                       for preview_range in self.ready_ranges):
+            return None
+        return ges_timeline
+
+    def release(self):
+        """Stops the pre-render."""
+        if self.__update_id:
+            GLib.source_remove(self.__update_id)
+            self.__update_id = 0
+        self.project.app.settings.disconnect_by_func(self.__enabled_changed_cb)
+        self.__stop_render()
+        self.__remove_temp_dir()
+        self.__release_playback_timeline()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Resolution of the playback in the viewer."""
+from gi.repository import Gst
+
+from pitivi.settings import GlobalSettings
+from pitivi.utils.loggable import Loggable
+
+
+class PreviewQuality:
+    FULL = "full"
+    HALF = "half"
+    QUARTER = "quarter"
+    AUTO = "auto"
+
+
+GlobalSettings.addConfigSection("preview-quality")
+GlobalSettings.addConfigOption("previewQuality",
+                               section="preview-quality",
+                               key="quality",
+                               default=PreviewQuality.FULL,
+                               notify=True)
+
+# The size of the project is divided by these when compositing the preview.
+PREVIEW_DIVISORS = {
+    PreviewQuality.FULL: 1,
+    PreviewQuality.HALF: 2,
+    PreviewQuality.QUARTER: 4,
+}
+MAX_PREVIEW_DIVISOR = 4
+
+# How often the QoS of the playback is checked in the auto mode.
+QOS_INTERVAL_MS = 2000
+# The ratio of dropped frames above which the resolution is lowered.
+MAX_DROPPED_RATIO = 0.1
+# The number of intervals without drops before the resolution is raised.
+RAISE_INTERVALS = 5
+
+
+def scaled_size(width, height, divisor):
+    """Divides the specified video size, keeping the values even.
+
+    Returns:
+        (int, int): The width and height.
+    """
+    if divisor == 1:
+        return width, height
+    return (max(2, int(width / divisor) // 2 * 2),
+            max(2, int(height / divisor) // 2 * 2))
+
+
+class QosMonitor(Loggable):
+    """Chooses the preview resolution out of the QoS messages of a pipeline.
+
+    The elements post QoS messages when they drop buffers because they are
+    late. The stats of the messages are gathered and checked periodically
+    by calling `check`.
+
+    Attributes:
+        divisor (int): The number the size of the project should be divided
+            by to keep up with the playback.
+    """
+
+    def __init__(self):
+        Loggable.__init__(self)
+        self.divisor = 1
+        # The number of intervals without drops needed to raise the resolution.
+        self.__raise_intervals = RAISE_INTERVALS
+        # Whether the resolution has just been raised.
+        self.__raised = False
+        self.__clean_intervals = 0
+        # Maps the elements to their last (processed, dropped) stats.
+        self.__stats = {}
+        self.__processed = 0
+        self.__dropped = 0
+        # Whether the stats of the current interval must be ignored.
+        self.__settling = False
+
+    def reset(self):
+        """Forgets the stats of the current interval."""
+        self.__processed = 0
+        self.__dropped = 0
+        self.__clean_intervals = 0
+
+    def add_message(self, message):
+        """Takes into account the stats of a QoS message.
+
+        Args:
+            message (Gst.Message): A message of type QOS.
+        """
+        stats_format, processed, dropped = message.parse_qos_stats()
+        if stats_format != Gst.Format.BUFFERS:
+            return
+        # The stats are totals since the element started.
+        last_processed, last_dropped = self.__stats.get(message.src, (0, 0))
+        self.__stats[message.src] = (processed, dropped)
+        self.__processed += max(0, processed - last_processed)
+        self.__dropped += max(0, dropped - last_dropped)
+
+    def check(self):
+        """Updates the divisor out of the stats of the last interval.
+
+        Returns:
+            bool: Whether the divisor changed.
+        """
+        processed, dropped = self.__processed, self.__dropped
+        self.__processed = 0
+        self.__dropped = 0
+        if self.__settling:
+            # Changing the resolution stalls the playback a bit.
+            self.__settling = False
+            return False
+
+        total = processed + dropped
+        if total and dropped / total > MAX_DROPPED_RATIO:
+            self.__clean_intervals = 0
+            if self.__raised:
+                # Wait longer before trying again the higher resolution.
+                self.__raise_intervals *= 2
+            self.__raised = False
+            if self.divisor < MAX_PREVIEW_DIVISOR:
+                self.__set_divisor(self.divisor * 2)
+                return True
+            return False
+
+        if dropped:
+            self.__clean_intervals = 0
+            return False
+
+        self.__clean_intervals += 1
+        if self.__raised and self.__clean_intervals >= RAISE_INTERVALS:
+            self.__raised = False
+            self.__raise_intervals = RAISE_INTERVALS
+        if self.divisor > 1 and self.__clean_intervals >= self.__raise_intervals:
+            self.__clean_intervals = 0
+            self.__raised = True
+            self.__set_divisor(self.divisor // 2)
+            return True
+        return False
+
+    def __set_divisor(self, divisor):
+        self.info("Preview resolution divided by %d, was %d", divisor, self.divisor)
+        self.divisor = divisor
+        self.__settling = True
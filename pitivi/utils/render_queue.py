@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Persistent queue of the renders done without UI.
+
+Run as `pitivi --render-queue COMMAND`, see `main`.
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import time
+
+from gi.repository import GLib
+
+from pitivi.utils import loggable
+from pitivi.utils.fileio import write_file_atomically
+from pitivi.utils.loggable import Loggable
+from pitivi.utils.render_worker import EXIT_FAILURE
+from pitivi.utils.render_worker import EXIT_SUCCESS
+from pitivi.utils.render_worker import EXIT_USAGE
+from pitivi.utils.render_worker import RenderProcess
+from pitivi.utils.render_worker import to_uri
+
+# The states of the jobs.
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _user_data_dir():
+    """Gets the directory where the queue is saved, as `xdg_data_home`.
+
+    Computed here because `pitivi.settings` needs Gtk, which the headless
+    runner does not load.
+    """
+    default = os.path.join(GLib.get_user_data_dir(), "pitivi")
+    path = os.getenv("PITIVI_USER_DATA_DIR", default)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class RenderQueue(Loggable):
+    """Render jobs saved in a file, processed by worker processes.
+
+    Each job is a dict with the "id", "project", "output", "profile" and
+    "status" keys. The running jobs also have the "pid" of their worker.
+
+    Several processes can use the same file, for example the UI adding
+    jobs while a runner processes them. The changes are done in `locked`
+    blocks, which see the latest jobs and exclude the other processes.
+
+    Args:
+        path (Optional[str]): The file where the jobs are saved.
+
+    Attributes:
+        jobs (List[dict]): The jobs, in the order they have been added.
+    """
+
+    def __init__(self, path=None):
+        Loggable.__init__(self)
+        if path is None:
+            path = os.path.join(_user_data_dir(), "render-queue.json")
+        self.path = path
+        self.jobs = []
+        self.load()
+
+        self.__processes = {}
+        self.__mainloop = None
+        self.__concurrency = 1
+        self.__failed = 0
+
+    def load(self):
+        """Reads the jobs from the file."""
+        try:
+            with open(self.path, encoding="UTF-8") as queue_file:
+                self.jobs = json.load(queue_file)
+        except FileNotFoundError:
+            self.jobs = []
+        except (OSError, ValueError) as e:
+            self.warning("Ignoring the unreadable render queue %s: %s",
+                         self.path, e)
+            self.jobs = []
+
+    def save(self):
+        """Writes the jobs to the file."""
+        data = json.dumps(self.jobs, indent=2)
+        write_file_atomically(self.path, data.encode("UTF-8"))
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Reloads the jobs, and saves them at the end of the block.
+
+        The other processes wait meanwhile for changing the jobs.
+        """
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield
+                self.save()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __job(self, job_id):
+        for job in self.jobs:
+            if job["id"] == job_id:
+                return job
+        return None
+
+    def add(self, project, output, profile=None):
+        """Appends a pending job.
+
+        Args:
+            project (str): The project file or URI.
+            output (str): The file or URI to be written.
+            profile (Optional[str]): The .gep file or the name of the
+                encoding target. The profile saved in the project if None.
+
+        Returns:
+            dict: The new job.
+        """
+        if profile and os.path.isfile(profile):
+            # The queue can be run from a different directory.
+            profile = os.path.abspath(profile)
+        with self.locked():
+            job = {"id": max([job["id"] for job in self.jobs], default=0) + 1,
+                   "project": to_uri(project),
+                   "output": to_uri(output),
+                   "profile": profile,
+                   "status": PENDING,
+                   "added": time.time()}
+            self.jobs.append(job)
+        return job
+
+    def clear(self):
+        """Forgets the finished jobs."""
+        with self.locked():
+            self.jobs = [job for job in self.jobs
+                         if job["status"] in (PENDING, RUNNING)]
+
+    def run(self, concurrency=1):
+        """Processes the pending jobs and waits until all are finished.
+
+        The jobs left running by a runner which did not finish are
+        processed again, unless their worker process is still alive.
+        Several runners can process the same queue.
+
+        Args:
+            concurrency (int): How many jobs are processed at the same time.
+
+        Returns:
+            bool: Whether all the jobs succeeded.
+        """
+        with self.locked():
+            for job in self.jobs:
+                if job["status"] == RUNNING and not _process_alive(job.get("pid")):
+                    job["status"] = PENDING
+                    job.pop("pid", None)
+        self.__concurrency = max(1, concurrency)
+        self.__failed = 0
+        self.__mainloop = GLib.MainLoop()
+        self.__start_next()
+        if self.__processes:
+            self.__mainloop.run()
+        return not self.__failed
+
+    def report(self, event, **kwargs):
+        """Prints the specified event as a JSON line on stdout."""
+        kwargs["event"] = event
+        print(json.dumps(kwargs), flush=True)
+
+    def __start_next(self):
+        with self.locked():
+            for job in self.jobs:
+                if len(self.__processes) >= self.__concurrency:
+                    break
+                if job["status"] != PENDING:
+                    continue
+
+                args = ["--output", job["output"], job["project"]]
+                if job["profile"]:
+                    args += ["--profile", job["profile"]]
+                process = RenderProcess(args)
+                process.connect("event", self.__event_cb, job["id"])
+                process.connect("exited", self.__exited_cb, job["id"])
+                if process.start():
+                    job["status"] = RUNNING
+                    job["pid"] = process.pid
+                    self.__processes[job["id"]] = process
+                    self.report("job-started", job=job["id"])
+                else:
+                    self.__job_failed(job, process.error)
+
+        if not self.__processes and self.__mainloop.is_running():
+            self.__mainloop.quit()
+
+    def __event_cb(self, unused_process, event, job_id):
+        event["job"] = job_id
+        print(json.dumps(event), flush=True)
+
+    def __exited_cb(self, process, success, job_id):
+        del self.__processes[job_id]
+        with self.locked():
+            job = self.__job(job_id)
+            if job is None:
+                self.warning("Job %d has been removed meanwhile", job_id)
+            else:
+                job.pop("pid", None)
+                if success:
+                    job["status"] = DONE
+                    self.report("job-done", job=job_id)
+                else:
+                    self.__job_failed(job, process.error)
+        self.__start_next()
+
+    def __job_failed(self, job, message):
+        job["status"] = FAILED
+        self.__failed += 1
+        self.report("job-failed", job=job["id"], message=message)
+
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user.
+        return True
+    return True
+
+
+def main(argv, prog=None):
+    """Manages the render queue as specified on the command line.
+
+    The modules must have been initialized.
+
+    Returns:
+        int: The exit status of the process.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Manages the queue of the renders done "
+        "without UI.")
+    subparsers = parser.add_subparsers(dest="command")
+    add_parser = subparsers.add_parser("add", help="add a render job")
+    add_parser.add_argument("project", help="the project file")
+    add_parser.add_argument("-o", "--output", required=True,
+                            help="the file to be written")
+    add_parser.add_argument("--profile",
+                            help="the .gep encoding target file or the name "
+                            "of an encoding target")
+    subparsers.add_parser("list", help="print the jobs as JSON lines")
+    run_parser = subparsers.add_parser("run", help="process the pending jobs")
+    run_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="how many jobs to process at the same time")
+    subparsers.add_parser("clear", help="forget the finished jobs")
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_usage(sys.stderr)
+        return EXIT_USAGE
+
+    enable_color = os.environ.get("PITIVI_DEBUG_NO_COLOR", "0") not in ("", "1")
+    loggable.init("PITIVI_DEBUG", enable_color, "GST_DEBUG" in os.environ)
+
+    render_queue = RenderQueue()
+    if args.command == "add":
+        job = render_queue.add(args.project, args.output, args.profile)
+        render_queue.report("job-added", job=job["id"])
+    elif args.command == "list":
+        for job in render_queue.jobs:
+            print(json.dumps(job), flush=True)
+    elif args.command == "run":
+        if not render_queue.run(args.jobs):
+            return EXIT_FAILURE
+    elif args.command == "clear":
+        render_queue.clear()
+    return EXIT_SUCCESS
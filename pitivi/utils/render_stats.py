@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Throughput metrics and time estimation of the renders."""
+import bisect
+import collections
+import json
+import os
+import time
+
+from gi.repository import Gst
+
+from pitivi.utils.loggable import Loggable
+
+# The duration of the moving window over which the throughput is measured,
+# in seconds.
+WINDOW = 10
+
+# The number of render logs kept, the oldest ones are removed.
+MAX_RENDER_LOGS = 20
+
+# The position is the rendered duration, the cost the cost of rendering it.
+Sample = collections.namedtuple("Sample", ["time", "position", "cost", "size"])
+
+
+def complexity_profile(ges_timeline):
+    """Computes how hard it is to render each region of the timeline.
+
+    The cost of rendering a region is proportional to the number of clips
+    and effects active in it, and at least 1 for the gaps.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline.
+
+    Returns:
+        Tuple[List[int], List[float]]: The boundaries of the regions and the
+        cumulative cost of rendering the timeline until each boundary.
+    """
+    changes = collections.defaultdict(int)
+    for ges_layer in ges_timeline.get_layers():
+        for ges_clip in ges_layer.get_clips():
+            cost = 1 + len(ges_clip.get_top_effects())
+            changes[ges_clip.props.start] += cost
+            changes[ges_clip.props.start + ges_clip.props.duration] -= cost
+
+    duration = ges_timeline.props.duration
+    boundaries = sorted(position for position in set(changes) | {0, duration}
+                        if position <= duration)
+    cumulative = [0.0]
+    active = 0
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        active += changes.get(start, 0)
+        cumulative.append(cumulative[-1] + max(1, active) * (end - start) / Gst.SECOND)
+    return boundaries, cumulative
+
+
+def prune_render_logs(logs_dir, keep=MAX_RENDER_LOGS):
+    """Removes the oldest render logs.
+
+    Args:
+        logs_dir (str): The dir containing the logs.
+        keep (int): The number of logs to be kept.
+    """
+    try:
+        paths = [os.path.join(logs_dir, name) for name in os.listdir(logs_dir)
+                 if name.endswith(".log")]
+        paths.sort(key=os.path.getmtime)
+    except OSError:
+        return
+    for path in paths[:max(0, len(paths) - keep)]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class RenderStats(Loggable):
+    """Measures the throughput of a render and estimates when it ends.
+
+    The throughput is measured over a moving window. The ETA takes into
+    account that the regions of the timeline with more clips and effects
+    take longer to render.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline being rendered.
+        framerate (Gst.Fraction): The framerate of the render.
+        log_path (Optional[str]): The file where to log the measurements
+            as JSON lines.
+
+    Attributes:
+        fps (Optional[float]): The number of frames rendered per second.
+        realtime_factor (Optional[float]): The duration of the timeline
+            rendered per second.
+        bitrate (Optional[float]): The number of bits written per second of
+            the timeline.
+    """
+
+    def __init__(self, ges_timeline, framerate, log_path=None):
+        Loggable.__init__(self)
+        self.duration = ges_timeline.props.duration
+        self.framerate = framerate
+        self.fps = None
+        self.realtime_factor = None
+        self.bitrate = None
+
+        self.__boundaries, self.__cumulative = complexity_profile(ges_timeline)
+        self.__samples = collections.deque()
+        self.__started = time.monotonic()
+        self.__log_file = None
+        if log_path:
+            try:
+                self.__log_file = open(log_path, "w", encoding="UTF-8")
+            except OSError as e:
+                self.warning("Cannot write the render log %s: %s", log_path, e)
+
+    def cost(self, position):
+        """Gets the cost of rendering the timeline until the position."""
+        index = bisect.bisect_right(self.__boundaries, position) - 1
+        if index >= len(self.__boundaries) - 1:
+            return self.__cumulative[-1]
+        start = self.__boundaries[index]
+        end = self.__boundaries[index + 1]
+        region_cost = self.__cumulative[index + 1] - self.__cumulative[index]
+        return self.__cumulative[index] + region_cost * (position - start) / (end - start)
+
+    def add_sample(self, position, size=None, now=None):
+        """Updates the metrics.
+
+        Args:
+            position (int): The position of the render in the timeline.
+            size (Optional[int]): The size of the output file.
+            now (Optional[float]): The monotonic time of the measurement.
+        """
+        self.__add_sample(position, self.cost(position), size, now)
+
+    def add_ranges_sample(self, ranges, size=None, now=None):
+        """Updates the metrics of a render done in several ranges.
+
+        Args:
+            ranges (List[Tuple[int, int]]): The start of each range in the
+                timeline and how much of it has been rendered.
+            size (Optional[int]): The size of the output.
+            now (Optional[float]): The monotonic time of the measurement.
+        """
+        rendered = sum(position for unused_start, position in ranges)
+        cost = sum(self.cost(start + position) - self.cost(start)
+                   for start, position in ranges)
+        self.__add_sample(rendered, cost, size, now)
+
+    def __add_sample(self, position, cost, size, now):
+        if now is None:
+            now = time.monotonic()
+        self.__samples.append(Sample(now, position, cost, size))
+        while len(self.__samples) > 2 and now - self.__samples[1].time >= WINDOW:
+            self.__samples.popleft()
+
+        first = self.__samples[0]
+        elapsed = now - first.time
+        if elapsed <= 0:
+            return
+        rendered = (position - first.position) / Gst.SECOND
+        self.realtime_factor = rendered / elapsed
+        self.fps = self.realtime_factor * self.framerate.num / self.framerate.denom
+        if size is not None and first.size is not None and rendered > 0:
+            self.bitrate = (size - first.size) * 8 / rendered
+        self.__log(now, position)
+
+    def reset(self):
+        """Forgets the measurements, for example when resuming the render."""
+        self.__samples.clear()
+
+    def eta(self):
+        """Estimates how long it takes to render the rest of the timeline.
+
+        Returns:
+            Optional[float]: The number of seconds, or None if unknown.
+        """
+        if len(self.__samples) < 2:
+            return None
+        first = self.__samples[0]
+        last = self.__samples[-1]
+        rendered_cost = last.cost - first.cost
+        elapsed = last.time - first.time
+        if rendered_cost <= 0 or elapsed <= 0:
+            return None
+        remaining_cost = self.cost(self.duration) - last.cost
+        return remaining_cost * elapsed / rendered_cost
+
+    def close(self):
+        """Closes the render log."""
+        if self.__log_file:
+            self.__log_file.close()
+            self.__log_file = None
+
+    def __log(self, now, position):
+        if not self.__log_file:
+            return
+        entry = {"time": round(now - self.__started, 3),
+                 "position": position,
+                 "duration": self.duration,
+                 "fps": self.fps,
+                 "realtime-factor": self.realtime_factor,
+                 "bitrate": self.bitrate,
+                 "eta": self.eta()}
+        self.__log_file.write(json.dumps(entry) + "\n")
+        self.__log_file.flush()
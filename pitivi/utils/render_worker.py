@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Rendering of a project file without UI.
+
+Run as `pitivi --render PROJECT -o OUTPUT [--profile TARGET]`, or as
+`python3 -m pitivi.utils.render_worker` in the worker processes started by
+the app. Several outputs can be rendered in a single pass over the
+timeline. The progress is printed on stdout as JSON lines.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+
+import gi
+# The worker process is not started by the launcher, which takes care of
+# the versions when the module is imported by the app.
+gi.require_version("Gst", "1.0")
+gi.require_version("GstPbutils", "1.0")
+gi.require_version("GES", "1.0")
+
+# pylint: disable=wrong-import-position
+from gi.repository import GES  # noqa
+from gi.repository import Gio  # noqa
+from gi.repository import GLib  # noqa
+from gi.repository import GObject  # noqa
+from gi.repository import Gst  # noqa
+from gi.repository import GstPbutils  # noqa
+
+from pitivi.utils import loggable  # noqa
+from pitivi.utils.loggable import Loggable  # noqa
+
+# How often the progress is reported, in milliseconds.
+PROGRESS_INTERVAL = 500
+
+# The exit statuses of the render.
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+
+
+def to_uri(path_or_uri):
+    """Gets the URI of the specified file, unless it's already a URI."""
+    if Gst.uri_is_valid(path_or_uri):
+        return path_or_uri
+    return Gst.filename_to_uri(os.path.abspath(path_or_uri))
+
+
+def load_encoding_profile(target):
+    """Loads the first profile of an encoding target.
+
+    Args:
+        target (str): The .gep file, or the name of an encoding target
+            installed on the system or saved by the user.
+
+    Returns:
+        Optional[GstPbutils.EncodingProfile]: The container profile.
+    """
+    try:
+        if os.path.isfile(target):
+            encoding_target = GstPbutils.EncodingTarget.load_from_file(target)
+        else:
+            encoding_target = GstPbutils.EncodingTarget.load(target, None)
+    except GLib.Error:
+        return None
+    profiles = encoding_target.get_profiles() if encoding_target else []
+    return profiles[0] if profiles else None
+
+
+def create_tee_pipeline(ges_timeline, outputs):
+    """Creates a pipeline encoding the timeline in several files at once.
+
+    The composited stream of each track is split with a tee, so the
+    timeline is decoded and composited only once for all the outputs.
+    Each encodebin scales its streams independently, according to the
+    restriction caps of its profile.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline to be rendered.
+        outputs (List[Tuple[str, GstPbutils.EncodingContainerProfile]]): The
+            URIs of the files to be written and their profiles.
+
+    Returns:
+        Gst.Pipeline: The pipeline.
+
+    Raises:
+        ValueError: If an output cannot be created.
+    """
+    pipeline = Gst.Pipeline.new("multi-output-render")
+    pipeline.add(ges_timeline)
+
+    tees = {}
+    for track in ges_timeline.get_tracks():
+        pad = ges_timeline.get_pad_for_track(track)
+        if not pad:
+            continue
+        tee = Gst.ElementFactory.make("tee", None)
+        # An output might not need all the tracks.
+        tee.props.allow_not_linked = True
+        pipeline.add(tee)
+        pad.link(tee.get_static_pad("sink"))
+        tees[track.props.track_type] = tee
+
+    for output_uri, container_profile in outputs:
+        encodebin = Gst.ElementFactory.make("encodebin", None)
+        encodebin.props.profile = container_profile
+        try:
+            sink = Gst.Element.make_from_uri(Gst.URIType.SINK, output_uri, None)
+        except GLib.Error as e:
+            raise ValueError("Cannot write %s: %s" % (output_uri, e.message))
+        pipeline.add(encodebin)
+        pipeline.add(sink)
+        encodebin.link(sink)
+
+        for profile in container_profile.get_profiles():
+            if not profile.is_enabled():
+                continue
+            if isinstance(profile, GstPbutils.EncodingVideoProfile):
+                track_type, template = GES.TrackType.VIDEO, "video_%u"
+            elif isinstance(profile, GstPbutils.EncodingAudioProfile):
+                track_type, template = GES.TrackType.AUDIO, "audio_%u"
+            else:
+                continue
+            tee = tees.get(track_type)
+            if not tee:
+                raise ValueError("The timeline has no %s track for %s" %
+                                 (track_type.value_nick, output_uri))
+
+            encodebin_pad = encodebin.get_request_pad(template)
+            if not encodebin_pad:
+                raise ValueError("Unusable encoding profile for %s" % output_uri)
+            queue = Gst.ElementFactory.make("queue", None)
+            pipeline.add(queue)
+            tee.get_request_pad("src_%u").link(queue.get_static_pad("sink"))
+            queue.get_static_pad("src").link(encodebin_pad)
+
+    return pipeline
+
+
+class RangeRenderer(Loggable):
+    """Renders a range of a project file.
+
+    A single output is rendered with a GES.Pipeline. Several outputs are
+    rendered with a pipeline created by `create_tee_pipeline`.
+
+    Args:
+        project_uri (str): The project file to be rendered.
+        outputs (List[Tuple[str, Optional[GstPbutils.EncodingContainerProfile]]]):
+            The URIs of the files where to write the result, and their
+            profiles. The first profile saved in the project is used when
+            a profile is not set.
+        start (Optional[int]): The start of the range to be rendered, in ns.
+        stop (Optional[int]): The end of the range to be rendered, in ns.
+            The end of the timeline if not set.
+
+    Attributes:
+        error (Optional[str]): Why the render failed, if it failed.
+    """
+
+    def __init__(self, project_uri, outputs, start=0, stop=None):
+        Loggable.__init__(self)
+        self.project_uri = project_uri
+        self.outputs = outputs
+        self.start = start
+        self.stop = stop
+        self.error = None
+
+        self.__project = None
+        self.__pipeline = None
+        self.__mainloop = None
+        self.__seeked = False
+
+    def run(self):
+        """Renders the range and waits until done.
+
+        Returns:
+            bool: Whether the range has been rendered.
+        """
+        self.__mainloop = GLib.MainLoop()
+        self.__project = GES.Project.new(self.project_uri)
+        self.__project.connect("loaded", self.__loaded_cb)
+        self.__project.connect("error-loading-asset",
+                               self.__error_loading_asset_cb)
+        try:
+            self.__project.extract()
+        except GLib.Error as e:
+            self.__fail(e.message)
+            return False
+        if not self.error:
+            self.__mainloop.run()
+        if self.__pipeline:
+            self.__pipeline.set_state(Gst.State.NULL)
+        return self.error is None
+
+    @staticmethod
+    def report(event, **kwargs):
+        """Prints the specified event as a JSON line on stdout."""
+        kwargs["event"] = event
+        print(json.dumps(kwargs), flush=True)
+
+    def __fail(self, message):
+        self.error = message
+        self.report("error", message=message)
+        if self.__mainloop and self.__mainloop.is_running():
+            self.__mainloop.quit()
+
+    def __error_loading_asset_cb(self, unused_project, error, asset_id,
+                                 unused_type):
+        self.__fail("Failed loading %s: %s" % (asset_id, error.message))
+
+    def __loaded_cb(self, unused_project, ges_timeline):
+        if self.error:
+            return
+        if self.stop is None:
+            self.stop = ges_timeline.props.duration
+        if self.stop <= self.start:
+            self.__fail("Nothing to render")
+            return
+
+        outputs = []
+        for output_uri, container_profile in self.outputs:
+            if not container_profile:
+                profiles = self.__project.list_encoding_profiles()
+                if not profiles:
+                    self.__fail("The project has no encoding profile")
+                    return
+                container_profile = profiles[0]
+            outputs.append((output_uri, container_profile))
+
+        if len(outputs) == 1:
+            output_uri, container_profile = outputs[0]
+            self.__pipeline = GES.Pipeline()
+            self.__pipeline.set_timeline(ges_timeline)
+            if not self.__pipeline.set_render_settings(output_uri,
+                                                       container_profile):
+                self.__fail("Unusable encoding profile")
+                return
+            self.__pipeline.set_mode(GES.PipelineFlags.RENDER)
+        else:
+            ges_timeline.commit()
+            try:
+                self.__pipeline = create_tee_pipeline(ges_timeline, outputs)
+            except ValueError as e:
+                self.__fail(str(e))
+                return
+
+        bus = self.__pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.__bus_message_cb)
+        self.__pipeline.set_state(Gst.State.PAUSED)
+        GLib.timeout_add(PROGRESS_INTERVAL, self.__report_progress_cb)
+
+    def __bus_message_cb(self, unused_bus, message):
+        if message.type == Gst.MessageType.ASYNC_DONE and not self.__seeked:
+            self.__seeked = True
+            # Limit the render to the range.
+            self.__pipeline.seek(1.0, Gst.Format.TIME,
+                                 Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                                 Gst.SeekType.SET, self.start,
+                                 Gst.SeekType.SET, self.stop)
+            self.__pipeline.set_state(Gst.State.PLAYING)
+        elif message.type == Gst.MessageType.EOS:
+            self.report("progress", position=self.stop - self.start,
+                        duration=self.stop - self.start)
+            self.report("done")
+            self.__mainloop.quit()
+        elif message.type == Gst.MessageType.ERROR:
+            error, unused_details = message.parse_error()
+            self.__fail(error.message)
+
+    def __report_progress_cb(self):
+        if not self.__mainloop.is_running():
+            return False
+        res, position = self.__pipeline.query_position(Gst.Format.TIME)
+        if res and self.__seeked:
+            position = min(max(position - self.start, 0), self.stop - self.start)
+            self.report("progress", position=position,
+                        duration=self.stop - self.start)
+        return True
+
+
+class RenderProcess(GObject.Object, Loggable):
+    """A worker process rendering a project file.
+
+    Args:
+        args (List[str]): The command line arguments of the worker.
+
+    Attributes:
+        error (Optional[str]): Why the render failed, if it failed.
+
+    Signals:
+        event: The worker reported an event. The argument is a dict with
+            the "event" name and its details.
+        exited: The worker exited. The argument is whether the render
+            succeeded.
+    """
+
+    __gsignals__ = {
+        "event": (GObject.SIGNAL_RUN_LAST, None, (object,)),
+        "exited": (GObject.SIGNAL_RUN_LAST, None, (bool,)),
+    }
+
+    def __init__(self, args):
+        GObject.Object.__init__(self)
+        Loggable.__init__(self)
+        self.argv = [sys.executable, "-m", "pitivi.utils.render_worker"] + args
+        self.error = None
+
+        self.__process = None
+        self.__cancellable = Gio.Cancellable()
+        self.__paused = False
+
+    @property
+    def running(self):
+        """Whether the worker process is running."""
+        return self.__process is not None
+
+    @property
+    def pid(self):
+        """The ID of the worker process, or None if it is not running."""
+        if not self.__process:
+            return None
+        identifier = self.__process.get_identifier()
+        return int(identifier) if identifier else None
+
+    def start(self):
+        """Starts the worker process.
+
+        Returns:
+            bool: Whether the process started.
+        """
+        launcher = Gio.SubprocessLauncher.new(Gio.SubprocessFlags.STDOUT_PIPE)
+        # The launcher of the app sets up the module search path.
+        launcher.setenv("PYTHONPATH", os.pathsep.join(sys.path), True)
+        try:
+            self.__process = launcher.spawnv(self.argv)
+        except GLib.Error as e:
+            self.error = e.message
+            return False
+
+        stream = Gio.DataInputStream.new(self.__process.get_stdout_pipe())
+        stream.read_line_async(GLib.PRIORITY_DEFAULT, self.__cancellable,
+                               self.__line_read_cb)
+        self.__process.wait_async(self.__cancellable, self.__exited_cb)
+        return True
+
+    def set_paused(self, paused):
+        """Suspends or resumes the worker process."""
+        if self.__process and paused != self.__paused:
+            self.__paused = paused
+            self.__process.send_signal(signal.SIGSTOP if paused
+                                       else signal.SIGCONT)
+
+    def cancel(self):
+        """Kills the worker process."""
+        self.__cancellable.cancel()
+        if self.__process:
+            self.set_paused(False)
+            self.__process.force_exit()
+            self.__process = None
+
+    def __line_read_cb(self, stream, result):
+        try:
+            line, unused_length = stream.read_line_finish_utf8(result)
+        except GLib.Error as e:
+            if not e.matches(Gio.io_error_quark(), Gio.IOErrorEnum.CANCELLED):
+                self.warning("Failed reading the worker output: %s", e)
+            return
+        if line is None:
+            # The worker exited.
+            return
+
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.warning("Unexpected worker output: %s", line)
+        else:
+            if event.get("event") == "error":
+                self.error = event.get("message")
+            self.emit("event", event)
+
+        stream.read_line_async(GLib.PRIORITY_DEFAULT, self.__cancellable,
+                               self.__line_read_cb)
+
+    def __exited_cb(self, process, result):
+        try:
+            process.wait_finish(result)
+        except GLib.Error:
+            # Cancelled.
+            return
+        self.__process = None
+        success = process.get_if_exited() and \
+            process.get_exit_status() == EXIT_SUCCESS
+        if not success and not self.error:
+            self.error = "The render process failed"
+        self.emit("exited", success)
+
+
+def create_parser(prog=None):
+    """Creates the parser of the render command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Renders a Pitivi project without UI.")
+    parser.add_argument("project", help="the project file")
+    parser.add_argument("-o", "--output", required=True, action="append",
+                        help="the file to be written; repeat to write "
+                        "several files in a single pass")
+    parser.add_argument("--profile", action="append", default=[],
+                        help="the .gep encoding target file or the name of "
+                        "an encoding target, for each output in the same "
+                        "order; by default the profile saved in the project")
+    parser.add_argument("--start", type=int, default=0,
+                        help="the start of the range, in nanoseconds")
+    parser.add_argument("--stop", type=int, default=None,
+                        help="the end of the range, in nanoseconds")
+    parser.add_argument("--nice", type=int, default=0,
+                        help="how much to lower the priority of the process")
+    return parser
+
+
+def main(argv, prog=None):
+    """Renders the project specified on the command line.
+
+    The modules must have been initialized.
+
+    Returns:
+        int: The exit status of the process.
+    """
+    args = create_parser(prog).parse_args(argv)
+
+    enable_color = os.environ.get("PITIVI_DEBUG_NO_COLOR", "0") not in ("", "1")
+    loggable.init("PITIVI_DEBUG", enable_color, "GST_DEBUG" in os.environ)
+    if args.nice > 0:
+        os.nice(args.nice)
+
+    if len(args.profile) > len(args.output):
+        RangeRenderer.report("error", message="More profiles than outputs")
+        return EXIT_USAGE
+    outputs = []
+    for i, output in enumerate(args.output):
+        container_profile = None
+        if i < len(args.profile):
+            container_profile = load_encoding_profile(args.profile[i])
+            if not container_profile:
+                RangeRenderer.report("error",
+                                     message="Cannot load %s" % args.profile[i])
+                return EXIT_USAGE
+        outputs.append((to_uri(output), container_profile))
+
+    renderer = RangeRenderer(to_uri(args.project), outputs, args.start,
+                             args.stop)
+    return EXIT_SUCCESS if renderer.run() else EXIT_FAILURE
+
+
+if __name__ == "__main__":
+    from pitivi.check import initialize_modules
+    initialize_modules(headless=True)
+    sys.exit(main(sys.argv[1:]))
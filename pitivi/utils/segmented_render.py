@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Rendering of a project in segments, in parallel processes."""
+import itertools
+import os
+import shutil
+import tempfile
+
+from gi.repository import GES
+from gi.repository import GLib
+from gi.repository import GObject
+from gi.repository import Gst
+from gi.repository import GstPbutils
+
+from pitivi.settings import GlobalSettings
+from pitivi.utils.loggable import Loggable
+from pitivi.utils.render_worker import RenderProcess
+
+GlobalSettings.addConfigSection("render")
+GlobalSettings.addConfigOption("renderWorkers",
+                               section="render",
+                               key="workers",
+                               default=1)
+
+# Segments shorter than this are not worth a separate process.
+MIN_SEGMENT_DURATION = 5 * Gst.SECOND
+
+# Makes the names of the encoder presets unique, as several renders can
+# run at the same time.
+_preset_ids = itertools.count()
+
+
+def snap_to_frame(position, framerate):
+    """Rounds the specified position to the closest frame boundary."""
+    frame = Gst.util_uint64_scale_round(position, framerate.num,
+                                        framerate.denom * Gst.SECOND)
+    return Gst.util_uint64_scale_round(frame, framerate.denom * Gst.SECOND,
+                                       framerate.num)
+
+
+def split_timeline(ges_timeline, count, framerate):
+    """Splits the timeline in ranges which can be rendered separately.
+
+    The ranges are cut preferably where clips start or end, but never
+    inside transitions, so the cuts are not visible in the result.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline to be rendered.
+        count (int): The max number of ranges.
+        framerate (Gst.Fraction): The framerate of the render.
+
+    Returns:
+        List[Tuple[int, int]]: The (start, stop) ranges covering the
+        timeline.
+    """
+    duration = ges_timeline.props.duration
+    count = max(1, min(count, duration // MIN_SEGMENT_DURATION))
+
+    transitions = []
+    cut_points = set()
+    for ges_layer in ges_timeline.get_layers():
+        for ges_clip in ges_layer.get_clips():
+            start = ges_clip.props.start
+            end = start + ges_clip.props.duration
+            if isinstance(ges_clip, GES.TransitionClip):
+                transitions.append((start, end))
+            else:
+                cut_points.update((start, end))
+    cut_points = [position for position in cut_points
+                  if 0 < position < duration]
+    # No cut inside a transition, which needs both its clips.
+    cut_points = [position for position in cut_points
+                  if not any(start < position < end for start, end in transitions)]
+
+    boundaries = [0]
+    # How far from the ideal position a cut point can be.
+    tolerance = duration // count // 2
+    for i in range(1, count):
+        position = duration * i // count
+        if cut_points:
+            cut_point = min(cut_points, key=lambda point: abs(point - position))
+            if abs(cut_point - position) <= tolerance:
+                position = cut_point
+        position = snap_to_frame(position, framerate)
+        if boundaries[-1] < position < duration:
+            boundaries.append(position)
+    boundaries.append(duration)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def save_encoding_target(project, container_profile, path):
+    """Saves the profile and the encoder settings for the render workers.
+
+    The encoder settings are saved in presets referenced by the profiles,
+    the same way `Project.save` does it. The presets should be removed with
+    `remove_encoder_presets` once the render is over.
+
+    Args:
+        project (Project): The project holding the encoder settings.
+        container_profile (GstPbutils.EncodingContainerProfile): The profile.
+        path (str): The .gep file to be written.
+
+    Returns:
+        List[Tuple[Gst.Preset, str]]: The encoders and the names of the
+        presets saved for them.
+    """
+    presets = []
+    old_presets = []
+    for profile in container_profile.get_profiles():
+        if isinstance(profile, GstPbutils.EncodingVideoProfile):
+            settings = project.vcodecsettings
+        elif isinstance(profile, GstPbutils.EncodingAudioProfile):
+            settings = project.acodecsettings
+        else:
+            continue
+        encoder = Gst.ElementFactory.make(profile.get_preset_name(), None)
+        if not isinstance(encoder, Gst.Preset):
+            continue
+        for prop, value in settings.items():
+            encoder.set_property(prop, value)
+        preset = "render_settings_%d_%d" % (os.getpid(), next(_preset_ids))
+        if encoder.save_preset(preset):
+            old_presets.append((profile, profile.get_preset()))
+            profile.set_preset(preset)
+            presets.append((encoder, preset))
+
+    target = GstPbutils.EncodingTarget.new("pitivi-render", "device", "",
+                                           [container_profile])
+    try:
+        target.save_to_file(path)
+    except GLib.Error:
+        remove_encoder_presets(presets)
+        raise
+    finally:
+        # The profile is also used by the dialog, keep it unchanged.
+        for profile, old_preset in old_presets:
+            profile.set_preset(old_preset)
+    return presets
+
+
+def remove_encoder_presets(presets):
+    """Removes the presets saved by `save_encoding_target`.
+
+    Args:
+        presets (List[Tuple[Gst.Preset, str]]): The encoders and the names
+            of their presets.
+    """
+    for encoder, preset in presets:
+        encoder.delete_preset(preset)
+
+
+class RenderSegment(object):
+    """A range of the timeline rendered by a worker process.
+
+    Attributes:
+        start (int): The start of the range.
+        stop (int): The end of the range.
+        path (str): The file where the range is rendered.
+        position (int): How much of the range has been rendered.
+        done (bool): Whether the range has been rendered successfully.
+    """
+
+    def __init__(self, start, stop, path):
+        self.start = start
+        self.stop = stop
+        self.path = path
+        self.position = 0
+        self.done = False
+        self.process = None
+
+
+class SegmentedRender(GObject.Object, Loggable):
+    """Renders the timeline in segments, by parallel worker processes.
+
+    The project is saved in a temporary snapshot. Each range of the
+    timeline is rendered by a `render_worker` process from the snapshot,
+    so edits done meanwhile do not affect the render. The segments are
+    finally joined without being re-encoded. A single worker renders the
+    timeline directly in the output file.
+
+    Args:
+        project (Project): The project to be rendered.
+        output_uri (str): The URI of the file to be written.
+        container_profile (GstPbutils.EncodingContainerProfile): The profile
+            of the output file.
+
+    Attributes:
+        segments (List[RenderSegment]): The ranges being rendered.
+
+    Signals:
+        progress: The rendered duration and the total duration changed.
+        done: The output file has been written.
+        error: The render failed. The argument is the reason.
+    """
+
+    __gsignals__ = {
+        "progress": (GObject.SIGNAL_RUN_LAST, None,
+                     (GObject.TYPE_UINT64, GObject.TYPE_UINT64)),
+        "done": (GObject.SIGNAL_RUN_LAST, None, ()),
+        "error": (GObject.SIGNAL_RUN_LAST, None, (str,)),
+    }
+
+    def __init__(self, project, output_uri, container_profile):
+        GObject.Object.__init__(self)
+        Loggable.__init__(self)
+        self.project = project
+        self.output_uri = output_uri
+        self.container_profile = container_profile
+        self.segments = []
+
+        self.__temp_dir = None
+        # The encoder presets saved for the render workers.
+        self.__presets = []
+        self.__concat_pipeline = None
+        self.__muxer = None
+        self.__paused = False
+
+    @property
+    def duration(self):
+        """The duration of the timeline being rendered."""
+        return sum(segment.stop - segment.start for segment in self.segments)
+
+    @property
+    def rendered_ranges(self):
+        """The start of each range and how much of it has been rendered."""
+        return [(segment.start, segment.position) for segment in self.segments]
+
+    def start(self, workers, niceness=0):
+        """Starts the worker processes.
+
+        Args:
+            workers (int): The number of worker processes.
+            niceness (Optional[int]): How much to lower the priority of the
+                worker processes.
+
+        Returns:
+            bool: Whether the render started. False if the timeline is too
+            short to be split in several segments or if the snapshot could
+            not be saved, in which case it should be rendered normally.
+        """
+        ranges = split_timeline(self.project.ges_timeline, workers,
+                                self.project.videorate)
+        if workers > 1 and len(ranges) < 2:
+            self.info("The timeline is too short to be split")
+            return False
+        if len(ranges) > 1 and not self.container_profile.get_preset_name():
+            self.info("No muxer to join the segments")
+            return False
+
+        output_path = Gst.uri_get_location(self.output_uri)
+        try:
+            # Use the same disk as the output file, which must have room
+            # for the segments anyway.
+            self.__temp_dir = tempfile.mkdtemp(
+                prefix=".pitivi-render-", dir=os.path.dirname(output_path))
+        except OSError:
+            self.__temp_dir = tempfile.mkdtemp(prefix="pitivi-render-")
+
+        # Render what the timeline currently contains.
+        self.project.pipeline.commit_scheduler.flush()
+        snapshot_uri = Gst.filename_to_uri(
+            os.path.join(self.__temp_dir, "project.xges"))
+        profile_path = os.path.join(self.__temp_dir, "profile.gep")
+        try:
+            saved = self.project.save(self.project.ges_timeline, snapshot_uri,
+                                      None, overwrite=True)
+            self.__presets = save_encoding_target(
+                self.project, self.container_profile, profile_path)
+        except (GLib.Error, OSError) as e:
+            self.warning("Failed preparing the segmented render: %s", e)
+            saved = False
+        if not saved:
+            self.__remove_temp_files()
+            return False
+
+        extension = os.path.splitext(output_path)[1]
+        for index, (start, stop) in enumerate(ranges):
+            if len(ranges) == 1:
+                path = output_path
+            else:
+                path = os.path.join(self.__temp_dir,
+                                    "segment-%04d%s" % (index, extension))
+            segment = RenderSegment(start, stop, path)
+            self.segments.append(segment)
+            segment.process = RenderProcess(
+                ["--start", str(start), "--stop", str(stop),
+                 "--nice", str(niceness),
+                 "--profile", profile_path, "--output", path, snapshot_uri])
+            segment.process.connect("event", self.__event_cb, segment)
+            segment.process.connect("exited", self.__exited_cb, segment)
+        self.info("Rendering %d segments: %s", len(ranges), ranges)
+        for segment in self.segments:
+            if not segment.process.start():
+                self.warning("Failed starting a render process: %s",
+                             segment.process.error)
+                self.cancel()
+                return False
+        return True
+
+    def set_paused(self, paused):
+        """Suspends or resumes the render."""
+        self.__paused = paused
+        for segment in self.segments:
+            if segment.process:
+                segment.process.set_paused(paused)
+        if self.__concat_pipeline:
+            self.__concat_pipeline.set_state(Gst.State.PAUSED if paused
+                                             else Gst.State.PLAYING)
+
+    def cancel(self):
+        """Stops the render and removes the temporary files."""
+        for segment in self.segments:
+            if segment.process:
+                segment.process.disconnect_by_func(self.__event_cb)
+                segment.process.disconnect_by_func(self.__exited_cb)
+                segment.process.cancel()
+                segment.process = None
+        self.__stop_concatenation()
+        self.__remove_temp_files()
+
+    def __remove_temp_files(self):
+        if self.__temp_dir:
+            shutil.rmtree(self.__temp_dir, ignore_errors=True)
+            self.__temp_dir = None
+        remove_encoder_presets(self.__presets)
+        self.__presets = []
+
+    def __event_cb(self, unused_process, event, segment):
+        if event.get("event") == "progress":
+            segment.position = event["position"]
+            self.emit("progress",
+                      sum(segment.position for segment in self.segments),
+                      self.duration)
+
+    def __exited_cb(self, process, success, segment):
+        if not success:
+            self.__fail(segment, process.error)
+            return
+
+        segment.done = True
+        segment.process = None
+        self.debug("Rendered %s", segment.path)
+        if not all(segment.done for segment in self.segments):
+            return
+        if len(self.segments) == 1:
+            self.__remove_temp_files()
+            self.info("Rendered %s", self.output_uri)
+            self.emit("done")
+        else:
+            self.__concatenate()
+
+    def __fail(self, segment, message):
+        self.error("Failed rendering %s: %s", segment.path, message)
+        self.cancel()
+        self.emit("error", message)
+
+    def __concatenate(self):
+        """Joins the rendered segments into the output file."""
+        pipeline = Gst.Pipeline.new("concat-segments")
+        src = Gst.ElementFactory.make("splitmuxsrc", None)
+        muxer_name = self.container_profile.get_preset_name()
+        muxer = Gst.ElementFactory.make(muxer_name, None) if muxer_name else None
+        sink = Gst.ElementFactory.make("filesink", None)
+        if not src or not muxer or not sink:
+            self.__fail(self.segments[0], "Cannot join the segments")
+            return
+
+        # The segments are sorted by name.
+        extension = os.path.splitext(self.segments[0].path)[1]
+        src.props.location = os.path.join(self.__temp_dir,
+                                          "segment-*%s" % extension)
+        sink.props.location = Gst.uri_get_location(self.output_uri)
+        for element in (src, muxer, sink):
+            pipeline.add(element)
+        muxer.link(sink)
+        src.connect("pad-added", self.__concat_pad_added_cb)
+
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.__concat_bus_message_cb)
+        self.__concat_pipeline = pipeline
+        self.__muxer = muxer
+        pipeline.set_state(Gst.State.PAUSED if self.__paused
+                           else Gst.State.PLAYING)
+
+    def __concat_pad_added_cb(self, unused_src, pad):
+        # Called in a streaming thread.
+        queue = Gst.ElementFactory.make("queue", None)
+        self.__concat_pipeline.add(queue)
+        queue.sync_state_with_parent()
+        pad.link(queue.get_static_pad("sink"))
+        caps = pad.get_current_caps() or pad.query_caps(None)
+        queue_pad = queue.get_static_pad("src")
+        muxer_pad = self.__muxer.get_compatible_pad(queue_pad, caps)
+        if not muxer_pad or queue_pad.link(muxer_pad) != Gst.PadLinkReturn.OK:
+            self.warning("Cannot mux the stream %s", caps)
+
+    def __concat_bus_message_cb(self, unused_bus, message):
+        if message.type == Gst.MessageType.EOS:
+            self.__stop_concatenation()
+            self.__remove_temp_files()
+            self.info("Rendered %s", self.output_uri)
+            self.emit("done")
+        elif message.type == Gst.MessageType.ERROR:
+            error, unused_details = message.parse_error()
+            self.__fail(self.segments[0], error.message)
+
+    def __stop_concatenation(self):
+        if not self.__concat_pipeline:
+            return
+        bus = self.__concat_pipeline.get_bus()
+        bus.disconnect_by_func(self.__concat_bus_message_cb)
+        bus.remove_signal_watch()
+        self.__concat_pipeline.set_state(Gst.State.NULL)
+        self.__concat_pipeline = None
+        self.__muxer = None
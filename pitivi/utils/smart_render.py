@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Detection of the parts of the timeline which need no re-encoding."""
+import collections
+
+from gi.repository import GES
+from gi.repository import GstPbutils
+
+# The values of the child properties of the sources which leave the
+# decoded frames or samples untouched. The video size is checked separately.
+NEUTRAL_CHILD_PROPERTIES = {
+    GES.VideoSource: {"posx": 0, "posy": 0, "alpha": 1.0},
+    GES.AudioSource: {"volume": 1.0},
+}
+
+
+def _stream_matches(stream_info, profile):
+    caps = stream_info.get_caps()
+    return bool(caps) and caps.can_intersect(profile.get_format())
+
+
+def source_matches_profile(asset, project, container_profile):
+    """Checks whether the streams of the asset can be copied in the output.
+
+    Args:
+        asset (GES.UriClipAsset): The asset of a clip.
+        project (Project): The project defining the render settings.
+        container_profile (GstPbutils.EncodingContainerProfile): The profile
+            of the output.
+
+    Returns:
+        bool: Whether the asset has an encoded stream matching each of the
+        profiles of the output.
+    """
+    info = asset.get_info()
+    if not info:
+        return False
+
+    for profile in container_profile.get_profiles():
+        if not profile.is_enabled():
+            continue
+        if isinstance(profile, GstPbutils.EncodingVideoProfile):
+            streams = info.get_video_streams()
+            if len(streams) != 1:
+                return False
+            stream = streams[0]
+            if stream.get_width() != project.videowidth or \
+                    stream.get_height() != project.videoheight or \
+                    stream.get_framerate_num() != project.videorate.num or \
+                    stream.get_framerate_denom() != project.videorate.denom:
+                return False
+        elif isinstance(profile, GstPbutils.EncodingAudioProfile):
+            streams = info.get_audio_streams()
+            if len(streams) != 1:
+                return False
+            stream = streams[0]
+            if stream.get_sample_rate() != project.audiorate or \
+                    stream.get_channels() != project.audiochannels:
+                return False
+        else:
+            return False
+
+        if not _stream_matches(stream, profile):
+            return False
+
+    return True
+
+
+def is_unmodified(ges_clip, project):
+    """Checks whether the clip plays its source as it is.
+
+    Args:
+        ges_clip (GES.Clip): The clip to be checked.
+        project (Project): The project defining the video size.
+
+    Returns:
+        bool: Whether the clip has no effects, no keyframes and no
+        transformations.
+    """
+    if not isinstance(ges_clip, GES.UriClip) or ges_clip.get_top_effects():
+        return False
+
+    for track_element in ges_clip.get_children(False):
+        if not isinstance(track_element, GES.TrackElement):
+            continue
+        if track_element.get_all_control_bindings():
+            return False
+
+        neutral_values = {}
+        for source_class, values in NEUTRAL_CHILD_PROPERTIES.items():
+            if isinstance(track_element, source_class):
+                neutral_values.update(values)
+        if isinstance(track_element, GES.VideoSource):
+            neutral_values["width"] = project.videowidth
+            neutral_values["height"] = project.videoheight
+
+        for prop, neutral_value in neutral_values.items():
+            res, value = track_element.get_child_property(prop)
+            if res and value != neutral_value:
+                return False
+
+    return True
+
+
+def can_copy_sources(ges_timeline, project, container_profile):
+    """Checks whether some parts of the timeline can be copied from the sources.
+
+    A part can be copied when a single clip is active in it, for all the
+    tracks, and the clip plays its source unmodified, in the format of the
+    output. The transitions, the effects, the titles and the gaps have to
+    be re-encoded.
+
+    Args:
+        ges_timeline (GES.Timeline): The timeline to be rendered.
+        project (Project): The project defining the render settings.
+        container_profile (GstPbutils.EncodingContainerProfile): The profile
+            of the output.
+
+    Returns:
+        bool: Whether rendering in smart render mode saves re-encoding.
+    """
+    changes = collections.defaultdict(list)
+    for ges_layer in ges_timeline.get_layers():
+        for ges_clip in ges_layer.get_clips():
+            start = ges_clip.props.start
+            changes[start].append((ges_clip, True))
+            changes[start + ges_clip.props.duration].append((ges_clip, False))
+
+    checked = set()
+    active = set()
+    boundaries = sorted(changes)
+    for start in boundaries[:-1]:
+        for ges_clip, added in changes[start]:
+            if added:
+                active.add(ges_clip)
+            else:
+                active.discard(ges_clip)
+        if len(active) != 1:
+            continue
+
+        ges_clip = next(iter(active))
+        if ges_clip in checked:
+            continue
+        checked.add(ges_clip)
+        if is_unmodified(ges_clip, project) and \
+                source_matches_profile(ges_clip.get_asset(), project,
+                                       container_profile):
+            return True
+    return False
@@ -73,7 +73,11 @@ class ThreadMaster(Loggable):
         self.threads = []
 
     def addThread(self, threadclass, *args):
-        """Instantiates the specified Thread class and starts it."""
+        """Instantiates the specified Thread class and starts it.
+
+        Returns:
+            Thread: The started thread.
+        """
         assert issubclass(threadclass, Thread)
         self.log("Adding thread of type %r", threadclass)
         thread = threadclass(*args)
@@ -82,6 +86,7 @@ class ThreadMaster(Loggable):
         self.log("starting it...")
         thread.start()
         self.log("started !")
+        return thread
 
     def _threadDoneCb(self, thread):
         self.log("thread %r is done", thread)
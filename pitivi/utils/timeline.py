@@ -17,7 +17,10 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
+import collections
+
 from gi.repository import GES
+from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import Gst
 from gi.repository import Gtk
@@ -194,6 +197,71 @@ class Selection(GObject.Object, Loggable):
         return iter(self.selected)
 
 
+class EditCoalescer(Loggable):
+    """Applies the interactive edits at most once per displayed frame.
+
+    The input devices can report the motions much more often than the
+    frames are displayed. Only the latest of the edits pushed for a key
+    is kept until the next frame, when the pending edits are applied.
+
+    Args:
+        widget (Gtk.Widget): The widget whose frame clock paces the edits.
+    """
+
+    def __init__(self, widget):
+        Loggable.__init__(self)
+        self.widget = widget
+        # Maps the keys to the (function, args) of the pending edits.
+        self.__pending = collections.OrderedDict()
+        self.__tick_id = 0
+
+    @property
+    def pending(self):
+        """Whether edits are waiting for the next frame."""
+        return bool(self.__pending)
+
+    def push(self, func, *args, key=None):
+        """Schedules an edit, replacing the pending edit with the same key.
+
+        Args:
+            func (function): The function applying the edit.
+            args: The arguments of the function.
+            key (Optional[object]): Identifies the edits replacing each
+                other. By default the function.
+        """
+        if key is None:
+            key = func
+        self.__pending[key] = (func, args)
+        if self.__tick_id:
+            return
+        if not self.widget.get_mapped():
+            # No frames are displayed.
+            self.flush()
+            return
+        self.__tick_id = self.widget.add_tick_callback(self.__tick_cb)
+
+    def flush(self):
+        """Applies the pending edits right away."""
+        if self.__tick_id:
+            self.widget.remove_tick_callback(self.__tick_id)
+            self.__tick_id = 0
+        while self.__pending:
+            unused_key, (func, args) = self.__pending.popitem(last=False)
+            func(*args)
+
+    def cancel(self):
+        """Forgets the pending edits."""
+        if self.__tick_id:
+            self.widget.remove_tick_callback(self.__tick_id)
+            self.__tick_id = 0
+        self.__pending.clear()
+
+    def __tick_cb(self, unused_widget, unused_frame_clock):
+        self.__tick_id = 0
+        self.flush()
+        return GLib.SOURCE_REMOVE
+
+
 class EditingContext(GObject.Object, Loggable):
     """Encapsulates interactive editing.
 
@@ -233,6 +301,11 @@ class EditingContext(GObject.Object, Loggable):
         self.edge = edge
         self.mode = mode
 
+        if mode == GES.EditMode.EDIT_TRIM and \
+                edge in (GES.Edge.EDGE_START, GES.Edge.EDGE_END):
+            # Get the preview ready while the user starts dragging.
+            self.app.gui.viewer.prepareClipTrimPreview(self.focus)
+
         from pitivi.undo.timeline import CommitTimelineFinalizingAction
         self.__log_actions = log_actions
         if log_actions:
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Display of the cached frames in the viewer."""
+import cairo
+from gi.repository import Gtk
+
+from pitivi.utils.loggable import Loggable
+
+
+class CachedFrameArea(Gtk.DrawingArea, Loggable):
+    """Covers the video sink with a cached frame while a seek is done.
+
+    The area is hidden until a frame is shown.
+    """
+
+    def __init__(self):
+        Gtk.DrawingArea.__init__(self)
+        Loggable.__init__(self)
+        self.__surface = None
+        self.set_no_show_all(True)
+
+    def show_frame(self, surface):
+        """Displays the specified frame over the video sink.
+
+        Args:
+            surface (cairo.ImageSurface): The frame.
+        """
+        self.__surface = surface
+        self.show()
+        self.queue_draw()
+
+    def hide_frame(self):
+        """Uncovers the video sink."""
+        if self.__surface is None:
+            return
+        self.__surface = None
+        self.hide()
+
+    def do_draw(self, cr):
+        if self.__surface is None:
+            return
+        width = self.get_allocated_width()
+        height = self.get_allocated_height()
+        cr.set_source_rgb(0, 0, 0)
+        cr.paint()
+
+        # Fit the frame in the area, the same way the sink does it.
+        scale = min(width / self.__surface.get_width(),
+                    height / self.__surface.get_height())
+        cr.translate((width - self.__surface.get_width() * scale) / 2,
+                     (height - self.__surface.get_height() * scale) / 2)
+        cr.scale(scale, scale)
+        cr.set_source_surface(self.__surface, 0, 0)
+        cr.get_source().set_filter(cairo.FILTER_FAST)
+        cr.paint()
@@ -25,6 +25,7 @@ import numpy
 from pitivi.undo.timeline import CommitTimelineFinalizingAction
 from pitivi.utils.misc import disconnectAllByFunc
 from pitivi.utils.pipeline import PipelineError
+from pitivi.utils.timeline import EditCoalescer
 from pitivi.viewer.overlay import Overlay
 
 
@@ -310,6 +311,8 @@ class MoveScaleOverlay(Overlay):
 
         self.__action_log = action_log
         self.hovered_handle = None
+        # Applies the edits of the drags once per frame.
+        self.__edit_coalescer = EditCoalescer(self)
 
         # Corner handles need to be ordered for drawing.
         self.corner_handles = OrderedDict([
@@ -391,6 +394,12 @@ class MoveScaleOverlay(Overlay):
         self.__set_source_property("width", int(size[0]))
         self.__set_source_property("height", int(size[1]))
 
+    def __apply_source_geometry(self, position, size):
+        if position is not None:
+            self.__set_source_position(position)
+        if size is not None:
+            self.__set_source_size(size)
+
     def __get_size(self):
         return numpy.array([self.__get_width(), self.__get_height()])
 
@@ -469,6 +478,9 @@ class MoveScaleOverlay(Overlay):
             self.hovered_handle = None
 
     def on_button_release(self, cursor_position):
+        self.__edit_coalescer.flush()
+        # The timeline is committed once, when the drag ends.
+        self._commit()
         self.click_source_position = None
         self.update_from_source()
         self.on_hover(cursor_position)
@@ -499,18 +511,19 @@ class MoveScaleOverlay(Overlay):
             # We only need to change translation coordinates in the source for resizing
             # when handle does not return NULL for get_source_position
             source_position = self.__clicked_handle.get_source_position()
-            if isinstance(source_position, numpy.ndarray):
-                self.__set_source_position(source_position)
+            if not isinstance(source_position, numpy.ndarray):
+                source_position = None
 
-            self.__set_source_size(self.__get_size_stream())
+            self.__edit_coalescer.push(self.__apply_source_geometry,
+                                       source_position, self.__get_size_stream())
             self.__update_handle_sizes()
         else:
             # Move Box
             stream_position = self.click_source_position + click_to_cursor * self.project_size
             self.__set_position(stream_position / self.project_size)
-            self.__set_source_position(stream_position)
+            self.__edit_coalescer.push(self.__apply_source_geometry,
+                                       stream_position, None)
         self.queue_draw()
-        self._commit()
 
     def on_hover(self, cursor_pos):
         if not self.is_visible():
@@ -22,6 +22,7 @@ from gi.repository import GES
 from gi.repository import Gtk
 
 from pitivi.utils.loggable import Loggable
+from pitivi.viewer.cached_frame import CachedFrameArea
 from pitivi.viewer.move_scale_overlay import MoveScaleOverlay
 from pitivi.viewer.title_overlay import TitleOverlay
 
@@ -48,6 +49,9 @@ class OverlayStack(Gtk.Overlay, Loggable):
                         Gdk.EventMask.LEAVE_NOTIFY_MASK |
                         Gdk.EventMask.ALL_EVENTS_MASK)
         self.add(sink_widget)
+        self.cached_frame_area = CachedFrameArea()
+        self.add_overlay(self.cached_frame_area)
+        self.set_overlay_pass_through(self.cached_frame_area, True)
         self.connect("size-allocate", self.__on_size_allocate)
 
     def __on_size_allocate(self, widget, rectangle):
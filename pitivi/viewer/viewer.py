@@ -16,8 +16,8 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
+import sqlite3
 from gettext import gettext as _
-from time import time
 
 from gi.repository import Gdk
 from gi.repository import GES
@@ -25,10 +25,14 @@ from gi.repository import GObject
 from gi.repository import Gst
 from gi.repository import Gtk
 
+from pitivi.dialogs.prefs import PreferencesDialog
 from pitivi.settings import GlobalSettings
+from pitivi.timeline.previewers import ThumbnailCache
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import format_ns
-from pitivi.utils.pipeline import AssetPipeline
+from pitivi.utils.pipeline import AssetPipelinePool
+from pitivi.utils.pipeline import Pipeline
+from pitivi.utils.preview_quality import PreviewQuality
 from pitivi.utils.ui import SPACING
 from pitivi.utils.widgets import TimeWidget
 from pitivi.viewer.overlay_stack import OverlayStack
@@ -59,6 +63,17 @@ GlobalSettings.addConfigOption("pointColor", section="viewer",
                                key="point-color",
                                default='49a0e0')
 
+PreferencesDialog.addChoicePreference("previewQuality",
+                                      section="viewer",
+                                      label=_("Preview quality"),
+                                      description=_(
+                                          "Resolution at which the video is displayed in the viewer. "
+                                          "Automatic lowers it when the playback cannot keep up."),
+                                      choices=((_("Full"), PreviewQuality.FULL),
+                                               (_("Half"), PreviewQuality.HALF),
+                                               (_("Quarter"), PreviewQuality.QUARTER),
+                                               (_("Automatic"), PreviewQuality.AUTO)))
+
 
 class ViewerContainer(Gtk.Box, Loggable):
     """Wiget holding a viewer and the controls.
@@ -89,9 +104,14 @@ class ViewerContainer(Gtk.Box, Loggable):
         self.target = None
         self._compactMode = False
 
-        # Only used for restoring the pipeline position after a live clip trim
-        # preview:
-        self._oldTimelinePos = None
+        # The prerolled pipelines for previewing the trims.
+        self.__trim_pipelines = AssetPipelinePool()
+        # Whether a trim is being previewed.
+        self.__trimming = False
+        # The pipeline of the project, forwarding its playback to the
+        # pipeline playing the pre-rendered ranges, if any.
+        self.__project_pipeline = None
+        self.__prerendered_pipeline = None
 
         self._haveUI = False
 
@@ -111,7 +131,14 @@ class ViewerContainer(Gtk.Box, Loggable):
             position (Optional[int]): The position to seek to initially.
         """
         self.debug("Setting pipeline: %r", pipeline)
+        if self.pipeline and self.pipeline.sink_widget:
+            # Keep the sink of the previous pipeline, to be able to display
+            # the pipeline again without changing its state.
+            parent = self.pipeline.sink_widget.get_parent()
+            if parent:
+                parent.remove(self.pipeline.sink_widget)
         self._disconnectFromPipeline()
+        self.__watch_project_pipeline()
 
         if self.target:
             parent = self.target.get_parent()
@@ -120,8 +147,10 @@ class ViewerContainer(Gtk.Box, Loggable):
 
         self.pipeline = pipeline
         self.pipeline.connect("state-change", self._pipelineStateChangedCb)
-        self.pipeline.connect("position", self._positionCb)
+        self.pipeline.playhead.subscribe(self.timecode_entry, self._positionCb)
         self.pipeline.connect("duration-changed", self._durationChangedCb)
+        self.pipeline.connect("cached-frame", self._cachedFrameCb)
+        self.pipeline.connect("async-done", self._asyncDoneCb)
 
         self.__owning_pipeline = False
         self.__createNewViewer()
@@ -132,7 +161,8 @@ class ViewerContainer(Gtk.Box, Loggable):
         self.pipeline.pause()
 
     def __createNewViewer(self):
-        self.pipeline.create_sink()
+        if not self.pipeline.sink_widget:
+            self.pipeline.create_sink()
 
         self.overlay_stack = OverlayStack(self.app, self.pipeline.sink_widget)
         self.target = ViewerWidget(self.overlay_stack)
@@ -162,9 +192,14 @@ class ViewerContainer(Gtk.Box, Loggable):
 
         self.debug("Disconnecting from: %r", self.pipeline)
         self.pipeline.disconnect_by_func(self._pipelineStateChangedCb)
-        self.pipeline.disconnect_by_func(self._positionCb)
+        self.pipeline.playhead.unsubscribe(self._positionCb)
         self.pipeline.disconnect_by_func(self._durationChangedCb)
+        self.pipeline.disconnect_by_func(self._cachedFrameCb)
+        self.pipeline.disconnect_by_func(self._asyncDoneCb)
 
+        if self.pipeline is self.__prerendered_pipeline:
+            self.__prerendered_pipeline = None
+            self.__project_pipeline.set_playback_pipeline(None)
         if self.__owning_pipeline:
             self.pipeline.release()
         self.pipeline = None
@@ -411,46 +446,126 @@ class ViewerContainer(Gtk.Box, Loggable):
             self.external_window.show()
 
     def _positionCb(self, unused_pipeline, position):
-        """Updates the viewer UI widgets if the timeline position changed.
-
-        This is meant to be called either by the gobject timer when playing,
-        or by mainwindow's _timelineSeekCb when the timer is disabled.
-        """
+        """Updates the viewer UI widgets if the timeline position changed."""
         self.timecode_entry.setWidgetValue(position, False)
 
+    def _cachedFrameCb(self, unused_pipeline, unused_position, surface):
+        """Displays the cached frame until the seek is done."""
+        self.overlay_stack.cached_frame_area.show_frame(surface)
+
+    def _asyncDoneCb(self, pipeline):
+        if not pipeline.seek_pending:
+            self.overlay_stack.cached_frame_area.hide_frame()
+
+    @staticmethod
+    def __can_preview_trim(clip):
+        return hasattr(clip, "get_uri") and not isinstance(clip, GES.TitleClip) \
+            and not clip.props.is_image
+
+    def prepareClipTrimPreview(self, clip):
+        """Prerolls a pipeline for previewing the clip, before it's trimmed."""
+        if self.__can_preview_trim(clip):
+            self.__trim_pipelines.get(clip)
+
     def clipTrimPreview(self, clip, position):
-        """Shows a live preview of a clip being trimmed."""
-        if not hasattr(clip, "get_uri") or isinstance(clip, GES.TitleClip) or clip.props.is_image:
+        """Shows a live preview of a clip being trimmed.
+
+        The closest cached thumbnail is displayed right away, until the
+        prerolled pipeline of the clip's asset has seeked to the position.
+        """
+        if not self.__can_preview_trim(clip):
             self.log(
                 "%s is an image or has no URI, so not previewing trim" % clip)
             return False
 
-        clip_uri = clip.props.uri
-        cur_time = time()
-        if self.pipeline == self.app.project_manager.current_project.pipeline:
-            self.debug("Creating temporary pipeline for clip %s, position %s",
-                       clip_uri, format_ns(position))
-            self._oldTimelinePos = self.pipeline.getPosition(False)
-            self.pipeline.set_state(Gst.State.NULL)
-            self.setPipeline(AssetPipeline(clip))
-            self.__owning_pipeline = True
-            self._lastClipTrimTime = cur_time
-
-        if (cur_time - self._lastClipTrimTime) > 0.2 and self.pipeline.getState() == Gst.State.PAUSED:
-            # Do not seek more than once every 200 ms (for performance)
-            self.pipeline.simple_seek(position)
-            self._lastClipTrimTime = cur_time
+        if self.pipeline is self.app.project_manager.current_project.pipeline:
+            self.debug("Switching to the pipeline of clip %s, position %s",
+                       clip.props.uri, format_ns(position))
+            # The project pipeline stays paused, to be displayed again
+            # right away when the trim is done.
+            self.pipeline.pause()
+            self.setPipeline(self.__trim_pipelines.get(clip))
+            self.__trimming = True
+        elif not self.__trimming:
+            return False
+
+        self.__show_thumbnail(clip, position)
+        # Only the newest of the positions is seeked to while the pipeline is busy.
+        self.pipeline.simple_seek(position)
+        return True
+
+    def __show_thumbnail(self, clip, position):
+        try:
+            thumb_cache = ThumbnailCache.get(clip.get_asset())
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.debug("No thumbnails for %s: %s", clip.props.uri, e)
+            return
+        pixbuf = thumb_cache.get_nearest(position)
+        if pixbuf:
+            surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, 1, None)
+            self.overlay_stack.cached_frame_area.show_frame(surface)
 
     def clipTrimPreviewFinished(self):
         """Switches back to the project pipeline following a clip trimming."""
-        if self.pipeline is not self.app.project_manager.current_project.pipeline:
+        if self.__trimming:
             self.debug("Going back to the project's pipeline")
-            self.pipeline.setState(Gst.State.NULL)
-            # Using pipeline.getPosition() here does not work because for some
-            # reason it's a bit off, that's why we need self._oldTimelinePos.
-            self.setPipeline(
-                self.app.project_manager.current_project.pipeline, self._oldTimelinePos)
-            self._oldTimelinePos = None
+            self.__trimming = False
+            self.pipeline.pause()
+            self.setPipeline(self.app.project_manager.current_project.pipeline)
+
+    def release_trim_pipelines(self):
+        """Releases the pipelines prerolled for previewing the trims."""
+        self.__trim_pipelines.release()
+
+    def __watch_project_pipeline(self):
+        project = self.app.project_manager.current_project
+        pipeline = project.pipeline if project else None
+        if pipeline is self.__project_pipeline:
+            return
+        if self.__project_pipeline:
+            self.__project_pipeline.disconnect_by_func(self.__about_to_play_cb)
+            self.__project_pipeline.disconnect_by_func(self.__forwarding_stopped_cb)
+        self.__project_pipeline = pipeline
+        if pipeline:
+            pipeline.connect("about-to-play", self.__about_to_play_cb)
+            pipeline.connect("forwarding-stopped", self.__forwarding_stopped_cb)
+
+    def __about_to_play_cb(self, pipeline):
+        """Plays a copy of the timeline where the heavy ranges are pre-rendered."""
+        project = self.app.project_manager.current_project
+        if self.__trimming or not project.preview_cache:
+            return
+        position = pipeline.getPosition(False)
+        ges_timeline = project.preview_cache.get_playback_timeline(position)
+        if not ges_timeline:
+            return
+        if self.__prerendered_pipeline and \
+                self.__prerendered_pipeline.props.timeline is ges_timeline:
+            # Already forwarding to it.
+            return
+
+        self.debug("Playing the pre-rendered ranges from %s", format_ns(position))
+        pipeline.set_state(Gst.State.NULL)
+        prerendered_pipeline = Pipeline(self.app)
+        prerendered_pipeline.set_timeline(ges_timeline)
+        self.setPipeline(prerendered_pipeline, position)
+        self.__owning_pipeline = True
+        self.__prerendered_pipeline = prerendered_pipeline
+        # The pipeline is kept until the timeline changes, so pausing and
+        # playing again does not preroll the project pipeline.
+        pipeline.set_playback_pipeline(prerendered_pipeline)
+
+    def __forwarding_stopped_cb(self, pipeline, position, playing):
+        """Switches back to the project pipeline when the timeline changes."""
+        project = self.app.project_manager.current_project
+        if project.preview_cache:
+            # The stopped project pipeline did not commit the timeline, so
+            # the pre-rendered ranges have not been checked yet.
+            project.preview_cache.invalidate()
+        if self.pipeline is self.__prerendered_pipeline:
+            self.setPipeline(pipeline, position)
+        if playing:
+            pipeline.play()
 
     def _pipelineStateChangedCb(self, unused_pipeline, state, old_state):
         """Updates the widgets when the playback starts or stops."""
@@ -461,6 +576,7 @@ class ViewerContainer(Gtk.Box, Loggable):
             self.app.simple_inhibit(ViewerContainer.INHIBIT_REASON,
                                     Gtk.ApplicationInhibitFlags.IDLE)
             self.overlay_stack.hide_overlays()
+            self.overlay_stack.cached_frame_area.hide_frame()
         else:
             if state == Gst.State.PAUSED:
                 if old_state != Gst.State.PAUSED:
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+# Copyright (c) 2016, Thibault Saunier <tsaunier@gnome.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+"""Benchmark of the seek-to-display latency while scrubbing.
+
+Simulates a pointer dragged over the ruler, requesting a seek every 16 ms,
+first with accurate seeks, then in the scrub mode of `SimplePipeline`.
+For each requested seek, the latency is the time until the next frame
+reaches the video sink.
+
+Run from the top directory:
+
+    python3 -m tests.benchmark_scrubbing [MEDIA_FILE]
+"""
+import bisect
+import statistics
+import sys
+import time
+
+from gi.repository import GLib
+from gi.repository import Gst
+
+from pitivi.utils.pipeline import SimplePipeline
+from pitivi.utils.render_worker import to_uri
+from tests import common
+
+# The interval between the simulated motion events, in milliseconds.
+MOTION_INTERVAL = 16
+# The number of simulated motion events.
+MOTION_EVENTS = 150
+
+
+class ScrubbingBenchmark(object):
+    """Measures the latencies of the seeks done while scrubbing a file."""
+
+    def __init__(self, uri):
+        playbin = Gst.ElementFactory.make("playbin", None)
+        playbin.props.uri = uri
+        self.video_sink = Gst.ElementFactory.make("fakesink", None)
+        self.video_sink.props.signal_handoffs = True
+        self.video_sink.connect("preroll-handoff", self.__handoff_cb)
+        playbin.props.video_sink = self.video_sink
+        playbin.props.audio_sink = Gst.ElementFactory.make("fakesink", None)
+        self.pipeline = SimplePipeline(playbin)
+        self.mainloop = GLib.MainLoop()
+        # The times when frames reached the sink. Appended in the
+        # streaming threads.
+        self.displayed = []
+
+    def __handoff_cb(self, unused_sink, unused_buffer, unused_pad):
+        self.displayed.append(time.monotonic())
+
+    def wait_idle(self, timeout=10):
+        """Waits until the pending seeks are done."""
+        deadline = time.monotonic() + timeout
+        context = self.mainloop.get_context()
+        while self.pipeline._busy_async or self.pipeline._next_seek is not None:
+            if time.monotonic() > deadline:
+                raise TimeoutError("The pipeline is stuck")
+            context.iteration(True)
+
+    def run(self, scrub):
+        """Simulates a drag over the file.
+
+        Args:
+            scrub (bool): Whether to use the scrub mode.
+
+        Returns:
+            Tuple[List[float], float]: The latencies of the seeks done while
+            dragging and the latency of the final accurate seek, in ms.
+        """
+        self.pipeline.pause()
+        self.wait_idle()
+        self.pipeline.simple_seek(0)
+        self.wait_idle()
+        duration = self.pipeline.getDuration()
+        self.displayed = []
+        requests = []
+
+        if scrub:
+            self.pipeline.begin_scrub()
+
+        def motion_cb():
+            index = len(requests)
+            if index == MOTION_EVENTS:
+                self.mainloop.quit()
+                return False
+            # Drag forth and back, over most of the file.
+            fraction = index / (MOTION_EVENTS / 2)
+            if fraction > 1:
+                fraction = 2 - fraction
+            requests.append(time.monotonic())
+            self.pipeline.simple_seek(int(duration * 0.9 * fraction))
+            return True
+
+        GLib.timeout_add(MOTION_INTERVAL, motion_cb)
+        self.mainloop.run()
+
+        released = time.monotonic()
+        if scrub:
+            self.pipeline.end_scrub()
+        else:
+            self.pipeline.simple_seek(int(duration * 0.9 * 2 / MOTION_EVENTS))
+        self.wait_idle()
+        # Let the last frame reach the sink.
+        time.sleep(0.1)
+
+        displayed = sorted(self.displayed)
+        latencies = []
+        for requested in requests:
+            index = bisect.bisect_left(displayed, requested)
+            if index < len(displayed):
+                latencies.append((displayed[index] - requested) * 1000)
+        final_index = bisect.bisect_left(displayed, released)
+        final_latency = (displayed[final_index] - released) * 1000 \
+            if final_index < len(displayed) else float("nan")
+        return latencies, final_latency
+
+    def release(self):
+        """Releases the pipeline."""
+        self.pipeline.setState(Gst.State.NULL)
+        self.pipeline.release()
+
+
+def main(argv):
+    """Runs the benchmark and prints the results."""
+    if argv:
+        uri = to_uri(argv[0])
+    else:
+        uri = common.get_sample_uri("tears_of_steel.webm")
+
+    benchmark = ScrubbingBenchmark(uri)
+    try:
+        for name, scrub in (("accurate", False), ("scrub", True)):
+            latencies, final_latency = benchmark.run(scrub)
+            print("%-8s frames: %3d  latency mean: %6.1f ms  median: %6.1f ms"
+                  "  max: %6.1f ms  final: %6.1f ms" %
+                  (name, len(benchmark.displayed),
+                   statistics.mean(latencies), statistics.median(latencies),
+                   max(latencies), final_latency))
+    finally:
+        benchmark.release()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
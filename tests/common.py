@@ -19,9 +19,11 @@
 """
 A collection of objects to use for testing
 """
+import atexit
 import contextlib
 import gc
 import os
+import shutil
 import tempfile
 import unittest
 from unittest import mock
@@ -35,6 +37,7 @@ from pitivi.application import Pitivi
 from pitivi.project import ProjectManager
 from pitivi.settings import GlobalSettings
 from pitivi.timeline.timeline import TimelineContainer
+from pitivi.utils.discovery_cache import DiscoveryCache
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.proxy import ProxyingStrategy
 from pitivi.utils.proxy import ProxyManager
@@ -43,6 +46,29 @@ from pitivi.utils.timeline import Selected
 detect_leaks = os.environ.get("PITIVI_TEST_DETECT_LEAKS", "0") not in ("0", "")
 os.environ["PITIVI_USER_CACHE_DIR"] = tempfile.mkdtemp("pitiviTestsuite")
 
+# The temp dir of the test being run, see `get_temp_dir`.
+_temp_dir = None
+
+
+def get_temp_dir():
+    """Gets a temp dir removed when the test being run ends."""
+    global _temp_dir
+    if _temp_dir is None:
+        _temp_dir = tempfile.mkdtemp("pitiviTest")
+    return _temp_dir
+
+
+def remove_temp_dir():
+    """Removes the temp dir of the test which ended, if any."""
+    global _temp_dir
+    if _temp_dir is not None:
+        shutil.rmtree(_temp_dir, ignore_errors=True)
+        _temp_dir = None
+
+
+# For the tests not based on `TestCase`.
+atexit.register(remove_temp_dir)
+
 
 def clean_pitivi_mock(app):
     app.settings = None
@@ -68,6 +94,7 @@ def create_pitivi_mock(**settings):
 
     app.settings = __create_settings(**settings)
     app.proxy_manager = ProxyManager(app)
+    app.discovery_cache = DiscoveryCache(os.path.join(get_temp_dir(), "discovery"))
 
     return app
 
@@ -181,6 +208,7 @@ class TestCase(unittest.TestCase, Loggable):
             self.gctrack()
 
     def tearDown(self):
+        remove_temp_dir()
         # don't barf gc info all over the console if we have already failed a
         # test case
         if (self._num_failures < len(getattr(self._result, 'failures', [])) or
@@ -19,13 +19,17 @@
 """Tests for the utils.misc module."""
 # pylint: disable=protected-access,no-self-use
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
+from gi.repository import GLib
 from gi.repository import Gst
 
 from pitivi.utils.misc import binary_search
 from pitivi.utils.misc import PathWalker
-from tests.common import create_main_loop
+from pitivi.utils.misc import SearchIndex
 from tests.common import get_sample_uri
 
 
@@ -52,21 +56,66 @@ class BinarySearchTest(unittest.TestCase):
         self.assertEqual(binary_search([10, 20, 30], 40), 2)
 
 
+class SearchIndexTest(unittest.TestCase):
+    """Tests for the `SearchIndex` class."""
+
+    def test_search(self):
+        """Checks the prefix matching of the query words."""
+        index = SearchIndex()
+        index.add("a", "/home/user/Beach Sunset.mp4", "video/x-h264")
+        index.add("b", "/home/user/beach-party.ogg", "audio/x-vorbis")
+        index.add("c", "/home/user/Interview.mov")
+
+        self.assertIsNone(index.search(""))
+        self.assertIsNone(index.search("  ,. "))
+        self.assertEqual(index.search("beach"), {"a", "b"})
+        self.assertEqual(index.search("BEA"), {"a", "b"})
+        self.assertEqual(index.search("b"), {"a", "b"})
+        self.assertEqual(index.search("beach sun"), {"a"})
+        self.assertEqual(index.search("h264"), {"a"})
+        self.assertEqual(index.search("user"), {"a", "b", "c"})
+        self.assertEqual(index.search("each"), set())
+        self.assertEqual(index.search("beach interview"), set())
+
+    def test_update(self):
+        """Checks the index follows the added and removed items."""
+        index = SearchIndex()
+        index.add("a", "first clip")
+        index.add("b", "second clip")
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search("clip"), {"a", "b"})
+
+        index.add("a", "renamed")
+        self.assertEqual(index.search("clip"), {"b"})
+        self.assertEqual(index.search("ren"), {"a"})
+
+        index.remove("b")
+        self.assertNotIn("b", index)
+        self.assertEqual(index.search("clip"), set())
+        self.assertEqual(index.search("sec"), set())
+
+        index.clear()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.search("ren"), set())
+
+
 class PathWalkerTest(unittest.TestCase):
     """Tests for the `PathWalker` class."""
 
-    def _scan(self, uris):
+    def _scan(self, uris, **kwargs):
         """Uses the PathWalker to scan URIs."""
-        mainloop = create_main_loop()
-        received_uris = []
+        received_batches = []
 
-        def done_cb(uris):  # pylint: disable=missing-docstring
-            received_uris.extend(uris)
-            mainloop.quit()
-        walker = PathWalker(uris, done_cb)
+        def batch_cb(uris):  # pylint: disable=missing-docstring
+            received_batches.append(uris)
+        walker = PathWalker(uris, batch_cb, **kwargs)
         walker.run()
-        mainloop.run()
-        return received_uris
+        # Dispatch the batches passed with GLib.idle_add.
+        context = GLib.MainContext.default()
+        while context.iteration(False):
+            pass
+        self.batches = received_batches
+        return [uri for batch in received_batches for uri in batch]
 
     def test_scanning(self):
         """Checks the scanning of the URIs."""
@@ -86,3 +135,51 @@ class PathWalkerTest(unittest.TestCase):
         self.assertGreater(len(received_uris), 1, received_uris)
         valid_uri = get_sample_uri("tears_of_steel.webm")
         self.assertIn(valid_uri, received_uris)
+
+    def test_scanning_batches(self):
+        """Checks the URIs are passed in batches."""
+        assets_dir = os.path.dirname(os.path.abspath(__file__))
+        valid_dir_uri = Gst.filename_to_uri(os.path.join(assets_dir, "samples"))
+        received_uris = self._scan([valid_dir_uri], batch_size=2)
+        self.assertGreater(len(self.batches), 1, self.batches)
+        for batch in self.batches:
+            self.assertLessEqual(len(batch), 2, batch)
+        self.assertEqual(len(received_uris), len(set(received_uris)))
+        self.assertIn(get_sample_uri("tears_of_steel.webm"), received_uris)
+
+    def test_skipping_non_media(self):
+        """Checks the files which are obviously not media are skipped."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sub_dir = os.path.join(temp_dir, "DCIM")
+            os.mkdir(sub_dir)
+            with open(os.path.join(temp_dir, "notes.txt"), "w") as file:
+                file.write("Not a video")
+            video_path = os.path.join(sub_dir, "clip.webm")
+            shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "samples", "tears_of_steel.webm"),
+                        video_path)
+
+            received_uris = self._scan([Gst.filename_to_uri(temp_dir)])
+            self.assertEqual(received_uris, [Gst.filename_to_uri(video_path)])
+
+    def test_failing_filter(self):
+        """Checks the scanning finishes when the filter fails."""
+        assets_dir = os.path.dirname(os.path.abspath(__file__))
+        valid_dir_uri = Gst.filename_to_uri(os.path.join(assets_dir, "samples"))
+        filter_func = mock.Mock(side_effect=ValueError("broken filter"))
+        received_uris = self._scan([valid_dir_uri], filter_func=filter_func,
+                                   n_workers=1)
+        self.assertEqual(received_uris, [])
+        filter_func.assert_called()
+
+    def test_abort(self):
+        """Checks nothing is passed to the callback after aborting."""
+        assets_dir = os.path.dirname(os.path.abspath(__file__))
+        valid_dir_uri = Gst.filename_to_uri(os.path.join(assets_dir, "samples"))
+        walker = PathWalker([valid_dir_uri], mock.Mock())
+        walker.abort()
+        walker.run()
+        context = GLib.MainContext.default()
+        while context.iteration(False):
+            pass
+        walker.callback.assert_not_called()
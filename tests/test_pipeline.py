@@ -24,8 +24,11 @@ from gi.repository import GES
 from gi.repository import GLib
 from gi.repository import Gst
 
+from pitivi.utils.pipeline import AssetPipelinePool
+from pitivi.utils.pipeline import CommitScheduler
 from pitivi.utils.pipeline import MAX_RECOVERIES
 from pitivi.utils.pipeline import Pipeline
+from pitivi.utils.pipeline import PlayheadDispatcher
 from pitivi.utils.pipeline import SimplePipeline
 from tests import common
 
@@ -73,6 +76,29 @@ class TestPipeline(common.TestCase):
         self.assertTrue(pipeline_died_cb.called)
         self.assertEqual(pipe._attempted_recoveries, MAX_RECOVERIES)
 
+    def test_forwarding_stops_on_commit(self):
+        """Checks the playback is not forwarded to an outdated copy."""
+        pipe = Pipeline(common.create_pitivi_mock())
+        playback_pipeline = mock.Mock()
+        playback_pipeline.getPosition.return_value = Gst.SECOND
+        playback_pipeline.playing.return_value = True
+
+        about_to_play_cb = mock.Mock()
+        pipe.connect("about-to-play", about_to_play_cb)
+        pipe.set_playback_pipeline(playback_pipeline)
+        pipe.play()
+        about_to_play_cb.assert_called_once_with(pipe)
+        playback_pipeline.play.assert_called_once_with()
+
+        forwarding_stopped_cb = mock.Mock()
+        pipe.connect("forwarding-stopped", forwarding_stopped_cb)
+        pipe.commit_timeline()
+        forwarding_stopped_cb.assert_called_once_with(pipe, Gst.SECOND, True)
+
+        # Nothing to stop anymore.
+        pipe.commit_timeline()
+        forwarding_stopped_cb.assert_called_once_with(pipe, Gst.SECOND, True)
+
     def test_async_done_not_received(self):
         """Checks the recovery when the ASYNC_DONE message timed out."""
         ges_timeline = GES.Timeline()
@@ -133,3 +159,195 @@ class TestPipeline(common.TestCase):
         self.assertEqual(pipe._recovery_state, SimplePipeline.RecoveryState.NOT_RECOVERING)
         self.assertFalse(pipe._busy_async)
         self.assertIsNone(pipe._next_seek)
+
+    def test_scrub(self):
+        """Checks the seeks are fast while scrubbing and accurate at the end."""
+        gst_pipeline = mock.MagicMock()
+        pipe = SimplePipeline(gst_pipeline)
+        fast_flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | \
+            Gst.SeekFlags.SNAP_NEAREST
+        accurate_flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+
+        with mock.patch.object(pipe, "getState", return_value=Gst.State.PAUSED), \
+                mock.patch.object(pipe, "getDuration", return_value=10 * Gst.SECOND), \
+                mock.patch.object(pipe, "_addWaitingForAsyncDoneTimeout"):
+            pipe.begin_scrub()
+            pipe.simple_seek(Gst.SECOND)
+            self.assertEqual(gst_pipeline.seek.call_args[0][2], fast_flags)
+
+            # While the pipeline is busy, only the newest seek is kept.
+            pipe._timeout_async_id = 1
+            pipe.simple_seek(2 * Gst.SECOND)
+            pipe.simple_seek(3 * Gst.SECOND)
+            self.assertEqual(pipe._next_seek, 3 * Gst.SECOND)
+            self.assertEqual(gst_pipeline.seek.call_count, 1)
+
+            pipe._timeout_async_id = 0
+            pipe.end_scrub()
+            gst_pipeline.seek.assert_called_with(1.0, Gst.Format.TIME,
+                                                 accurate_flags,
+                                                 Gst.SeekType.SET, 3 * Gst.SECOND,
+                                                 Gst.SeekType.NONE, -1)
+            self.assertIsNone(pipe._next_seek)
+
+            # Without scrubbing there is nothing to finish.
+            pipe.end_scrub()
+            self.assertEqual(gst_pipeline.seek.call_count, 2)
+
+
+class TestAssetPipelinePool(common.TestCase):
+    """Tests for the AssetPipelinePool class."""
+
+    @mock.patch("pitivi.utils.pipeline.AssetPipeline")
+    def test_lru(self, asset_pipeline):
+        """Checks the least recently used pipelines are released."""
+        asset_pipeline.side_effect = lambda clip: mock.Mock()
+        clips = [mock.Mock(**{"props.uri": "file:///%d" % i}) for i in range(3)]
+        pool = AssetPipelinePool(size=2)
+
+        pipeline0 = pool.get(clips[0])
+        pipeline0.pause.assert_called_once_with()
+        pipeline1 = pool.get(clips[1])
+        self.assertIs(pool.get(clips[0]), pipeline0)
+        self.assertEqual(asset_pipeline.call_count, 2)
+
+        pipeline2 = pool.get(clips[2])
+        pipeline1.release.assert_called_once_with()
+        pipeline0.release.assert_not_called()
+        self.assertEqual(len(pool), 2)
+
+        pool.release()
+        pipeline0.release.assert_called_once_with()
+        pipeline2.release.assert_called_once_with()
+        self.assertEqual(len(pool), 0)
+
+
+class TestPlayheadDispatcher(common.TestCase):
+    """Tests for the PlayheadDispatcher class."""
+
+    @staticmethod
+    def create_widget(mapped=True):
+        """Creates a fake widget keeping its tick callbacks."""
+        widget = mock.Mock()
+        widget.get_mapped.return_value = mapped
+        widget.ticks = {}
+
+        def add_tick_callback(callback, subscriber):
+            widget.ticks[len(widget.ticks) + 1] = (callback, subscriber)
+            return len(widget.ticks)
+
+        widget.add_tick_callback.side_effect = add_tick_callback
+        widget.remove_tick_callback.side_effect = widget.ticks.pop
+        return widget
+
+    @staticmethod
+    def tick(widget, frame_clock):
+        """Simulates a frame displayed by the widget."""
+        for callback, subscriber in list(widget.ticks.values()):
+            callback(widget, frame_clock, subscriber)
+
+    def test_frames(self):
+        """Checks the position is queried once per frame while playing."""
+        pipe = mock.Mock()
+        pipe.getPosition.return_value = 10
+        dispatcher = PlayheadDispatcher(pipe)
+        fast_widget, slow_widget, hidden_widget = (self.create_widget(),
+                                                   self.create_widget(),
+                                                   self.create_widget(mapped=False))
+        fast_cb, slow_cb, hidden_cb = mock.Mock(), mock.Mock(), mock.Mock()
+        dispatcher.subscribe(fast_widget, fast_cb)
+        dispatcher.subscribe(slow_widget, slow_cb, interval=100)
+        dispatcher.subscribe(hidden_widget, hidden_cb)
+        self.assertEqual(fast_widget.ticks, {})
+
+        dispatcher.set_playing(True)
+        frame_clock = mock.Mock()
+        for frame in range(4):
+            frame_clock.get_frame_counter.return_value = frame
+            frame_clock.get_frame_time.return_value = frame * 40000
+            for widget in (fast_widget, slow_widget, hidden_widget):
+                self.tick(widget, frame_clock)
+        self.assertEqual(pipe.getPosition.call_count, 4)
+        self.assertEqual(fast_cb.call_count, 4)
+        # At 0 and 120 ms.
+        self.assertEqual(slow_cb.call_count, 2)
+        hidden_cb.assert_not_called()
+
+        dispatcher.set_playing(False)
+        self.assertEqual(fast_widget.ticks, {})
+
+        # The hidden widget gets the position when it's shown.
+        map_cb = hidden_widget.connect.call_args[0][1]
+        map_cb(hidden_widget, hidden_widget.connect.call_args[0][2])
+        hidden_cb.assert_called_once_with(pipe, 10)
+
+    def test_seeks(self):
+        """Checks the positions emitted while paused are dispatched."""
+        pipe = mock.Mock()
+        dispatcher = PlayheadDispatcher(pipe)
+        position_cb = pipe.connect.call_args[0][1]
+        widget = self.create_widget()
+        callback = mock.Mock()
+        dispatcher.subscribe(widget, callback)
+
+        position_cb(pipe, 5)
+        callback.assert_called_once_with(pipe, 5)
+
+        dispatcher.unsubscribe(callback)
+        position_cb(pipe, 6)
+        callback.assert_called_once_with(pipe, 5)
+        widget.disconnect.assert_called_once_with(widget.connect.return_value)
+
+
+class TestCommitScheduler(common.TestCase):
+    """Tests for the CommitScheduler class."""
+
+    @mock.patch("pitivi.utils.pipeline.GLib")
+    def test_merge(self, glib):
+        """Checks the commits requested meanwhile are merged."""
+        glib.timeout_add.return_value = 1
+        commit = mock.Mock()
+        scheduler = CommitScheduler(commit)
+
+        scheduler.schedule()
+        scheduler.schedule()
+        scheduler.schedule()
+        commit.assert_not_called()
+        self.assertTrue(scheduler.pending)
+        self.assertEqual(scheduler.saved, 2)
+        self.assertEqual(glib.timeout_add.call_count, 1)
+
+        commit_cb = glib.timeout_add.call_args[0][1]
+        self.assertFalse(commit_cb())
+        commit.assert_called_once_with()
+        self.assertFalse(scheduler.pending)
+
+        # Nothing to flush.
+        scheduler.flush()
+        commit.assert_called_once_with()
+
+        scheduler.schedule()
+        scheduler.flush()
+        self.assertEqual(commit.call_count, 2)
+        glib.source_remove.assert_called_once_with(1)
+
+        scheduler.schedule()
+        scheduler.cancel()
+        scheduler.flush()
+        self.assertEqual(commit.call_count, 2)
+
+    def test_seek_flushes(self):
+        """Checks the pending commit is done before seeking."""
+        project = common.create_project()
+        ges_layer = project.ges_timeline.append_layer()
+        ges_clip = common.create_test_clip(GES.TitleClip)
+        ges_clip.props.duration = Gst.SECOND
+        self.assertTrue(ges_layer.add_clip(ges_clip))
+        pipeline = project.pipeline
+
+        with mock.patch.object(pipeline.commit_scheduler, "flush") as flush, \
+                mock.patch.object(SimplePipeline, "simple_seek") as simple_seek:
+            simple_seek.side_effect = lambda unused_pipeline, unused_position: \
+                flush.assert_called_once_with()
+            pipeline.simple_seek(Gst.SECOND / 2)
+        self.assertEqual(simple_seek.call_count, 1)
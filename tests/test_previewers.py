@@ -25,9 +25,14 @@ import numpy
 from gi.repository import GES
 from gi.repository import Gst
 
+from pitivi.timeline.previewers import AudioPreviewer
 from pitivi.timeline.previewers import get_wavefile_location_for_uri
 from pitivi.timeline.previewers import THUMB_HEIGHT
 from pitivi.timeline.previewers import ThumbnailCache
+from pitivi.timeline.previewers import WAVEFORM_TILE_WIDTH
+from pitivi.timeline.previewers import WAVEFORM_TILES_AHEAD
+from pitivi.timeline.previewers import WaveformTileCache
+from pitivi.utils.timeline import Zoomable
 from tests import common
 from tests.test_media_library import BaseTestMediaLibrary
 
@@ -111,3 +116,121 @@ class TestThumbnailCache(TestCase):
 
             asset = GES.UriClipAsset.request_sync(sample_uri)
             self.assertEqual(ThumbnailCache.get(asset), cache)
+
+
+# The number of tiles fitting in the cache of the tests.
+MAX_TILES = 8
+
+
+def create_surface(unused_samples, width, height):
+    """Creates a fake waveform surface."""
+    return mock.Mock(get_width=mock.Mock(return_value=width),
+                     get_height=mock.Mock(return_value=height),
+                     get_stride=mock.Mock(return_value=width * 4))
+
+
+class TestAudioPreviewer(TestCase):
+    """Tests for the waveform tiles of the AudioPreviewer class."""
+
+    def setUp(self):
+        tiles = WaveformTileCache(WAVEFORM_TILE_WIDTH * 4 * 50 * MAX_TILES)
+        patcher = mock.patch.object(WaveformTileCache, "_WaveformTileCache__shared", tiles)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_previewer(self):
+        uri = common.get_sample_uri("tears_of_steel.webm")
+        asset = GES.UriClipAsset.request_sync(uri)
+        ges_clip = asset.extract()
+        ges_timeline = common.create_timeline_container().timeline.ges_timeline
+        ges_layer = ges_timeline.append_layer()
+        self.assertTrue(ges_layer.add_clip(ges_clip))
+        audio_source, = [track_element
+                         for track_element in ges_clip.get_children(recursive=True)
+                         if track_element.get_track_type() == GES.TrackType.AUDIO]
+
+        with mock.patch.object(AudioPreviewer, "becomeControlled"):
+            previewer = AudioPreviewer(audio_source, 90)
+        previewer.samples = [float(i % 10) for i in range(10000)]
+        previewer.n_samples = len(previewer.samples)
+        previewer.discovered = True
+        previewer.props.width_request = WAVEFORM_TILE_WIDTH * (MAX_TILES + 10)
+        return previewer
+
+    @mock.patch("pitivi.timeline.previewers.renderer")
+    def test_tiles_cached(self, renderer):
+        """Checks the tiles are rendered once and the cache is bounded."""
+        renderer.fill_surface.side_effect = create_surface
+        previewer = self.create_previewer()
+
+        tile = previewer._get_tile(0, 50)
+        self.assertEqual(previewer._get_tile(0, 50), tile)
+        self.assertEqual(renderer.fill_surface.call_count, 1)
+        self.assertNotEqual(previewer._get_tile(0, 60), tile)
+        self.assertEqual(renderer.fill_surface.call_count, 2)
+
+        # The last tile is only as wide as the remaining part of the clip.
+        previewer.props.width_request = WAVEFORM_TILE_WIDTH * 3 + 10
+        self.assertEqual(previewer._get_tile(3, 50).get_width(), 10)
+        self.assertIsNone(previewer._get_tile(4, 50))
+
+        previewer.props.width_request = WAVEFORM_TILE_WIDTH * (MAX_TILES + 10)
+        for index in range(MAX_TILES + 5):
+            previewer._get_tile(index, 50)
+        self.assertEqual(len(previewer._tiles), MAX_TILES)
+        calls = renderer.fill_surface.call_count
+        previewer._get_tile(MAX_TILES + 4, 50)
+        self.assertEqual(renderer.fill_surface.call_count, calls)
+        previewer._get_tile(0, 50)
+        self.assertEqual(renderer.fill_surface.call_count, calls + 1)
+
+        previewer._inpoint_changed_cb(None, None)
+        self.assertEqual(len(previewer._tiles), 0)
+        self.assertEqual(previewer._tiles.size, 0)
+        previewer.release()
+
+    @mock.patch("pitivi.timeline.previewers.renderer")
+    def test_tiles_shared(self, renderer):
+        """Checks the previewers share the budget of the tiles."""
+        renderer.fill_surface.side_effect = create_surface
+        previewer1 = self.create_previewer()
+        previewer2 = self.create_previewer()
+        self.assertIs(previewer1._tiles, previewer2._tiles)
+        tiles = previewer1._tiles
+
+        for index in range(MAX_TILES):
+            previewer1._get_tile(index, 50)
+        previewer2._get_tile(0, 50)
+        self.assertEqual(len(tiles), MAX_TILES)
+        # The least recently used tile of the other previewer is evicted.
+        self.assertNotIn((previewer1, Zoomable.zoomratio, 0, 50), tiles)
+        self.assertIn((previewer2, Zoomable.zoomratio, 0, 50), tiles)
+
+        previewer2.release()
+        self.assertEqual(len(tiles), MAX_TILES - 1)
+        self.assertEqual(tiles.size, tiles.max_bytes - WAVEFORM_TILE_WIDTH * 4 * 50)
+        previewer1.release()
+        self.assertEqual(len(tiles), 0)
+
+    @mock.patch("pitivi.timeline.previewers.renderer")
+    def test_tiles_ahead(self, renderer):
+        """Checks the tiles in the scrolling direction are rendered on idle."""
+        renderer.fill_surface.side_effect = create_surface
+        previewer = self.create_previewer()
+        with mock.patch("pitivi.timeline.previewers.GLib.idle_add") as idle_add:
+            idle_add.return_value = 1
+            previewer._scroll_direction = 1
+            previewer._schedule_tiles_ahead(2, 4, 50)
+            self.assertEqual(idle_add.call_count, 1)
+            self.assertEqual(previewer._tiles_ahead,
+                             [(index, 50) for index in range(5, 5 + WAVEFORM_TILES_AHEAD)])
+
+            while previewer._render_ahead_cb():
+                pass
+            self.assertEqual(renderer.fill_surface.call_count, WAVEFORM_TILES_AHEAD)
+            self.assertEqual(previewer._render_ahead_id, 0)
+
+            previewer._scroll_direction = -1
+            previewer._schedule_tiles_ahead(0, 2, 50)
+            self.assertEqual(previewer._tiles_ahead, [])
+            self.assertEqual(idle_add.call_count, 1)
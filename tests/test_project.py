@@ -32,6 +32,7 @@ from pitivi.project import Project
 from pitivi.project import ProjectManager
 from pitivi.utils.misc import path_from_uri
 from pitivi.utils.proxy import ProxyingStrategy
+from pitivi.utils.threads import ThreadMaster
 from tests import common
 
 
@@ -281,6 +282,33 @@ class TestProjectManager(TestCase):
         self.assertFalse(os.path.isfile(path_from_uri(backup_uri)),
                          "Backup file not deleted when project closed")
 
+    def test_backup_in_background(self):
+        """Checks the backup is written by a separate thread."""
+        self.manager.app.threads = ThreadMaster()
+        self.manager.newBlankProject()
+        unused, xges_path = tempfile.mkstemp(suffix=".xges")
+        uri = "file://" + os.path.abspath(xges_path)
+        self.manager.current_project.uri = uri
+        backup_path = path_from_uri(self.manager._makeBackupURI(uri))
+
+        self.assertTrue(self.manager.saveBackupInBackground())
+        writer = self.manager._ProjectManager__backup_writer
+        # No backup is started while the previous one is being written.
+        with mock.patch.object(writer, "is_alive", return_value=True):
+            self.assertFalse(self.manager.saveBackupInBackground())
+        writer.join()
+        self.assertTrue(writer.serialized.is_set())
+        self.manager.wait_backup_serialized()
+        self.assertTrue(os.path.isfile(backup_path))
+        # The temporary file the timeline is serialized to has been renamed.
+        backup_dir, backup_name = os.path.split(backup_path)
+        self.assertFalse([name for name in os.listdir(backup_dir)
+                          if name.startswith("." + backup_name)])
+
+        self.manager.closeRunningProject()
+        self.assertFalse(os.path.isfile(backup_path),
+                         "Backup file not deleted when project closed")
+
 
 class TestProjectLoading(common.TestCase):
 
@@ -138,6 +138,56 @@ class TestRender(common.TestCase):
                 with mock.patch.object(dialog, "_pipeline"):
                     return dialog._renderButtonClickedCb(None)
 
+    def test_background_render(self):
+        """Checks the background render leaves the timeline editable."""
+        project = self.create_simple_project()
+        dialog = self.create_rendering_dialog(project)
+        dialog.app.settings.backgroundRender = True
+
+        from pitivi.render import BackgroundRenderIndicator
+        with mock.patch("pitivi.render.SegmentedRender") as segmented_render_class:
+            segmented_render = segmented_render_class.return_value
+            segmented_render.start.return_value = True
+            with mock.patch.object(dialog, "_pipeline") as pipeline:
+                dialog._renderButtonClickedCb(None)
+        pipeline.set_mode.assert_not_called()
+        indicator, = dialog.app.gui.show_background_task.call_args[0]
+        self.assertIsInstance(indicator, BackgroundRenderIndicator)
+        dialog.app.simple_inhibit.assert_called_once()
+
+        handlers = {args[0]: args[1]
+                    for args, unused_kwargs in segmented_render.connect.call_args_list}
+        segmented_render.rendered_ranges = [(0, 5 * Gst.SECOND)]
+        handlers["progress"](segmented_render, 5 * Gst.SECOND, 10 * Gst.SECOND)
+        self.assertEqual(indicator.progressbar.get_fraction(), 0.5)
+
+        with mock.patch.object(dialog, "_maybe_play_finished_sound"):
+            handlers["done"](segmented_render)
+        segmented_render.cancel.assert_called_once_with()
+        dialog.app.simple_uninhibit.assert_called_once()
+        dialog.app.system.desktopMessage.assert_called_once()
+
+    def test_background_render_project_closed(self):
+        """Checks the background render is stopped with the project."""
+        project = self.create_simple_project()
+        dialog = self.create_rendering_dialog(project)
+        dialog.app.settings.backgroundRender = True
+
+        with mock.patch("pitivi.render.SegmentedRender") as segmented_render_class:
+            segmented_render = segmented_render_class.return_value
+            segmented_render.start.return_value = True
+            with mock.patch.object(dialog, "_pipeline"):
+                dialog._renderButtonClickedCb(None)
+
+        project_manager = dialog.app.project_manager
+        project_manager.emit("project-closed", project)
+        segmented_render.cancel.assert_called_once_with()
+        dialog.app.simple_uninhibit.assert_called_once()
+
+        # Closing the next project has no effect.
+        project_manager.emit("project-closed", project)
+        segmented_render.cancel.assert_called_once_with()
+
     @skipUnless(*factory_exists("x264enc", "matroskamux"))
     def test_encoder_restrictions(self):
         """Checks the mechanism to respect encoder specific restrictions."""
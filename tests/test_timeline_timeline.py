@@ -20,6 +20,7 @@ from unittest import mock
 
 from gi.repository import Gdk
 from gi.repository import GES
+from gi.repository import Gst
 from gi.repository import Gtk
 
 from pitivi.utils.ui import LAYER_HEIGHT
@@ -519,3 +520,41 @@ class TestEditing(BaseTestTimeline):
         timeline._button_release_event_cb(None, event)
         self.assertEqual(len(timeline.ges_timeline.get_layers()), 1,
                          "No new layer should have been created")
+
+
+class TestBulkEdit(BaseTestTimeline):
+    """Tests for the bulk edits."""
+
+    def test_bulk_edit(self):
+        """Checks the commits and the widget updates are done once."""
+        timeline_container = create_timeline_container()
+        timeline = timeline_container.timeline
+        project = timeline_container._project
+        clips = self.addClipsSimple(timeline, 3)
+        x = clips[1].ui._current_x
+
+        with mock.patch.object(project.pipeline, "getState") as get_state, \
+                mock.patch.object(project.pipeline, "_addWaitingForAsyncDoneTimeout"), \
+                mock.patch.object(project.ges_timeline, "commit") as commit:
+            get_state.return_value = Gst.State.PAUSED
+            with project.bulk_edit():
+                with project.bulk_edit():
+                    for clip in clips:
+                        clip.set_start(clip.start + 10 * Gst.SECOND)
+                    project.pipeline.commit_timeline()
+                project.pipeline.commit_timeline()
+                commit.assert_not_called()
+                self.assertEqual(clips[1].ui._current_x, x)
+
+            commit.assert_called_once_with()
+            self.assertEqual(clips[1].ui._current_x,
+                             timeline.nsToPixel(clips[1].start))
+            self.assertNotEqual(clips[1].ui._current_x, x)
+
+            # Outside the bulk edits the commits are merged for a short time.
+            project.pipeline.commit_timeline()
+            project.pipeline.commit_timeline()
+            self.assertEqual(commit.call_count, 1)
+            project.pipeline.commit_scheduler.flush()
+            self.assertEqual(commit.call_count, 2)
+            self.assertEqual(project.pipeline.commit_scheduler.saved, 1)
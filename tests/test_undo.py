@@ -21,6 +21,7 @@ from unittest import TestCase
 
 from gi.repository import GES
 
+from pitivi.undo.undo import ACTION_SIZE
 from pitivi.undo.undo import GObjectObserver
 from pitivi.undo.undo import PropertyChangedAction
 from pitivi.undo.undo import UndoableAction
@@ -388,6 +389,103 @@ class TestUndoableActionLog(TestCase):
         self.log.begin("nested1")
         self.log.begin("nested2", toplevel=False)
 
+    def _commit_action(self, action_group_name="meh", size=None):
+        action = mock.Mock(spec=UndoableAction)
+        action.expand.return_value = False
+        action.estimate_size.return_value = size
+        with self.log.started(action_group_name):
+            self.log.push(action)
+        return action
+
+    def test_max_depth(self):
+        """Checks the oldest operations are forgotten."""
+        self.log.max_depth = 2
+        self._commit_action("one")
+        self._commit_action("two")
+        self._commit_action("three")
+        self.assertEqual([stack.action_group_name for stack in self.log.undo_stacks],
+                         ["two", "three"])
+
+    def test_dirty_after_forgetting(self):
+        """Checks undoing all the kept operations does not look unmodified."""
+        self.log.max_depth = 1
+        self._commit_action("one")
+        self._commit_action("two")
+        self.log.undo()
+        self.assertFalse(self.log.undo_stacks)
+        self.assertTrue(self.log.dirty())
+
+        self.log.checkpoint()
+        self.assertFalse(self.log.dirty())
+        self.log.redo()
+        self.assertTrue(self.log.dirty())
+
+    def test_max_memory(self):
+        """Checks the operations keeping too much memory are forgotten."""
+        self.log.max_memory = 10000
+        self._commit_action("one", size=4000)
+        self._commit_action("two", size=4000)
+        self.assertEqual(len(self.log.undo_stacks), 2)
+        self._commit_action("three", size=4000)
+        self.assertEqual([stack.action_group_name for stack in self.log.undo_stacks],
+                         ["two", "three"])
+
+        # The last operation is kept even if it's too big.
+        self._commit_action("four", size=20000)
+        self.assertEqual([stack.action_group_name for stack in self.log.undo_stacks],
+                         ["four"])
+
+        self.log.undo()
+        self._commit_action("five", size=100)
+        self.assertEqual(self.log.redo_stacks, [])
+        self.assertLessEqual(self.log.size, self.log.max_memory)
+
+    def test_max_memory_after_undo(self):
+        """Checks the undone operations are not counted in max_memory."""
+        self.log.max_memory = 10000
+        self._commit_action("one", size=4000)
+        self._commit_action("two", size=4000)
+        self.log.undo()
+        self._commit_action("three", size=4000)
+        self.assertEqual([stack.action_group_name for stack in self.log.undo_stacks],
+                         ["one", "three"])
+        self.assertEqual(self.log.size, 2 * 4000 + 2 * ACTION_SIZE)
+
+    def test_coalesce_size(self):
+        """Checks the size of an operation grows when it is coalesced."""
+        self.log.max_memory = 10000
+        action = self._commit_action("change", size=1000)
+        action.expand.return_value = True
+        action.estimate_size.return_value = 3000
+        self._commit_action("change", size=1000)
+        self.assertEqual(len(self.log.undo_stacks), 1)
+        self.assertEqual(self.log.undo_stacks[0].size, 3000 + ACTION_SIZE)
+        self.assertEqual(self.log.size, 3000 + ACTION_SIZE)
+
+    def test_coalesce(self):
+        """Checks consecutive changes of the same property are merged."""
+        gobject = mock.Mock()
+        with self.log.started("change"):
+            self.log.push(PropertyChangedAction(gobject, "field", 5, 7))
+        self.log.checkpoint()
+        with self.log.started("change"):
+            self.log.push(PropertyChangedAction(gobject, "field", 7, 9))
+        self.assertEqual(len(self.log.undo_stacks), 1)
+        self.assertTrue(self.log.dirty())
+
+        self.log.undo()
+        gobject.set_property.assert_called_once_with("field", 5)
+        self.assertFalse(self.log.undo_stacks)
+
+        # Not merged after an undo.
+        self.log.redo()
+        self.log.undo()
+        with self.log.started("change"):
+            self.log.push(PropertyChangedAction(gobject, "field", 5, 6))
+        with self.log.started("other change"):
+            self.log.push(PropertyChangedAction(gobject, "field", 6, 8))
+        self.assertEqual(len(self.log.undo_stacks), 2)
+
     def test_failing_operation_rollback(self):
         """Checks that failing operations are rolled back."""
         action = mock.Mock(spec=UndoableAction)
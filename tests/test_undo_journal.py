@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the undo.journal module."""
+# pylint: disable=protected-access,no-self-use
+import os
+import shutil
+import tempfile
+from unittest import mock
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.undo.journal import EditJournal
+from pitivi.undo.journal import load_journal
+from pitivi.undo.journal import replay_journal
+from pitivi.undo.undo import UndoableAction
+from tests import common
+
+
+class TestEditJournal(TestCase):
+    """Tests for the EditJournal class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, "project.xges")
+        with open(self.base_path, "w") as base_file:
+            base_file.write("<ges/>")
+        self.journal_path = self.base_path + ".journal~"
+
+        self.app = common.create_pitivi()
+        self.app.project_manager.newBlankProject()
+        self.timeline = self.app.project_manager.current_project.ges_timeline
+        self.layer = self.timeline.append_layer()
+        self.action_log = self.app.action_log
+
+        self.journal = EditJournal(self.journal_path, self.action_log)
+        self.journal.checkpoint()
+        self.assertTrue(self.journal.rebase(self.base_path))
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.temp_dir)
+
+    def add_clip(self):
+        """Adds a title clip and moves it, in two operations."""
+        clip = common.create_test_clip(GES.TitleClip)
+        clip.props.duration = 2 * Gst.SECOND
+        with self.action_log.started("add clip"):
+            self.layer.add_clip(clip)
+        with self.action_log.started("move clip"):
+            clip.props.start = 10 * Gst.SECOND
+        return clip
+
+    def push_unsupported_action(self):
+        """Commits an operation which cannot be replayed."""
+        action = mock.Mock(spec=UndoableAction)
+        action.asScenarioAction.side_effect = NotImplementedError
+        action.expand.return_value = False
+        action.estimate_size.return_value = 0
+        with self.action_log.started("unsupported"):
+            self.action_log.push(action)
+
+    def replay(self, structures):
+        """Replays the journaled changes in a new project."""
+        app = common.create_pitivi()
+        app.project_manager.newBlankProject()
+        project = app.project_manager.current_project
+        project.ges_timeline.append_layer()
+        self.assertEqual(replay_journal(project, structures), len(structures))
+        return project
+
+    def test_replay(self):
+        """Checks the journaled operations can be replayed."""
+        self.assertIsNone(load_journal(self.journal_path))
+        clip = self.add_clip()
+
+        base_path, structures = load_journal(self.journal_path)
+        self.assertEqual(base_path, self.base_path)
+        # The added clip is written with the state of its children.
+        self.assertEqual(structures[0].get_name(), "add-clip")
+        self.assertEqual(structures[-1].get_name(), "set-property")
+
+        project = self.replay(structures)
+        replayed_clip = project.ges_timeline.get_element(clip.get_name())
+        self.assertEqual(replayed_clip.props.start, 10 * Gst.SECOND)
+        self.assertEqual(replayed_clip.props.duration, 2 * Gst.SECOND)
+
+    def test_replay_effect(self):
+        """Checks the effects added by the user can be replayed."""
+        clip = self.add_clip()
+        effect = GES.Effect.new("agingtv")
+        with self.action_log.started("add effect"):
+            clip.add(effect)
+        with self.action_log.started("remove effect"):
+            clip.remove(effect)
+        self.assertFalse(self.journal.broken)
+
+        unused_base_path, structures = load_journal(self.journal_path)
+        names = [structure.get_name() for structure in structures]
+        self.assertIn("container-add-child", names)
+        self.assertIn("container-remove-child", names)
+
+        project = self.replay(structures)
+        replayed_clip = project.ges_timeline.get_element(clip.get_name())
+        self.assertFalse([child for child in replayed_clip.get_children(False)
+                          if isinstance(child, GES.Effect)])
+
+    def test_unsupported_action_emits_broken(self):
+        """Checks a full save is requested when an operation is missed."""
+        broken_cb = mock.Mock()
+        self.journal.connect("broken", broken_cb)
+        self.add_clip()
+        broken_cb.assert_not_called()
+
+        self.push_unsupported_action()
+        self.assertEqual(broken_cb.call_count, 1)
+        # The signal is emitted only once until the journal is rebased.
+        self.push_unsupported_action()
+        self.assertEqual(broken_cb.call_count, 1)
+
+    def test_unsupported_action_breaks_journal(self):
+        """Checks the journal stops growing when it cannot be replayed."""
+        self.add_clip()
+        unused_base_path, structures = load_journal(self.journal_path)
+        self.push_unsupported_action()
+        self.assertTrue(self.journal.broken)
+        with self.action_log.started("add layer"):
+            self.timeline.append_layer()
+        unused_base_path, broken_structures = load_journal(self.journal_path)
+        self.assertEqual(len(broken_structures), len(structures))
+
+        # A full save started after the unsupported operation makes the journal usable again.
+        self.journal.checkpoint()
+        with self.action_log.started("add layer"):
+            self.timeline.append_layer()
+        self.assertTrue(self.journal.rebase(self.base_path))
+        self.assertFalse(self.journal.broken)
+        unused_base_path, structures = load_journal(self.journal_path)
+        self.assertEqual([structure.get_name() for structure in structures],
+                         ["add-layer"])
+
+    def test_replay_undo_redo(self):
+        """Checks the undone and redone operations are journaled."""
+        clip = self.add_clip()
+        self.action_log.undo()
+        self.action_log.undo()
+        self.assertFalse(self.journal.broken)
+        unused_base_path, structures = load_journal(self.journal_path)
+        self.assertEqual(structures[-1].get_name(), "remove-clip")
+        project = self.replay(structures)
+        self.assertFalse(project.ges_timeline.get_layers()[0].get_clips())
+
+        self.action_log.redo()
+        self.assertFalse(self.journal.broken)
+        unused_base_path, structures = load_journal(self.journal_path)
+        project = self.replay(structures)
+        # The clip has been restored with a new name.
+        replayed_clip = project.ges_timeline.get_element(clip.get_name())
+        self.assertEqual(replayed_clip.props.start, 0)
+        self.assertEqual(replayed_clip.props.duration, 2 * Gst.SECOND)
+
+    def test_replay_split(self):
+        """Checks the clips created by splitting are journaled."""
+        clip = self.add_clip()
+        with self.action_log.started("split clip"):
+            clip2 = clip.split(11 * Gst.SECOND)
+        self.assertFalse(self.journal.broken)
+
+        unused_base_path, structures = load_journal(self.journal_path)
+        project = self.replay(structures)
+        replayed_clip = project.ges_timeline.get_element(clip.get_name())
+        self.assertEqual(replayed_clip.props.duration, Gst.SECOND)
+        replayed_clip2 = project.ges_timeline.get_element(clip2.get_name())
+        self.assertEqual(replayed_clip2.props.start, 11 * Gst.SECOND)
+        self.assertEqual(replayed_clip2.props.duration, Gst.SECOND)
+
+    def test_replay_move_layers(self):
+        """Checks the layer moves are journaled."""
+        layer2 = self.timeline.append_layer()
+        clip = self.add_clip()
+        with self.action_log.started("move layer"):
+            self.layer.props.priority = 1
+            layer2.props.priority = 0
+        self.assertEqual(layer2.props.priority, 0)
+        self.assertFalse(self.journal.broken)
+
+        unused_base_path, structures = load_journal(self.journal_path)
+        self.assertEqual(structures[-1].get_name(), "move-layers")
+        app = common.create_pitivi()
+        app.project_manager.newBlankProject()
+        project = app.project_manager.current_project
+        project.ges_timeline.append_layer()
+        project.ges_timeline.append_layer()
+        self.assertEqual(replay_journal(project, structures), len(structures))
+        replayed_clip = project.ges_timeline.get_element(clip.get_name())
+        self.assertEqual(replayed_clip.props.layer.props.priority, 1)
+
+    def test_journal_synced(self):
+        """Checks the appended operations are synced to the disk."""
+        self.add_clip()
+        with mock.patch("pitivi.undo.journal.os.fsync") as fsync:
+            with self.action_log.started("add layer"):
+                self.timeline.append_layer()
+        fsync.assert_called_once()
+
+    def test_base_changed(self):
+        """Checks the journal is ignored when the full save changes."""
+        self.add_clip()
+        self.assertIsNotNone(load_journal(self.journal_path))
+
+        with open(self.base_path, "a") as base_file:
+            base_file.write("\n")
+        self.assertIsNone(load_journal(self.journal_path))
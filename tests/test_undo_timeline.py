@@ -752,6 +752,58 @@ class TestTimelineElementObserver(BaseTestUndoTimeline):
         self.action_log.redo()
         self.assertEqual(source.get_child_property("text")[1], "pigs fly!")
 
+    def test_lazy_snapshot(self):
+        """Checks the props are read only when an operation starts."""
+        clip1 = GES.TitleClip()
+        self.layer.add_clip(clip1)
+        source = clip1.get_children(False)[0]
+        timeline_observer = self.app.project_observer.timeline_observer
+        observer = timeline_observer.layer_observers[self.layer].track_element_observers[source]
+        self.assertIsNone(observer._properties)
+        self.assertEqual(len(timeline_observer.pending_snapshots), 1)
+
+        # A change outside an operation is not recorded.
+        source.set_child_property("text", "pigs fly!")
+        self.assertIn("pigs fly!", observer._properties.values())
+        self.assertEqual(len(timeline_observer.pending_snapshots), 0)
+
+        clip2 = GES.TitleClip()
+        self.layer.add_clip(clip2)
+        source2 = clip2.get_children(False)[0]
+        with self.action_log.started("Title text change"):
+            self.assertEqual(len(timeline_observer.pending_snapshots), 0)
+            source2.set_child_property("text", "cows fly!")
+        self.action_log.undo()
+        self.assertEqual(source2.get_child_property("text")[1], "")
+
+    def test_snapshot_in_operation(self):
+        """Checks the elements added in an operation can change in it."""
+        clip1 = GES.TitleClip()
+        self.layer.add_clip(clip1)
+        effect1 = GES.Effect.new("agingtv")
+        with self.action_log.started("add effect"):
+            clip1.add(effect1)
+            effect1.set_child_property("scratch-lines", 0)
+
+        self.action_log.undo()
+        self.assertFalse(effect1 in clip1.get_children(True))
+        self.assertEqual(effect1.get_child_property("scratch-lines")[1], 7)
+
+        self.action_log.redo()
+        self.assertTrue(effect1 in clip1.get_children(True))
+        self.assertEqual(effect1.get_child_property("scratch-lines")[1], 0)
+
+    def test_release_pending_snapshots(self):
+        """Checks the snapshots are not taken after the project is closed."""
+        clip1 = GES.TitleClip()
+        self.layer.add_clip(clip1)
+        timeline_observer = self.app.project_observer.timeline_observer
+        self.assertEqual(len(timeline_observer.pending_snapshots), 1)
+
+        self.assertTrue(self.app.project_manager.closeRunningProject())
+        self.assertIsNone(self.app.project_observer)
+        self.assertEqual(len(timeline_observer.pending_snapshots), 0)
+
     def test_add_effect_change_property(self):
         stacks = []
         self.action_log.connect("commit", BaseTestUndoTimeline.commit_cb, stacks)
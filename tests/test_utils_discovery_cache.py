@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.discovery_cache module."""
+# pylint: disable=protected-access,no-self-use
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+from gi.repository import GstPbutils
+
+from pitivi.utils.discovery_cache import DiscoveryCache
+from pitivi.utils.misc import path_from_uri
+from tests import common
+
+
+class TestDiscoveryCache(TestCase):
+    """Tests for the DiscoveryCache class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = DiscoveryCache(os.path.join(self.temp_dir, "cache"))
+        self.uri = Gst.filename_to_uri(os.path.join(self.temp_dir, "clip.webm"))
+        shutil.copy(path_from_uri(common.get_sample_uri("tears_of_steel.webm")),
+                    path_from_uri(self.uri))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_store_lookup(self):
+        """Checks the cached info is the same as the discovered one."""
+        self.assertIsNone(self.cache.lookup(self.uri))
+        self.assertEqual(self.cache.misses, 1)
+
+        info = GES.UriClipAsset.request_sync(self.uri).get_info()
+        self.cache.store(info)
+        self.cache.flush()
+
+        cached_info = self.cache.lookup(self.uri)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(cached_info.get_uri(), self.uri)
+        self.assertEqual(cached_info.get_duration(), info.get_duration())
+        self.assertEqual(len(cached_info.get_video_streams()),
+                         len(info.get_video_streams()))
+        self.assertEqual(len(cached_info.get_audio_streams()),
+                         len(info.get_audio_streams()))
+
+    def test_file_changed(self):
+        """Checks the cached info is not used when the file changes."""
+        info = GES.UriClipAsset.request_sync(self.uri).get_info()
+        self.cache.store(info)
+        self.cache.flush()
+        self.assertIsNotNone(self.cache.lookup(self.uri))
+
+        with open(path_from_uri(self.uri), "ab") as file:
+            file.write(b"more data")
+        self.assertIsNone(self.cache.lookup(self.uri))
+
+    def test_prune(self):
+        """Checks the least recently used infos are removed."""
+        info = GES.UriClipAsset.request_sync(self.uri).get_info()
+        self.cache.store(info)
+        self.cache.flush()
+        path = self.cache._path(self.cache.fingerprint(self.uri))
+        self.assertTrue(os.path.exists(path))
+
+        self.assertEqual(self.cache.prune(), [])
+        # An info not used for a long time is removed.
+        old = time.time() - self.cache.max_age - 1
+        os.utime(path, (old, old))
+        self.assertEqual(self.cache.prune(), [path])
+        self.assertIsNone(self.cache.lookup(self.uri))
+
+        # The infos are removed when the cache is too big.
+        self.cache.store(info)
+        self.cache.flush()
+        self.cache.max_size = 0
+        self.assertEqual(self.cache.prune(), [path])
+
+    def test_install_without_manager(self):
+        """Checks the GES discoverers reuse the serialized info."""
+        if not hasattr(GstPbutils.Discoverer.props, "use_cache"):
+            self.skipTest("GstDiscoverer cannot reuse serialized info")
+
+        with mock.patch.object(GES, "DiscovererManager", None, create=True), \
+                mock.patch("pitivi.utils.discovery_cache.GObject.add_emission_hook") as add_hook:
+            self.assertTrue(self.cache.install())
+        self.assertTrue(self.cache.installed)
+        unused_type, signal_name, hook = add_hook.call_args[0]
+        self.assertEqual(signal_name, "source-setup")
+
+        discoverer = GstPbutils.Discoverer.new(Gst.SECOND)
+        self.assertTrue(hook(discoverer, None))
+        self.assertTrue(discoverer.props.use_cache)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.discovery_scheduler module."""
+# pylint: disable=protected-access,no-self-use
+from unittest import mock
+from unittest import TestCase
+
+from pitivi.utils.discovery_scheduler import DiscoveryScheduler
+from pitivi.utils.discovery_scheduler import PRIORITY_LIBRARY
+from pitivi.utils.discovery_scheduler import PRIORITY_TIMELINE
+
+
+class TestDiscoveryScheduler(TestCase):
+    """Tests for the DiscoveryScheduler class."""
+
+    def setUp(self):
+        self.project = mock.Mock()
+        self.project.get_asset.return_value = None
+        self.project.create_asset.return_value = True
+        self.callbacks = {}
+
+        def connect(signal, callback):  # pylint: disable=missing-docstring
+            self.callbacks[signal] = callback
+        self.project.connect.side_effect = connect
+
+    def created_uris(self):
+        """Gets the URIs for which the assets have been created."""
+        return [args[0] for args, unused_kwargs in
+                self.project.create_asset.call_args_list]
+
+    def finish(self, uri):
+        """Simulates the end of the discovery of the specified URI."""
+        asset = mock.Mock()
+        asset.get_id.return_value = uri
+        self.callbacks["asset-added"](self.project, asset)
+
+    def test_width(self):
+        """Checks the number of assets discovered at the same time is bounded."""
+        scheduler = DiscoveryScheduler(self.project, 2)
+        progress_cb = mock.Mock()
+        scheduler.connect("progress", progress_cb)
+
+        for uri in ("file:///a", "file:///b", "file:///c", "file:///d"):
+            self.assertTrue(scheduler.add(uri))
+        self.assertFalse(scheduler.add("file:///a"))
+        self.assertEqual(self.created_uris(), ["file:///a", "file:///b"])
+
+        self.finish("file:///b")
+        self.assertEqual(self.created_uris(), ["file:///a", "file:///b", "file:///c"])
+        progress_cb.assert_called_once_with(scheduler, 1, 4)
+
+        self.callbacks["error-loading-asset"](self.project, None, "file:///a", None)
+        self.finish("file:///c")
+        self.finish("file:///d")
+        self.assertEqual(len(self.created_uris()), 4)
+        self.assertFalse(scheduler.pending)
+        self.assertEqual(progress_cb.call_count, 4)
+        self.assertEqual(scheduler.total, 0)
+
+    def test_priority(self):
+        """Checks the urgent assets are discovered first."""
+        scheduler = DiscoveryScheduler(self.project, 1)
+        scheduler.add("file:///a")
+        scheduler.add("file:///b")
+        scheduler.add("file:///c")
+        scheduler.add("file:///d", PRIORITY_TIMELINE)
+        scheduler.add("file:///e", PRIORITY_LIBRARY)
+        scheduler.prioritize(["file:///c"])
+
+        for uri in ("file:///a", "file:///d", "file:///c", "file:///e",
+                    "file:///b"):
+            self.assertEqual(self.created_uris()[-1], uri)
+            self.finish(uri)
+        self.assertFalse(scheduler.pending)
+
+    def test_existing_asset(self):
+        """Checks the assets already in the project are not discovered."""
+        scheduler = DiscoveryScheduler(self.project, 1)
+        self.project.get_asset.return_value = mock.Mock()
+        self.assertFalse(scheduler.add("file:///a"))
+
+        self.project.get_asset.return_value = None
+        self.project.create_asset.return_value = False
+        self.assertTrue(scheduler.add("file:///b"))
+        self.assertTrue(scheduler.add("file:///c"))
+        self.assertEqual(self.created_uris(), ["file:///b", "file:///c"])
+        self.assertFalse(scheduler.pending)
+
+    def test_release(self):
+        """Checks no asset is created after the project is closed."""
+        scheduler = DiscoveryScheduler(self.project, 1)
+        scheduler.add("file:///a")
+        scheduler.add("file:///b")
+        scheduler.release()
+        self.assertFalse(scheduler.pending)
+        self.assertEqual(scheduler.total, 0)
+
+        self.finish("file:///a")
+        self.assertEqual(self.created_uris(), ["file:///a"])
+        self.assertEqual(self.project.disconnect_by_func.call_count, 2)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.fileio module."""
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from pitivi.utils.fileio import prune_cache_dir
+
+
+class TestPruneCacheDir(TestCase):
+    """Tests for the prune_cache_dir function."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_prune_cache_dir(self):
+        """Checks the least recently used files are removed first."""
+        now = time.time()
+        paths = []
+        for index, age in enumerate([50, 40, 30, 20, 10]):
+            path = os.path.join(self.cache_dir, "%d.mkv" % index)
+            with open(path, "wb") as file:
+                file.write(b"x" * 100)
+            os.utime(path, (now - age, now - age))
+            paths.append(path)
+
+        self.assertEqual(prune_cache_dir(self.cache_dir, 500, 100), [])
+        self.assertEqual(prune_cache_dir(self.cache_dir, 300, 100, keep=[paths[0]]),
+                         paths[1:3])
+        self.assertEqual(prune_cache_dir(self.cache_dir, 500, 15),
+                         [paths[0], paths[3]])
+        self.assertEqual(os.listdir(self.cache_dir), ["4.mkv"])
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.frame_cache module."""
+# pylint: disable=protected-access,no-self-use
+from unittest import mock
+from unittest import TestCase
+
+import cairo
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.utils.frame_cache import frame_index
+from pitivi.utils.frame_cache import frame_position
+from pitivi.utils.frame_cache import FrameCache
+from pitivi.utils.frame_cache import FramePrefetcher
+from pitivi.utils.frame_cache import PREFETCH_DELAY_MS
+from pitivi.utils.frame_cache import prefetch_order
+from pitivi.utils.frame_cache import SNAPSHOT_DELAY_MS
+from pitivi.utils.pipeline import Pipeline
+from tests import common
+
+
+def create_frame():
+    """Creates a 10x10 frame taking 400 bytes."""
+    return cairo.ImageSurface(cairo.FORMAT_RGB24, 10, 10)
+
+
+class TestFrameCache(TestCase):
+    """Tests for the FrameCache class."""
+
+    def test_frame_index(self):
+        """Checks the conversions between positions and frames."""
+        framerate = Gst.Fraction(25, 1)
+        self.assertEqual(frame_index(0, framerate), 0)
+        self.assertEqual(frame_index(Gst.SECOND - 1, framerate), 24)
+        for frame in (0, 1, 24, 1000):
+            self.assertEqual(frame_index(frame_position(frame, framerate), framerate),
+                             frame)
+
+    def test_prefetch_order(self):
+        """Checks the nearest frames are prefetched first."""
+        self.assertEqual(prefetch_order(10, 4), [10, 11, 9, 12, 8, 13, 14])
+        self.assertEqual(prefetch_order(0, 2), [0, 1, 2])
+
+    def test_lru(self):
+        """Checks the least recently used frames are evicted."""
+        cache = FrameCache(1200)
+        cache.set_framerate(Gst.Fraction(25, 1))
+        for frame in range(3):
+            self.assertTrue(cache.add(0, frame, create_frame()))
+        self.assertEqual(cache.size, 1200)
+
+        self.assertIsNotNone(cache.lookup(0))
+        cache.add(0, 3, create_frame())
+        self.assertNotIn(1, cache)
+        self.assertIn(0, cache)
+        self.assertEqual(len(cache), 3)
+
+        self.assertIsNone(cache.lookup(1))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNotNone(cache.lookup_position(frame_position(3, cache.framerate)))
+
+        cache.set_max_bytes(400)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(3, cache)
+
+    def test_invalidate(self):
+        """Checks the frames of an older timeline are not cached."""
+        cache = FrameCache(10000)
+        self.assertFalse(cache.add(0, 0, create_frame()))
+        cache.set_framerate(Gst.Fraction(25, 1))
+        generation = cache.generation
+        self.assertTrue(cache.add(generation, 0, create_frame()))
+
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+        self.assertFalse(cache.add(generation, 0, create_frame()))
+        self.assertTrue(cache.add(cache.generation, 0, create_frame()))
+
+        cache.set_framerate(Gst.Fraction(25, 1))
+        self.assertEqual(len(cache), 1)
+        cache.set_framerate(Gst.Fraction(30, 1))
+        self.assertEqual(len(cache), 0)
+
+    def test_prefetch_delay(self):
+        """Checks the timeline is not snapshotted while it's being edited."""
+        cache = FrameCache(10 * 400)
+        prefetcher = FramePrefetcher(cache, 4)
+        ges_timeline = mock.Mock()
+        ges_timeline.props.duration = 10 * Gst.SECOND
+        video_caps = (320, 240, Gst.Fraction(25, 1))
+        with mock.patch("pitivi.utils.frame_cache.get_video_caps",
+                        return_value=video_caps), \
+                mock.patch("pitivi.utils.frame_cache.GLib") as glib:
+            prefetcher.schedule(ges_timeline, 0)
+            self.assertEqual(glib.timeout_add.call_args[0][0], PREFETCH_DELAY_MS)
+
+            # Pretend a snapshot has been made, then the timeline changed.
+            prefetcher._FramePrefetcher__generation = cache.generation
+            cache.invalidate()
+            prefetcher.schedule(ges_timeline, 0)
+            self.assertEqual(glib.timeout_add.call_args[0][0], SNAPSHOT_DELAY_MS)
+            glib.source_remove.assert_called_once()
+
+    def test_pipeline(self):
+        """Checks the pipeline invalidates the cache and shows cached frames."""
+        ges_timeline = GES.Timeline.new_audio_video()
+        ges_layer = ges_timeline.append_layer()
+        ges_clip = common.create_test_clip(GES.TitleClip)
+        ges_clip.props.duration = Gst.SECOND
+        self.assertTrue(ges_layer.add_clip(ges_clip))
+        pipe = Pipeline(common.create_pitivi_mock(frameCacheSize=1))
+        pipe.set_timeline(ges_timeline)
+        pipe.frame_cache.set_framerate(Gst.Fraction(25, 1))
+        generation = pipe.frame_cache.generation
+        frame = create_frame()
+        pipe.frame_cache.add(generation, 5, frame)
+
+        cached_frame_cb = mock.Mock()
+        pipe.connect("cached-frame", cached_frame_cb)
+        position = frame_position(5, pipe.frame_cache.framerate)
+        with mock.patch.object(pipe, "getState") as get_state, \
+                mock.patch("pitivi.utils.pipeline.SimplePipeline.simple_seek"):
+            get_state.return_value = Gst.State.PAUSED
+            pipe.simple_seek(position)
+        cached_frame_cb.assert_called_once_with(pipe, position, frame)
+
+        pipe.commit_timeline()
+        self.assertEqual(pipe.frame_cache.generation, generation + 1)
+        self.assertEqual(len(pipe.frame_cache), 0)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.preview_cache module."""
+# pylint: disable=protected-access,no-self-use
+import os
+import shutil
+import tempfile
+from unittest import mock
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.utils.preview_cache import heavy_ranges
+from pitivi.utils.preview_cache import merge_ranges
+from pitivi.utils.preview_cache import PreviewCache
+from pitivi.utils.preview_cache import range_hash
+from tests import common
+
+
+class TestPreviewCache(TestCase):
+    """Tests for the pre-render of the heavy ranges."""
+
+    def setUp(self):
+        self.project = common.create_project()
+        self.ges_timeline = self.project.ges_timeline
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        common.remove_temp_dir()
+
+    def add_title(self, ges_layer, start, duration, effects=0):
+        """Adds a title clip with the specified number of effects."""
+        ges_clip = common.create_test_clip(GES.TitleClip)
+        ges_clip.props.start = start * Gst.SECOND
+        ges_clip.props.duration = duration * Gst.SECOND
+        self.assertTrue(ges_layer.add_clip(ges_clip))
+        for unused_i in range(effects):
+            self.assertTrue(ges_clip.add(GES.Effect.new("agingtv")))
+        return ges_clip
+
+    def test_merge_ranges(self):
+        """Checks the overlapping and adjacent ranges are merged."""
+        self.assertEqual(merge_ranges([(5, 8), (0, 2), (2, 3), (7, 10)]),
+                         [(0, 3), (5, 10)])
+        self.assertEqual(merge_ranges([]), [])
+
+    def test_heavy_ranges(self):
+        """Checks the regions with many clips and effects are detected."""
+        layer1 = self.ges_timeline.append_layer()
+        layer2 = self.ges_timeline.append_layer()
+        self.add_title(layer1, 0, 10)
+        self.add_title(layer2, 2, 3, effects=2)
+        self.add_title(layer2, 8, 1, effects=3)
+
+        self.assertEqual(heavy_ranges(self.ges_timeline, 4,
+                                      min_duration=2 * Gst.SECOND),
+                         [(2 * Gst.SECOND, 5 * Gst.SECOND)])
+        self.assertEqual(heavy_ranges(self.ges_timeline, 4),
+                         [(2 * Gst.SECOND, 5 * Gst.SECOND),
+                          (8 * Gst.SECOND, 9 * Gst.SECOND)])
+        self.assertEqual(heavy_ranges(self.ges_timeline, 10), [])
+
+    def test_range_hash(self):
+        """Checks the hash changes only when the range is edited."""
+        ges_layer = self.ges_timeline.append_layer()
+        ges_clip = self.add_title(ges_layer, 2, 3, effects=1)
+        self.add_title(ges_layer, 10, 1)
+        digest = range_hash(self.ges_timeline, 2 * Gst.SECOND, 5 * Gst.SECOND)
+
+        # Editing outside the range.
+        self.add_title(ges_layer, 6, 1)
+        self.assertEqual(range_hash(self.ges_timeline, 2 * Gst.SECOND, 5 * Gst.SECOND),
+                         digest)
+
+        # Moving the range as a whole.
+        ges_clip.props.start = 3 * Gst.SECOND
+        self.assertEqual(range_hash(self.ges_timeline, 3 * Gst.SECOND, 6 * Gst.SECOND),
+                         digest)
+
+        ges_clip.set_child_property("text", "changed")
+        self.assertNotEqual(range_hash(self.ges_timeline, 3 * Gst.SECOND, 6 * Gst.SECOND),
+                            digest)
+
+    @mock.patch("pitivi.utils.preview_cache.RenderProcess")
+    def test_invalidation(self, render_process):
+        """Checks the files of the edited ranges are removed."""
+        ges_layer = self.ges_timeline.append_layer()
+        ges_clip = self.add_title(ges_layer, 0, 5)
+        render_process.return_value.start.return_value = True
+
+        preview_cache = PreviewCache(self.project, cache_dir=self.cache_dir)
+        with mock.patch.object(preview_cache, "schedule_update"):
+            preview_cache.mark(Gst.SECOND, 2 * Gst.SECOND)
+        preview_cache.update()
+        self.assertEqual(len(preview_cache.ranges), 1)
+        preview_range = preview_cache.ranges[0]
+        self.assertFalse(preview_range.ready)
+        args = render_process.call_args[0][0]
+        self.assertEqual(args[:4], ["--start", str(Gst.SECOND),
+                                    "--stop", str(2 * Gst.SECOND)])
+
+        # Pretend the range has been rendered.
+        with open(preview_range.path + ".part", "w"):
+            pass
+        with mock.patch.object(preview_cache, "_PreviewCache__prepare_playback_timeline"):
+            preview_cache._PreviewCache__exited_cb(render_process.return_value, True)
+            self.assertTrue(preview_range.ready)
+            self.assertTrue(os.path.exists(preview_range.path))
+
+            # The range is unchanged.
+            preview_cache.update()
+            self.assertEqual(preview_cache.ready_ranges[0].path, preview_range.path)
+            self.assertEqual(render_process.call_count, 1)
+
+            ges_clip.set_child_property("text", "changed")
+            preview_cache.update()
+        self.assertFalse(os.path.exists(preview_range.path))
+        self.assertEqual(preview_cache.ready_ranges, [])
+        self.assertEqual(render_process.call_count, 2)
+        preview_cache.release()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.preview_quality module."""
+# pylint: disable=protected-access,no-self-use
+from unittest import mock
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.utils.preview_quality import PreviewQuality
+from pitivi.utils.preview_quality import QosMonitor
+from pitivi.utils.preview_quality import RAISE_INTERVALS
+from pitivi.utils.preview_quality import scaled_size
+from tests import common
+
+
+class TestQosMonitor(TestCase):
+    """Tests for the QosMonitor class."""
+
+    def setUp(self):
+        self.monitor = QosMonitor()
+        self.src = mock.Mock()
+        self.processed = 0
+        self.dropped = 0
+
+    def play_interval(self, processed, dropped):
+        """Simulates the QoS messages of an interval and checks them."""
+        self.processed += processed
+        self.dropped += dropped
+        message = mock.Mock(src=self.src)
+        message.parse_qos_stats.return_value = (Gst.Format.BUFFERS,
+                                                self.processed, self.dropped)
+        self.monitor.add_message(message)
+        return self.monitor.check()
+
+    def test_scaled_size(self):
+        """Checks the scaled sizes stay even."""
+        self.assertEqual(scaled_size(1920, 1080, 1), (1920, 1080))
+        self.assertEqual(scaled_size(1920, 1080, 4), (480, 270))
+        self.assertEqual(scaled_size(3, 3, 4), (2, 2))
+
+    def test_lower_and_raise(self):
+        """Checks the resolution follows the dropped frames."""
+        self.assertFalse(self.play_interval(50, 1))
+        self.assertEqual(self.monitor.divisor, 1)
+
+        self.assertTrue(self.play_interval(30, 20))
+        self.assertEqual(self.monitor.divisor, 2)
+        # The interval following the change is ignored.
+        self.assertFalse(self.play_interval(30, 20))
+        self.assertTrue(self.play_interval(30, 20))
+        self.assertEqual(self.monitor.divisor, 4)
+        self.assertFalse(self.play_interval(0, 0))
+        self.assertFalse(self.play_interval(30, 20))
+        self.assertEqual(self.monitor.divisor, 4)
+
+        for unused_i in range(RAISE_INTERVALS - 1):
+            self.assertFalse(self.play_interval(0, 0))
+        self.assertTrue(self.play_interval(0, 0))
+        self.assertEqual(self.monitor.divisor, 2)
+
+        # Dropping again right away makes it wait longer before raising.
+        self.assertFalse(self.play_interval(0, 0))
+        self.assertTrue(self.play_interval(30, 20))
+        self.assertEqual(self.monitor.divisor, 4)
+        self.assertFalse(self.play_interval(0, 0))
+        for unused_i in range(RAISE_INTERVALS * 2 - 1):
+            self.assertFalse(self.play_interval(0, 0))
+        self.assertTrue(self.play_interval(0, 0))
+
+
+class TestPipelinePreviewQuality(common.TestCase):
+    """Tests for the preview quality of the project pipeline."""
+
+    def test_preview_caps(self):
+        """Checks only the preview is scaled down, not the tracks."""
+        project = common.create_project()
+        project.videowidth = 1920
+        project.videoheight = 1080
+        project.update_restriction_caps()
+        pipeline = project.pipeline
+        pipeline.create_sink()
+        capsfilter = pipeline._Pipeline__preview_capsfilter
+        video_track = [track for track in project.ges_timeline.get_tracks()
+                       if isinstance(track, GES.VideoTrack)][0]
+
+        def preview_size():
+            caps = capsfilter.props.caps
+            if caps.is_any():
+                return None
+            return caps[0]["width"], caps[0]["height"]
+
+        self.assertIsNone(preview_size())
+
+        project.app.settings.previewQuality = PreviewQuality.HALF
+        self.assertEqual(pipeline.preview_divisor, 2)
+        self.assertEqual(preview_size(), (960, 540))
+        structure = video_track.get_restriction_caps()[0]
+        self.assertEqual((structure["width"], structure["height"]), (1920, 1080))
+
+        project.videowidth = 1280
+        project.videoheight = 720
+        project.update_restriction_caps()
+        self.assertEqual(preview_size(), (640, 360))
+
+        pipeline.set_mode(GES.PipelineFlags.RENDER)
+        self.assertEqual(pipeline.preview_divisor, 1)
+        self.assertIsNone(preview_size())
+
+        pipeline.set_mode(GES.PipelineFlags.FULL_PREVIEW)
+        self.assertEqual(preview_size(), (640, 360))
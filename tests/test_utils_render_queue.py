@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.render_queue module."""
+# pylint: disable=protected-access,no-self-use
+import os
+import shutil
+import tempfile
+from unittest import mock
+from unittest import TestCase
+
+from gi.repository import GLib
+
+from pitivi.utils.render_queue import DONE
+from pitivi.utils.render_queue import FAILED
+from pitivi.utils.render_queue import PENDING
+from pitivi.utils.render_queue import RenderQueue
+from pitivi.utils.render_queue import RUNNING
+
+
+class TestRenderQueue(TestCase):
+    """Tests for the RenderQueue class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "render-queue.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_persistence(self):
+        """Checks the jobs are saved."""
+        render_queue = RenderQueue(self.path)
+        job = render_queue.add("/tmp/project.xges", "/tmp/out.mkv", "youtube")
+        self.assertEqual(job["project"], "file:///tmp/project.xges")
+        self.assertEqual(job["profile"], "youtube")
+
+        render_queue = RenderQueue(self.path)
+        self.assertEqual([job["status"] for job in render_queue.jobs], [PENDING])
+
+        with render_queue.locked():
+            render_queue.jobs[0]["status"] = DONE
+        # The job added meanwhile by another process is not lost.
+        RenderQueue(self.path).add("/tmp/project.xges", "/tmp/out2.mkv")
+        render_queue.clear()
+        render_queue = RenderQueue(self.path)
+        self.assertEqual([job["id"] for job in render_queue.jobs], [2])
+
+    def test_interrupted_jobs(self):
+        """Checks only the jobs whose worker died are processed again."""
+        render_queue = RenderQueue(self.path)
+        for unused_i in range(2):
+            render_queue.add("/tmp/project.xges", "/tmp/out.mkv")
+        with render_queue.locked():
+            for job, pid in zip(render_queue.jobs, (100, 200)):
+                job["status"] = RUNNING
+                job["pid"] = pid
+
+        with mock.patch("pitivi.utils.render_queue._process_alive") as process_alive, \
+                mock.patch("pitivi.utils.render_queue.RenderProcess") as process_class, \
+                mock.patch("pitivi.utils.render_queue.print", create=True):
+            process_alive.side_effect = lambda pid: pid == 200
+            process_class.return_value.start.return_value = False
+            render_queue.run()
+
+        self.assertEqual([job["status"] for job in render_queue.jobs],
+                         [FAILED, RUNNING])
+        self.assertEqual(process_class.call_count, 1)
+
+    def test_run(self):
+        """Checks the jobs are processed with the specified concurrency."""
+        render_queue = RenderQueue(self.path)
+        for i in range(3):
+            render_queue.add("/tmp/project.xges", "/tmp/out%d.mkv" % i)
+
+        running = []
+        max_running = []
+
+        def create_process(args):  # pylint: disable=missing-docstring
+            process = mock.Mock()
+            process.error = "Failed"
+            process.pid = 1000 + len(max_running)
+            callbacks = {}
+
+            def connect(signal, callback, job):  # pylint: disable=missing-docstring
+                callbacks[signal] = (callback, job)
+            process.connect.side_effect = connect
+
+            def finish():  # pylint: disable=missing-docstring
+                running.remove(process)
+                callback, job = callbacks["exited"]
+                callback(process, "out1" not in args[1], job)
+                return False
+            running.append(process)
+            max_running.append(len(running))
+            GLib.idle_add(finish)
+            return process
+
+        with mock.patch("pitivi.utils.render_queue.RenderProcess") as process_class, \
+                mock.patch("pitivi.utils.render_queue.print", create=True):
+            process_class.side_effect = create_process
+            self.assertFalse(render_queue.run(concurrency=2))
+
+        self.assertEqual(max(max_running), 2)
+        self.assertEqual([job["status"] for job in render_queue.jobs],
+                         [DONE, FAILED, DONE])
+        render_queue = RenderQueue(self.path)
+        self.assertEqual([job["status"] for job in render_queue.jobs],
+                         [DONE, FAILED, DONE])
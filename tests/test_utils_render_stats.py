@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.render_stats module."""
+# pylint: disable=protected-access,no-self-use
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.utils.render_stats import complexity_profile
+from pitivi.utils.render_stats import prune_render_logs
+from pitivi.utils.render_stats import RenderStats
+from tests import common
+
+
+class TestRenderStats(TestCase):
+    """Tests for the RenderStats class."""
+
+    def setUp(self):
+        # 0-10s: one clip, 10-20s: two clips and an effect.
+        self.ges_timeline = common.create_timeline_container().ges_timeline
+        layer1 = self.ges_timeline.append_layer()
+        layer2 = self.ges_timeline.append_layer()
+        self.add_clip(layer1, 0, 20)
+        clip = self.add_clip(layer2, 10, 10)
+        clip.add(GES.Effect.new("agingtv"))
+
+    def add_clip(self, layer, start, duration):
+        """Adds a title clip to the layer."""
+        clip = GES.TitleClip()
+        clip.props.start = start * Gst.SECOND
+        clip.props.duration = duration * Gst.SECOND
+        layer.add_clip(clip)
+        return clip
+
+    def test_complexity_profile(self):
+        """Checks the complex regions cost more."""
+        boundaries, cumulative = complexity_profile(self.ges_timeline)
+        self.assertEqual(boundaries, [0, 10 * Gst.SECOND, 20 * Gst.SECOND])
+        self.assertEqual(cumulative, [0, 10, 40])
+
+        stats = RenderStats(self.ges_timeline, Gst.Fraction(25, 1))
+        self.assertEqual(stats.cost(5 * Gst.SECOND), 5)
+        self.assertEqual(stats.cost(15 * Gst.SECOND), 25)
+        self.assertEqual(stats.cost(30 * Gst.SECOND), 40)
+
+    def test_eta(self):
+        """Checks the metrics and the ETA."""
+        log_path = tempfile.mktemp()
+        self.addCleanup(os.unlink, log_path)
+        stats = RenderStats(self.ges_timeline, Gst.Fraction(25, 1),
+                            log_path=log_path)
+        stats.add_sample(0, size=0, now=100)
+        self.assertIsNone(stats.eta())
+
+        stats.add_sample(5 * Gst.SECOND, size=1000000, now=105)
+        self.assertEqual(stats.realtime_factor, 1)
+        self.assertEqual(stats.fps, 25)
+        self.assertEqual(stats.bitrate, 1600000)
+        # Rendering the rest costs 35 units, at 1 unit per second.
+        self.assertEqual(stats.eta(), 35)
+
+        # The samples older than the window are forgotten.
+        stats.add_sample(10 * Gst.SECOND, now=110)
+        stats.add_sample(11 * Gst.SECOND, now=120)
+        self.assertEqual(stats.realtime_factor, 0.1)
+        stats.close()
+
+        with open(log_path) as log_file:
+            entries = [json.loads(line) for line in log_file]
+        self.assertEqual(len(entries), 4)
+        self.assertEqual(entries[1]["fps"], 25)
+
+    def test_ranges_eta(self):
+        """Checks the ETA of a render done in parallel ranges."""
+        stats = RenderStats(self.ges_timeline, Gst.Fraction(25, 1))
+        stats.add_ranges_sample([(0, 0), (10 * Gst.SECOND, 0)], now=100)
+        stats.add_ranges_sample([(0, 2 * Gst.SECOND),
+                                 (10 * Gst.SECOND, 2 * Gst.SECOND)], now=102)
+        self.assertEqual(stats.realtime_factor, 2)
+        # 2 + 6 units rendered in 2 seconds, 32 units left.
+        self.assertEqual(stats.eta(), 8)
+
+    def test_prune_render_logs(self):
+        """Checks the oldest logs are removed."""
+        with tempfile.TemporaryDirectory() as logs_dir:
+            for index in range(3):
+                path = os.path.join(logs_dir, "%d.log" % index)
+                with open(path, "w"):
+                    pass
+                os.utime(path, (index, index))
+            prune_render_logs(logs_dir, keep=2)
+            self.assertEqual(sorted(os.listdir(logs_dir)), ["1.log", "2.log"])
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.render_worker module."""
+# pylint: disable=protected-access,no-self-use
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+from gi.repository import GstPbutils
+
+from pitivi.utils.misc import path_from_uri
+from pitivi.utils.render_worker import create_tee_pipeline
+from pitivi.utils.render_worker import to_uri
+from tests.test_render import factory_exists
+
+
+def create_profile(muxer_caps, video_caps=None, audio_caps=None):
+    """Creates a container profile with the specified formats."""
+    container_profile = GstPbutils.EncodingContainerProfile.new(
+        None, None, Gst.Caps.from_string(muxer_caps), None)
+    if video_caps:
+        container_profile.add_profile(GstPbutils.EncodingVideoProfile.new(
+            Gst.Caps.from_string(video_caps), None, None, 0))
+    if audio_caps:
+        container_profile.add_profile(GstPbutils.EncodingAudioProfile.new(
+            Gst.Caps.from_string(audio_caps), None, None, 0))
+    return container_profile
+
+
+class TestCreateTeePipeline(TestCase):
+    """Tests for the create_tee_pipeline function."""
+
+    @skipUnless(*factory_exists("matroskamux", "oggmux", "vp8enc", "vorbisenc"))
+    def test_outputs(self):
+        """Checks each output gets its own branch of the tracks it needs."""
+        ges_timeline = GES.Timeline.new_audio_video()
+        outputs = [("file:///tmp/master.mkv",
+                    create_profile("video/x-matroska", "video/x-vp8",
+                                   "audio/x-vorbis")),
+                   ("file:///tmp/mix.ogg",
+                    create_profile("application/ogg",
+                                   audio_caps="audio/x-vorbis"))]
+        pipeline = create_tee_pipeline(ges_timeline, outputs)
+
+        factories = [element.get_factory().get_name()
+                     for element in pipeline.iterate_elements()
+                     if element.get_factory()]
+        self.assertEqual(factories.count("tee"), 2)
+        self.assertEqual(factories.count("encodebin"), 2)
+        self.assertEqual(factories.count("queue"), 3)
+        pipeline.remove(ges_timeline)
+
+    @skipUnless(*factory_exists("matroskamux", "oggmux", "vp8enc", "vorbisenc"))
+    def test_render_two_outputs(self):
+        """Checks the outputs are written in a single pass."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        ges_timeline = GES.Timeline.new_audio_video()
+        layer = ges_timeline.append_layer()
+        clip = GES.TestClip.new()
+        clip.props.duration = Gst.SECOND
+        layer.add_clip(clip)
+        ges_timeline.commit()
+
+        outputs = [(to_uri(os.path.join(temp_dir, "master.mkv")),
+                    create_profile("video/x-matroska", "video/x-vp8",
+                                   "audio/x-vorbis")),
+                   (to_uri(os.path.join(temp_dir, "mix.ogg")),
+                    create_profile("application/ogg",
+                                   audio_caps="audio/x-vorbis"))]
+        pipeline = create_tee_pipeline(ges_timeline, outputs)
+        bus = pipeline.get_bus()
+        try:
+            for state, message_type in ((Gst.State.PAUSED, Gst.MessageType.ASYNC_DONE),
+                                        (Gst.State.PLAYING, Gst.MessageType.EOS)):
+                pipeline.set_state(state)
+                message = bus.timed_pop_filtered(
+                    30 * Gst.SECOND, message_type | Gst.MessageType.ERROR)
+                self.assertIsNotNone(message)
+                if message.type == Gst.MessageType.ERROR:
+                    self.fail(message.parse_error()[0].message)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+            pipeline.remove(ges_timeline)
+
+        for output_uri, unused_profile in outputs:
+            path = path_from_uri(output_uri)
+            self.assertTrue(os.path.exists(path), path)
+            self.assertGreater(os.path.getsize(path), 0, path)
+
+    def test_missing_track(self):
+        """Checks the outputs needing a missing track are refused."""
+        ges_timeline = GES.Timeline.new()
+        ges_timeline.add_track(GES.AudioTrack.new())
+        outputs = [("file:///tmp/master.mkv",
+                    create_profile("video/x-matroska", "video/x-vp8"))]
+        with self.assertRaises(ValueError):
+            create_tee_pipeline(ges_timeline, outputs)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.segmented_render module."""
+# pylint: disable=protected-access,no-self-use
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from gi.repository import GES
+from gi.repository import Gst
+from gi.repository import GstPbutils
+
+from pitivi.utils.segmented_render import remove_encoder_presets
+from pitivi.utils.segmented_render import save_encoding_target
+from pitivi.utils.segmented_render import split_timeline
+from tests import common
+
+
+class TestSplitTimeline(common.TestCase):
+    """Tests for the split_timeline function."""
+
+    def setUp(self):
+        super().setUp()
+        self.ges_timeline = GES.Timeline.new_audio_video()
+        self.ges_layer = self.ges_timeline.append_layer()
+        self.framerate = Gst.Fraction(25, 1)
+
+    def add_clip(self, start, duration):
+        """Adds a clip to the timeline, timestamps in seconds."""
+        clip = common.create_test_clip(GES.TitleClip)
+        clip.props.start = start * Gst.SECOND
+        clip.props.duration = duration * Gst.SECOND
+        self.assertTrue(self.ges_layer.add_clip(clip))
+
+    def test_cut_points(self):
+        """Checks the ranges are cut where clips start or end."""
+        self.add_clip(0, 20)
+        self.add_clip(20, 25)
+        self.add_clip(45, 15)
+        ranges = split_timeline(self.ges_timeline, 3, self.framerate)
+        self.assertEqual(ranges, [(0, 20 * Gst.SECOND),
+                                  (20 * Gst.SECOND, 45 * Gst.SECOND),
+                                  (45 * Gst.SECOND, 60 * Gst.SECOND)])
+
+    def test_no_cut_points(self):
+        """Checks the ranges are even when there are no cut points around."""
+        self.add_clip(0, 60)
+        ranges = split_timeline(self.ges_timeline, 4, self.framerate)
+        self.assertEqual(ranges, [(0, 15 * Gst.SECOND),
+                                  (15 * Gst.SECOND, 30 * Gst.SECOND),
+                                  (30 * Gst.SECOND, 45 * Gst.SECOND),
+                                  (45 * Gst.SECOND, 60 * Gst.SECOND)])
+
+    def test_short_timeline(self):
+        """Checks a short timeline is not split."""
+        self.add_clip(0, 8)
+        ranges = split_timeline(self.ges_timeline, 4, self.framerate)
+        self.assertEqual(ranges, [(0, 8 * Gst.SECOND)])
+
+
+class TestSaveEncodingTarget(common.TestCase):
+    """Tests for the save_encoding_target function."""
+
+    def test_presets_removed(self):
+        """Checks the encoder presets are saved and removed."""
+        container_profile = GstPbutils.EncodingContainerProfile.new(
+            None, None, Gst.Caps("application/ogg"), None)
+        video_profile = GstPbutils.EncodingVideoProfile.new(
+            Gst.Caps("video/x-theora"), "theoraenc", None, 0)
+        audio_profile = GstPbutils.EncodingAudioProfile.new(
+            Gst.Caps("audio/x-vorbis"), "vorbisenc", None, 0)
+        container_profile.add_profile(video_profile)
+        container_profile.add_profile(audio_profile)
+        project = mock.Mock()
+        project.vcodecsettings = {"quality": 20}
+        project.acodecsettings = {"quality": 0.5}
+
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "profile.gep")
+        presets = save_encoding_target(project, container_profile, path)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual([encoder.get_factory().get_name()
+                          for encoder, unused_preset in presets],
+                         ["theoraenc", "vorbisenc"])
+        for encoder, preset in presets:
+            self.assertIn(preset, encoder.get_preset_names())
+        # The profiles used by the render dialog are not changed.
+        self.assertIsNone(video_profile.get_preset())
+        self.assertIsNone(audio_profile.get_preset())
+
+        remove_encoder_presets(presets)
+        for encoder, preset in presets:
+            self.assertNotIn(preset, encoder.get_preset_names())
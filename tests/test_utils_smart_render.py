@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.smart_render module."""
+# pylint: disable=protected-access,no-self-use
+from unittest import mock
+from unittest import TestCase
+
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.utils.smart_render import can_copy_sources
+from pitivi.utils.smart_render import is_unmodified
+from tests import common
+
+
+class TestSmartRender(TestCase):
+    """Tests for the detection of the ranges which can be copied."""
+
+    def setUp(self):
+        timeline_container = common.create_timeline_container()
+        self.project = timeline_container.app.project_manager.current_project
+        self.ges_timeline = timeline_container.ges_timeline
+        self.asset = GES.UriClipAsset.request_sync(
+            common.get_sample_uri("tears_of_steel.webm"))
+
+    def add_clip(self, layer, start, duration):
+        """Adds a clip of the test asset to the layer."""
+        return layer.add_asset(self.asset, start * Gst.SECOND, 0,
+                               duration * Gst.SECOND, GES.TrackType.UNKNOWN)
+
+    def test_is_unmodified(self):
+        """Checks the clips with effects or transformations are detected."""
+        layer = self.ges_timeline.append_layer()
+        ges_clip = self.add_clip(layer, 0, 1)
+        video_source = ges_clip.find_track_element(None, GES.VideoSource)
+        video_source.set_child_property("width", self.project.videowidth)
+        video_source.set_child_property("height", self.project.videoheight)
+        self.assertTrue(is_unmodified(ges_clip, self.project))
+
+        video_source.set_child_property("posx", 10)
+        self.assertFalse(is_unmodified(ges_clip, self.project))
+        video_source.set_child_property("posx", 0)
+
+        ges_clip.add(GES.Effect.new("agingtv"))
+        self.assertFalse(is_unmodified(ges_clip, self.project))
+
+        title_clip = common.create_test_clip(GES.TitleClip)
+        self.assertFalse(is_unmodified(title_clip, self.project))
+
+    def test_can_copy_sources(self):
+        """Checks only the parts played by a single clip can be copied."""
+        layer1 = self.ges_timeline.append_layer()
+        layer2 = self.ges_timeline.append_layer()
+        self.add_clip(layer1, 0, 10)
+        clip2 = self.add_clip(layer1, 25, 5)
+        title_clip = common.create_test_clip(GES.TitleClip)
+        title_clip.props.duration = 10 * Gst.SECOND
+        layer2.add_clip(title_clip)
+
+        with mock.patch("pitivi.utils.smart_render.is_unmodified",
+                        side_effect=lambda ges_clip, project: ges_clip != clip2), \
+                mock.patch("pitivi.utils.smart_render.source_matches_profile",
+                           return_value=True):
+            # The unmodified clip is covered by the title.
+            self.assertFalse(can_copy_sources(self.ges_timeline, self.project,
+                                              self.project.container_profile))
+
+            title_clip.props.start = 5 * Gst.SECOND
+            self.assertTrue(can_copy_sources(self.ges_timeline, self.project,
+                                             self.project.container_profile))
@@ -21,6 +21,7 @@ from unittest import TestCase
 
 from gi.repository import GES
 
+from pitivi.utils.timeline import EditCoalescer
 from pitivi.utils.timeline import SELECT
 from pitivi.utils.timeline import SELECT_ADD
 from pitivi.utils.timeline import Selected
@@ -79,3 +80,44 @@ class TestSelection(TestCase):
         self.assertIsNone(selection.getSingleClip())
         self.assertIsNone(selection.getSingleClip(GES.UriClip))
         self.assertIsNone(selection.getSingleClip(GES.TitleClip))
+
+
+class TestEditCoalescer(TestCase):
+    """Tests for the EditCoalescer class."""
+
+    def test_latest_edit_per_frame(self):
+        """Checks only the latest edits are applied on the next frame."""
+        widget = mock.Mock()
+        widget.get_mapped.return_value = True
+        widget.add_tick_callback.return_value = 1
+        coalescer = EditCoalescer(widget)
+        edit = mock.Mock()
+
+        coalescer.push(edit, 1)
+        coalescer.push(edit, 2)
+        coalescer.push(edit, "width", 10, key="width")
+        self.assertTrue(coalescer.pending)
+        edit.assert_not_called()
+        widget.add_tick_callback.assert_called_once()
+
+        tick_cb = widget.add_tick_callback.call_args[0][0]
+        tick_cb(widget, mock.Mock())
+        self.assertEqual(edit.call_args_list, [mock.call(2), mock.call("width", 10)])
+        self.assertFalse(coalescer.pending)
+
+        # On release, the pending edits are applied right away.
+        coalescer.push(edit, 3)
+        coalescer.flush()
+        edit.assert_called_with(3)
+        widget.remove_tick_callback.assert_called_once_with(1)
+
+    def test_unmapped(self):
+        """Checks the edits are applied right away without frames."""
+        widget = mock.Mock()
+        widget.get_mapped.return_value = False
+        coalescer = EditCoalescer(widget)
+        edit = mock.Mock()
+
+        coalescer.push(edit, 1)
+        edit.assert_called_once_with(1)
+        widget.add_tick_callback.assert_not_called()